@@ -0,0 +1,51 @@
+from backend.app.db.table_schema import table_schema_dict, metadata_filtering_operations
+from backend.app.actions.filter_engine import FILTER_FIELD_ALIASES, parse_input_value, scale_numeric_value
+import logging
+
+
+class FilterCompileError(ValueError):
+    """ A filter the local compiler cannot express; it is left to the LLM """
+
+
+def escape_like(value):
+    """ Match value literally inside an ILIKE pattern """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def compile_structured_filter(structured_filter):
+    """ One {subject, operand, value} UI filter as {'Field', 'Operator', 'Parameter'} clauses for execute_metadata_sql """
+    if not isinstance(structured_filter, dict) or not {"subject", "operand", "value"} <= structured_filter.keys():
+        raise FilterCompileError(f"Not a structured filter: {structured_filter!r}")
+    subject, operand, value = structured_filter["subject"], structured_filter["operand"], structured_filter["value"]
+
+    if operand not in metadata_filtering_operations.get(subject, []):
+        raise FilterCompileError(f"Unsupported operand {operand!r} for {subject!r}")
+    field = FILTER_FIELD_ALIASES.get(subject, subject)
+    if field not in table_schema_dict:
+        raise FilterCompileError(f"{subject!r} is not a metadata column")
+
+    if operand == "includes":
+        # Every term has to appear, as in the in-memory filters
+        terms = parse_input_value(value)
+        if terms is None:
+            raise FilterCompileError(f"Cannot parse {value!r} locally")
+        return [{"Field": field, "Operator": "ILIKE", "Parameter": f"%{escape_like(term)}%"} for term in terms]
+    if operand == "is":
+        # Granularities are stored lowercased; equality on them is served by the GIN index
+        return [{"Field": field, "Operator": "=", "Parameter": str(value).strip().lower()}]
+
+    try:
+        number = scale_numeric_value(field, value)
+    except (TypeError, ValueError):
+        raise FilterCompileError(f"{value!r} is not a number")
+    return [{"Field": field, "Operator": operand, "Parameter": number}]
+
+def compile_structured_filters(filters):
+    """ Split filters into the SQL clauses compiled locally and the free-text filters left to the LLM """
+    sql_clauses, remaining = [], []
+    for structured_filter in filters or []:
+        try:
+            sql_clauses.extend(compile_structured_filter(structured_filter))
+        except FilterCompileError as e:
+            logging.info(f"Filter left to the LLM: {e}")
+            remaining.append(structured_filter)
+    return sql_clauses, remaining
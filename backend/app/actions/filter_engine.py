@@ -0,0 +1,244 @@
+from backend.app.table_representation.openai_client import OpenAIClient
+from backend.app.hyse.hypo_schema_search import hnsw_search
+from backend.app.actions.text_index import FuzzyTextIndex, FUZZY_THRESHOLD
+from backend.app.utils.cache import TTLCache
+from thefuzz import fuzz
+import ast
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+
+openai_client = OpenAIClient()
+
+# Frontend filter names -> result fields
+FILTER_FIELD_ALIASES = {
+    "time_granularity": "time_granu",
+    "geo_granularity": "geo_granu",
+    "total downloads": "popularity",
+    "file_size_in_MB": "file_size_in_byte",
+}
+
+NUMERIC_FIELDS = ["popularity", "col_num", "row_num", "usability_rating", "file_size_in_byte"]
+EXACT_FIELDS = ["time_granu", "geo_granu"]
+FUZZY_FIELDS = ["table_name", "database_name", "db_description", "tags", "keywords", "metadata_queries"]
+VECTOR_FIELDS = ["column_specification"]
+
+# Predicates run cheapest first so the expensive ones only see the surviving rows
+PREDICATE_COST = {"numeric": 0, "isin": 0, "exact": 1, "fuzzy": 2, "vector": 3}
+
+# Separators of the filter input grammar: "x, y and z or a"
+INPUT_SEPARATOR_PATTERN = re.compile(r"\s*,\s*|\s+(?:and|or)\s+", re.IGNORECASE)
+# Inputs the local parser leaves to the LLM
+UNPARSEABLE_INPUT_PATTERN = re.compile(r"[()\[\]{}&|;]|\b(?:not|but|except|without|between|nor)\b", re.IGNORECASE)
+INPUT_VALUE_CACHE_TTL = int(os.getenv("INPUT_VALUE_CACHE_TTL", 24 * 3600))
+input_value_cache = TTLCache(max_items=1024, ttl=INPUT_VALUE_CACHE_TTL)
+
+COMPARISON_OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "=": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def fuzzy_match(query, value, threshold=FUZZY_THRESHOLD):
+    """Returns True if the fuzzy match score is above the threshold."""
+    return fuzz.partial_ratio(query.lower(), value.lower()) >= threshold
+
+def parse_input_value(search_input):
+    """ Split a filter input with the documented grammar: items separated by commas, "and" or "or".
+    Returns None when the input needs the LLM (brackets, negations, quoted items with delimiters, ...) """
+    if not isinstance(search_input, str) or UNPARSEABLE_INPUT_PATTERN.search(search_input):
+        return None
+    items = []
+    for item in INPUT_SEPARATOR_PATTERN.split(search_input):
+        item = item.strip()
+        if len(item) >= 2 and item[0] == item[-1] and item[0] in "\"'":
+            item = item[1:-1].strip()
+        if '"' in item:
+            return None
+        if item:
+            items.append(item)
+    return items or None
+
+def clean_input_value(search_input):
+    """ Filter input as a list of search terms; the LLM is only asked for inputs the parser cannot handle """
+    items = parse_input_value(search_input)
+    if items is not None:
+        return items
+    cached = input_value_cache.get(search_input)
+    if cached is not None:
+        return cached
+    return infer_input_values(search_input)
+
+def infer_input_values(search_input):
+    """ Ask the LLM to split a filter input the local parser could not handle """
+    messages = [
+        {"role": "system",
+        "content": f"""You are an assistant that processes user input and returns a list of strings. The user may provide search parameters in different formats. Here's how to handle each format:
+
+        1. If the input is a single string (e.g., "x" or x), return a list with that string: [x].
+        2. If the input is multiple items separated by "and" (e.g., "x and y and z"), return a list with those items: [x, y, z].
+        3. If the input uses commas and "or" (e.g., "x, y, z or a, b, c"), return a combined list of all items from both parts: [x, y, z, a, b, c].
+        4. If the input uses "and" and commas together (e.g., "x, y and z"), split the input into individual items: [x, y, z].
+
+        Your task is to parse the input and return the correct list of strings based on the format above.
+        """},
+        {"role": "user", "content": search_input}
+
+    ]
+
+    result = openai_client.infer_metadata_wo_instructor(messages)
+    logging.info(result)
+    if result is None:
+        return [search_input]
+    if isinstance(result, str):  # Checking if result is a string
+        try:
+            # Safely evaluate the string to convert to a list or other Python literal
+            result = ast.literal_eval(result)
+        except (ValueError, SyntaxError) as e:
+            # Fall back to matching the raw input as a single term
+            logging.error(f"Error evaluating string: {e}")
+            return [search_input]
+    if not isinstance(result, list):
+        result = [str(result)]
+    input_value_cache.set(search_input, result)
+    return result
+
+
+class ColumnarResults:
+    """ Column arrays of a result set, built lazily per field and reused by every filter run on it """
+    def __init__(self, results):
+        self.results = results
+        self.size = len(results)
+        self._numeric = {}
+        self._lowered = {}
+        self._tokens = {}
+        self._text_indexes = {}
+
+    def numeric(self, field):
+        if field not in self._numeric:
+            values = pd.to_numeric(pd.Series([row.get(field) for row in self.results], dtype=object), errors="coerce")
+            self._numeric[field] = values.to_numpy(dtype=np.float64)
+        return self._numeric[field]
+
+    def lowered(self, field):
+        """ Lower-cased string values; non-strings become None """
+        if field not in self._lowered:
+            self._lowered[field] = np.array(
+                [value.lower() if isinstance(value, str) else None for value in (row.get(field) for row in self.results)],
+                dtype=object
+            )
+        return self._lowered[field]
+
+    def tokens(self, field):
+        """ Lower-cased match units per row: list items for list fields, words for strings, None otherwise """
+        if field not in self._tokens:
+            tokens = []
+            for row in self.results:
+                value = row.get(field)
+                if isinstance(value, list):
+                    tokens.append([str(item).lower() for item in value])
+                elif isinstance(value, str):
+                    tokens.append(value.lower().split())
+                else:
+                    tokens.append(None)
+            self._tokens[field] = tokens
+        return self._tokens[field]
+
+    def text_index(self, field):
+        if field not in self._text_indexes:
+            self._text_indexes[field] = FuzzyTextIndex(self.tokens(field))
+        return self._text_indexes[field]
+
+
+class Predicate:
+    def __init__(self, kind, field, value, operand=None):
+        self.kind = kind
+        self.field = field
+        self.value = value
+        self.operand = operand
+
+    def __repr__(self):
+        return f"Predicate({self.kind}, {self.field}, {self.operand}, {self.value!r})"
+
+
+def scale_numeric_value(field, value):
+    """ Frontend number in the unit stored in the field: ratings are percentages, file sizes MB """
+    number = float(value)
+    if field == "usability_rating":
+        return number / 100
+    if field == "file_size_in_byte":
+        return number * 1024 * 1024
+    return number
+
+def compile_filter(subject, value, operand=None):
+    """ Normalize one frontend filter into a predicate, or None if the field is not filterable """
+    field = FILTER_FIELD_ALIASES.get(subject, subject)
+
+    if field in VECTOR_FIELDS:
+        return Predicate("vector", field, value)
+    if field in EXACT_FIELDS:
+        return Predicate("exact", field, str(value).lower())
+    if field in FUZZY_FIELDS:
+        terms = [str(term).lower() for term in clean_input_value(value)]
+        return Predicate("fuzzy", field, terms)
+    if field in NUMERIC_FIELDS:
+        if operand not in COMPARISON_OPERATORS:
+            logging.error(f"Unsupported operand {operand} for {field}")
+            return None
+        return Predicate("numeric", field, scale_numeric_value(field, value), operand)
+
+    logging.error(f"Unsupported filter field {subject}")
+    return None
+
+def compile_filters(filters, unique_datasets=None):
+    """ Compile a filter list into a plan of predicates ordered from cheapest to most expensive """
+    plan = [compile_filter(f["subject"], f["value"], f.get("operand")) for f in filters or []]
+    if unique_datasets:
+        plan.append(Predicate("isin", "table_name", set(unique_datasets)))
+    plan = [predicate for predicate in plan if predicate is not None]
+    # sorted() is stable, so predicates of the same cost keep their request order
+    return sorted(plan, key=lambda predicate: PREDICATE_COST[predicate.kind])
+
+
+def evaluate_predicate(predicate, columns, rows):
+    """ Boolean mask over the given row ids """
+    if predicate.kind == "numeric":
+        return COMPARISON_OPERATORS[predicate.operand](columns.numeric(predicate.field)[rows], predicate.value)
+
+    if predicate.kind == "isin":
+        values = columns.results
+        return np.fromiter((values[i].get(predicate.field) in predicate.value for i in rows), dtype=bool, count=len(rows))
+
+    if predicate.kind == "exact":
+        return columns.lowered(predicate.field)[rows] == predicate.value
+
+    if predicate.kind == "fuzzy":
+        return columns.text_index(predicate.field).match(predicate.value)[rows]
+
+    if predicate.kind == "vector":
+        candidates = [columns.results[i] for i in rows]
+        matched = {row["table_name"] for row in hnsw_search(predicate.value, candidates)}
+        return np.fromiter((columns.results[i].get("table_name") in matched for i in rows), dtype=bool, count=len(rows))
+
+    raise ValueError(f"Unknown predicate kind {predicate.kind}")
+
+def execute_plan(plan, columns):
+    """ Apply the predicates in order, each one only on the rows that survived the previous ones """
+    rows = np.arange(columns.size)
+    for predicate in plan:
+        if len(rows) == 0:
+            break
+        rows = rows[evaluate_predicate(predicate, columns, rows)]
+        logging.info(f"{predicate}: {len(rows)} rows left")
+    return [columns.results[i] for i in rows]
+
+def apply_filters(session, filters, unique_datasets=None):
+    """ Filter a result session with the full filter list in a single pass """
+    return execute_plan(compile_filters(filters, unique_datasets), session.columns)
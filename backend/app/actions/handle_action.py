@@ -1,5 +1,6 @@
 from backend.app.hyse.hypo_schema_search import hyse_search
 from backend.app.actions.infer_action import text_to_sql, execute_sql, filters_to_sql, execute_metadata_sql
+from backend.app.actions.filter_compiler import compile_structured_filters
 import logging
 import ast 
 def handle_semantic_fields(chat_history, thread_id, search_space):
@@ -13,9 +14,10 @@ def handle_semantic_fields(chat_history, thread_id, search_space):
 
     return refined_results
 
-def handle_raw_fields(cur_query, inferred_raw_fields, search_space):
-    # Excute text to sql
-    sql_clauses = text_to_sql(cur_query, inferred_raw_fields)
+def handle_raw_fields(cur_query, inferred_raw_fields, search_space, sql_clauses=None):
+    # Excute text to sql, unless the clauses were inferred with the rest of the query
+    if sql_clauses is None:
+        sql_clauses = text_to_sql(cur_query, inferred_raw_fields)
     logging.info(f"✅Inferred SQL clauses for current query '{cur_query}': {sql_clauses.model_dump()}")
 
     # Parse inferred sql clauses & inject into query template
@@ -28,11 +30,14 @@ def handle_raw_fields(cur_query, inferred_raw_fields, search_space):
     return sql_clauses.model_dump(), refined_results
 
 def handle_raw_filters(cur_query, filters, search_space):
-    sql_clauses = filters_to_sql(cur_query, filters)
-    if isinstance(sql_clauses, str):  # Check if sql_clauses is a string
-        sql_clauses = ast.literal_eval(sql_clauses)
+    # Structured UI filters compile straight to SQL; only free-text filters go through the LLM
+    sql_clauses, free_text_filters = compile_structured_filters(filters)
+    if free_text_filters:
+        inferred_clauses = filters_to_sql(cur_query, free_text_filters)
+        if isinstance(inferred_clauses, str):  # Check if inferred_clauses is a string
+            inferred_clauses = ast.literal_eval(inferred_clauses)
+        sql_clauses = sql_clauses + list(inferred_clauses)
 
-    logging.info(f"Type of sql_clauses: {type(sql_clauses)}")
     logging.info(f"Content of sql_clauses: {sql_clauses}")
     for sql_clause in sql_clauses:
         logging.info(f"Field: {sql_clause['Field']}")
@@ -41,4 +46,3 @@ def handle_raw_filters(cur_query, filters, search_space):
     
     refined_results = execute_metadata_sql(sql_clauses, search_space)
     return sql_clauses, refined_results
-
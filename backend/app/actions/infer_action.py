@@ -3,11 +3,20 @@ from backend.app.utils import format_prompt
 from pydantic import BaseModel
 from typing import List, Dict
 import logging
+import re
 from backend.app.db.connect_db import DatabaseConnection
-from psycopg2 import sql
+from backend.app.db.metadata_query import get_column_types, is_table_name_unique, build_metadata_query
+from backend.app.actions.query_classifier import classify_query
+from concurrent.futures import ThreadPoolExecutor
 # Initialize OpenAI client
 openai_client = OpenAIClient()
 
+# Fallback pool for the per-step inferences when the combined one fails
+query_understanding_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="query-understanding")
+
+# Columns returned for the raw metadata fields of a chat query
+EXECUTE_SQL_COLUMNS = ["table_name", "popularity", "db_description", "tags", "col_num", "time_granu", "geo_granu"]
+
 # Craft action inference prompt
 PROMPT_ACTION_INFER = """
 Given two queries in a search session, decide whether the new query is a "reset" or a "refine" in relation to the previous query.
@@ -92,6 +101,27 @@ For example, if the fields 'Temporal Granularity' and 'Geographic Granularity' a
 """
 
 
+# One round trip for the whole follow-up query understanding: action, mentioned fields and SQL clauses
+PROMPT_QUERY_UNDERSTANDING = """
+Given two queries in a search session, analyze the current query in four steps.
+
+1. Decide whether the current query is a "reset" or a "refine" in relation to the previous query.
+- A "reset" means the new query significantly differs from the previous query, indicating a change in the analytical task focus.
+- A "refine" means the new query builds upon or slightly alters the previous query, indicating a more focused analytical task based on the earlier query.
+
+2. Determine which semantic fields are explicitly mentioned or strongly implied: Table Schema, Example Records, Table Description, Table Tags.
+
+3. Determine which raw fields are explicitly mentioned or strongly implied: Table Name, Column Numbers, Popularity, Temporal Granularity, Geographic Granularity.
+
+4. For each raw field identified in step 3, generate the SQL WHERE clause condition (e.g. "> 5") or ORDER BY clause (e.g. "ORDER BY popularity DESC"), using the field names table_name, column_numbers, popularity, temporal_granularity and geographic_granularity.
+The temporal granularity should always be referenced specifically as one of the following: Year, Quarter, Month, Week, Day, Hour, Minute, or Second. The geographical granularity should be one of the following: Continent, Country, State/Province, County/District, City, or Zip Code/Postal Code.
+For example, for the query 'I only want data in the United States after 2020', the clause for temporal granularity might be "= 'year'" and for geographic granularity should be "= 'country'".
+Granularities are stored as single lowercase values such as 'state', 'province', 'county', 'district', 'zip code' or 'postal code'; when a granularity covers several of them, use IN, e.g. "IN ('state', 'province')".
+
+Previous query: "{prev_query}"
+Current query: "{cur_query}"
+"""
+
 # Define desired output structure
 class Action(BaseModel):
     reset: bool
@@ -129,6 +159,13 @@ class FilterClause(BaseModel):
 
 class TextToSQL(BaseModel):
     sql_clauses: List[SQLClause]
+
+class QueryUnderstanding(BaseModel):
+    action: Action
+    semantic_fields: MentionedSemanticFields
+    raw_fields: MentionedRawFields
+    sql_clauses: List[SQLClause]
+
 class TaskReasonListResponse(BaseModel):
     tasks: List[Dict[str, str]]
 
@@ -176,6 +213,57 @@ def infer_mentioned_metadata_fields(cur_query, semantic_metadata=True):
         logging.error(f"Failed to infer metadata fields: {e}")
         raise RuntimeError("Failed to process the metadata inference.") from e
 
+def understand_query(cur_query, prev_query, mention_semantic_fields=True, mention_raw_fields=True):
+    """ Action, mentioned semantic / raw fields and SQL clauses of a follow-up query.
+    Keyword rules answer the unambiguous queries; otherwise one combined LLM call, then the per-step calls in parallel """
+    local = classify_query(cur_query, prev_query, mention_semantic_fields, mention_raw_fields)
+    if local is not None:
+        action, semantic_fields, raw_fields, sql_clauses = local
+        logging.info(f"✅Query '{cur_query}' classified locally as {action}")
+        return QueryUnderstanding(
+            action=Action(reset=action == "reset", refine=action == "refine"),
+            semantic_fields=MentionedSemanticFields(**{field: field in semantic_fields for field in MentionedSemanticFields.model_fields}),
+            raw_fields=MentionedRawFields(**{field: field in raw_fields for field in MentionedRawFields.model_fields}),
+            sql_clauses=[SQLClause(field=field, clause=clause) for field, clause in sql_clauses],
+        )
+
+    prompt = format_prompt(PROMPT_QUERY_UNDERSTANDING, cur_query=cur_query, prev_query=prev_query)
+    messages = [
+        {"role": "system", "content": "You are an assistant skilled in search related decision making and text to SQL translation."},
+        {"role": "user", "content": prompt}
+    ]
+    understanding = openai_client.infer_metadata(messages, QueryUnderstanding)
+    if understanding is not None:
+        # Raw fields were found but no clause came back: translate them on their own
+        inferred_raw_fields = understanding.raw_fields.get_true_fields()
+        if mention_raw_fields and inferred_raw_fields and not understanding.sql_clauses:
+            logging.warning(f"No SQL clauses inferred for raw fields {inferred_raw_fields}, falling back to text_to_sql")
+            sql_clauses = text_to_sql(cur_query, inferred_raw_fields)
+            if sql_clauses is not None:
+                understanding.sql_clauses = sql_clauses.sql_clauses
+        return understanding
+
+    logging.warning("Combined query understanding failed, falling back to the per-step inferences")
+    action = query_understanding_executor.submit(infer_action, cur_query, prev_query)
+    semantic_fields = query_understanding_executor.submit(infer_mentioned_metadata_fields, cur_query, True)
+    raw_fields = query_understanding_executor.submit(infer_mentioned_metadata_fields, cur_query, False)
+    raw_fields = raw_fields.result()
+    sql_clauses = text_to_sql(cur_query, raw_fields.get_true_fields()) if mention_raw_fields and raw_fields else None
+    if action.result() is None or semantic_fields.result() is None or raw_fields is None:
+        raise RuntimeError("Failed to process the query understanding.")
+    return QueryUnderstanding(
+        action=action.result(),
+        semantic_fields=semantic_fields.result(),
+        raw_fields=raw_fields,
+        sql_clauses=sql_clauses.sql_clauses if sql_clauses else [],
+    )
+
+def infer_mentioned_fields(cur_query):
+    """ Mentioned semantic and raw metadata fields, inferred in parallel """
+    semantic_fields = query_understanding_executor.submit(infer_mentioned_metadata_fields, cur_query, True)
+    raw_fields = query_understanding_executor.submit(infer_mentioned_metadata_fields, cur_query, False)
+    return semantic_fields.result(), raw_fields.result()
+
 def text_to_sql(cur_query, identified_fields):
     try:
         prompt = format_prompt(PROMPT_SQL_TRANSLATION, cur_query=cur_query, identified_fields=identified_fields)
@@ -217,51 +305,41 @@ def execute_sql(text_to_sql_instance, search_space):
         'geographic_granularity': 'geo_granu'
     }
 
-    with DatabaseConnection() as db:
-        # Base query with initial WHERE condition for the search space
-        query_base = sql.SQL("SELECT DISTINCT table_name, popularity, db_description, tags, col_num, time_granu, geo_granu, comb_embed, query_embed FROM eval_final_all_with_descriptions WHERE table_name = ANY(%s)")
-        where_conditions = []  # List to hold additional conditions
-        logging.info(where_conditions)
-        ordering = []  # List to hold ORDER BY conditions
-        logging.info(ordering)
-
-        parameters = [search_space]  # List to hold all parameters for the SQL query
-
-        for clause in text_to_sql_instance.sql_clauses:
-            db_field = field_to_column_mapping.get(clause.field.lower())
-            if not db_field:
-                logging.warning(f"Error with the raw metadata field inference: {clause.field}")
+    clauses = []  # List to hold (field, operator, value) conditions
+    ordering = []  # List to hold ORDER BY conditions
+    for clause in text_to_sql_instance.sql_clauses:
+        db_field = field_to_column_mapping.get(clause.field.lower())
+        if not db_field:
+            logging.warning(f"Error with the raw metadata field inference: {clause.field}")
+            continue
+
+        if 'ORDER BY' in clause.clause:
+            parts = clause.clause.split()
+            direction = parts[-1]  # Assumes format "ORDER BY field_name DESC/ASC"
+            ordering.append((db_field, direction))
+        else:
+            operator, value = clause.clause.split(' ', 1)
+            if operator.upper() == "IN":
+                # "IN ('state', 'province')": any of the values, an overlap on array fields
+                clauses.append((db_field, "=", [item.lower() for item in re.findall(r"'([^']*)'", value)]))
                 continue
+            value = value.strip("'").lower()  # Strip quotes and convert to lowercase
+            clauses.append((db_field, operator, value))
+
+    with DatabaseConnection() as db:
+        column_types = get_column_types(db)
+        columns = [column for column in EXECUTE_SQL_COLUMNS if column in column_types]
+        query, parameters, skipped = build_metadata_query(
+            column_types, clauses, search_space or [], columns=columns, ordering=ordering, distinct=not is_table_name_unique(db)
+        )
+        if skipped:
+            logging.warning(f"Skipping invalid metadata clauses: {skipped}")
 
-            if 'ORDER BY' in clause.clause:
-                parts = clause.clause.split()
-                direction = parts[-1]  # Assumes format "ORDER BY field_name DESC/ASC"
-                ordering.append(sql.SQL("{} {}").format(sql.Identifier(db_field), sql.SQL(direction)))
-            else:
-                operator, value = clause.clause.split(' ', 1)
-                value = value.strip("'").lower()  # Strip quotes and convert to lowercase
-                if db_field in ['time_granu', 'geo_granu']:
-                    # Using unnest to compare elements in an array field
-                    condition = sql.SQL("EXISTS (SELECT 1 FROM unnest({}) AS elem WHERE elem {} %s)").format(
-                        sql.Identifier(db_field), sql.SQL(operator))
-                    where_conditions.append(condition)
-                    parameters.append(value)  # Add value to parameters list
-                else:
-                    condition = sql.SQL("{} {} %s").format(sql.Identifier(db_field), sql.SQL(operator))
-                    where_conditions.append(condition)
-                    parameters.append(value)  # Add value to parameters list
-
-        # Combine additional WHERE conditions and ORDER BY clauses into the base query
-        if where_conditions:
-            query_base = query_base + sql.SQL(" AND ") + sql.SQL(" AND ").join(where_conditions)
-        if ordering:
-            query_base = query_base + sql.SQL(" ORDER BY ") + sql.Composed(ordering)
-
-        logging.info("🏃Executing query: %s", query_base.as_string(db.conn))
+        logging.info("🏃Executing query: %s", query.as_string(db.conn))
 
         # Execute the query
         try:
-            db.cursor.execute(query_base, parameters)  # Pass the parameters list
+            db.cursor.execute(query, parameters)  # Pass the parameters list
             results = db.cursor.fetchall()
             return results
         except Exception as e:
@@ -269,62 +347,22 @@ def execute_sql(text_to_sql_instance, search_space):
             return []
         
 def execute_metadata_sql(sql_clauses, search_space):
-    with DatabaseConnection() as db:
-        # Base query with initial WHERE condition for the search space
-        query_base = sql.SQL("SELECT DISTINCT * FROM eval_final_all_with_descriptions WHERE table_name = ANY(%s)")
-        where_conditions = []  # List to hold additional conditions
-        parameters = [search_space]  # List to hold all parameters for the SQL query
-
-        for clause in sql_clauses:
-            db_field, operator, value = clause['Field'], clause['Operator'], clause['Parameter']
-            if db_field in ['time_granu', 'geo_granu']:
-                # Using unnest to compare elements in an array field
-                condition = sql.SQL("EXISTS (SELECT 1 FROM unnest({}) AS elem WHERE elem {} %s)").format(
-                    sql.Identifier(db_field), sql.SQL(operator))
-                where_conditions.append(condition)
-                parameters.append(value)  # Add value to parameters list
-            else:
-                condition = sql.SQL("{} {} %s").format(sql.Identifier(db_field), sql.SQL(operator))
-                where_conditions.append(condition)
-                parameters.append(value)  # Add value to parameters list
-
-        # Combine additional WHERE conditions and ORDER BY clauses into the base query
-        if where_conditions:
-            query_base = query_base + sql.SQL(" AND ") + sql.SQL(" AND ").join(where_conditions)
-       
-        logging.info("🏃Executing query: %s", query_base.as_string(db.conn))
+    clauses = [(clause['Field'], clause['Operator'], clause['Parameter']) for clause in sql_clauses]
 
-        # Execute the query
-        try:
-            db.cursor.execute(query_base, parameters)  # Pass the parameters list
-            results = db.cursor.fetchall()
-            return results
-        except Exception as e:
-            logging.error(f"SQL execution failed, Error: {e}")
-            return []
-        
-def execute_metadata_sql(db_field, operator, value, search_space):
     with DatabaseConnection() as db:
-        # Base query with initial WHERE condition for the search space
-        query_base = sql.SQL("SELECT DISTINCT * FROM eval_final_all_with_descriptions WHERE table_name = ANY(%s)")
-        where_conditions = []  # List to hold additional conditions
-        parameters = [search_space]  # List to hold all parameters for the SQL query
+        query, parameters, skipped = build_metadata_query(
+            get_column_types(db), clauses, search_space or [], distinct=not is_table_name_unique(db)
+        )
+        if skipped:
+            logging.warning(f"Skipping invalid metadata clauses: {skipped}")
 
-        condition = sql.SQL("{} {} %s").format(sql.Identifier(db_field), sql.SQL(operator))
-        where_conditions.append(condition)
-        parameters.append(value)  # Add value to parameters list
-
-        # Combine additional WHERE conditions and ORDER BY clauses into the base query
-        if where_conditions:
-            query_base = query_base + sql.SQL(" AND ") + sql.SQL(" AND ").join(where_conditions)
-       
-        logging.info("🏃Executing query: %s", query_base.as_string(db.conn))
+        logging.info("🏃Executing query: %s", query.as_string(db.conn))
 
         # Execute the query
         try:
-            db.cursor.execute(query_base, parameters)  # Pass the parameters list
+            db.cursor.execute(query, parameters)  # Pass the parameters list
             results = db.cursor.fetchall()
             return results
         except Exception as e:
             logging.error(f"SQL execution failed, Error: {e}")
-            return []
\ No newline at end of file
+            return []
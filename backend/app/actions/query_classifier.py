@@ -0,0 +1,105 @@
+import re
+
+# Cues that a follow-up query starts over, or narrows the previous results
+RESET_CUES = re.compile(
+    r"\b(instead|start over|new search|something else|never mind|forget (?:it|that|this)|"
+    r"different (?:topic|task|data(?:sets?)?))\b", re.IGNORECASE)
+REFINE_CUES = re.compile(
+    r"^\s*(only|just|also|but|with|without|filter|narrow|restrict|limit|keep|exclude)\b|"
+    r"\b(of these|among these|from these|those with|ones with|that have|which have|narrow (?:it|them) down)\b", re.IGNORECASE)
+
+SEMANTIC_FIELD_CUES = {
+    "table_schema": re.compile(r"\b(attributes?|fields?|schema|variables?|(?<!\d )columns? (?:for|on|about|with|like|named|called))\b", re.IGNORECASE),
+    "example_records": re.compile(r"\b(rows? (?:for|of|about|with|like)|records?|entries|example values?)\b", re.IGNORECASE),
+    "table_description": re.compile(r"\b(descriptions?|described as)\b", re.IGNORECASE),
+    "table_tags": re.compile(r"\b(tags?|tagged|topics?|categor(?:y|ies))\b", re.IGNORECASE),
+}
+
+# Raw field cues with the WHERE / ORDER BY clause they translate to, in execute_sql's format
+COLUMN_COUNT_CUE = re.compile(
+    r"\b(more than|over|at least|fewer than|less than|under|at most|exactly)\s+(\d+)\s+columns?\b", re.IGNORECASE)
+COLUMN_COUNT_OPERATORS = {
+    "more than": ">", "over": ">", "at least": ">=",
+    "fewer than": "<", "less than": "<", "under": "<", "at most": "<=", "exactly": "=",
+}
+POPULARITY_CUE = re.compile(r"\b(most popular|most downloaded|popular|widely used)\b", re.IGNORECASE)
+TABLE_NAME_CUE = re.compile(r"\b(?:tables?|datasets?)\s+(?:named|called)\s+['\"]?([\w\-]+)", re.IGNORECASE)
+TEMPORAL_GRANULARITY_PATTERNS = {
+    "year": r"yearly|annual(?:ly)?|(?:by|per|each) year",
+    "quarter": r"quarterly|(?:by|per|each) quarter",
+    "month": r"monthly|(?:by|per|each) month",
+    "week": r"weekly|(?:by|per|each) week",
+    "day": r"daily|(?:by|per|each) day",
+    "hour": r"hourly|(?:by|per|each) hour",
+    "minute": r"(?:by|per|each) minute",
+    "second": r"(?:by|per|each) second",
+}
+# Keyed by the values stored in geo_granu; a cue can stand for several of them
+GEOGRAPHIC_GRANULARITY_PATTERNS = {
+    ("continent",): r"(?:by|per|each) continent|continent[- ]level",
+    ("country",): r"(?:by|per|each) country|country[- ]level|national",
+    ("state", "province"): r"(?:by|per|each) (?:state|province)|(?:state|province)[- ]level",
+    ("county", "district"): r"(?:by|per|each) (?:county|district)|(?:county|district)[- ]level",
+    ("city",): r"(?:by|per|each) city|city[- ]level",
+    ("zip code", "postal code"): r"(?:by|per|each) (?:zip|postal) code|(?:zip|postal) code[- ]level",
+}
+TEMPORAL_GRANULARITY_CUES = {value: re.compile(rf"\b(?:{cue})\b", re.IGNORECASE) for value, cue in TEMPORAL_GRANULARITY_PATTERNS.items()}
+GEOGRAPHIC_GRANULARITY_CUES = {value: re.compile(rf"\b(?:{cue})\b", re.IGNORECASE) for value, cue in GEOGRAPHIC_GRANULARITY_PATTERNS.items()}
+
+
+def classify_action(cur_query, prev_query):
+    """ "reset" / "refine" when exactly one kind of cue matches, else None """
+    if not prev_query:
+        return None
+    reset, refine = bool(RESET_CUES.search(cur_query)), bool(REFINE_CUES.search(cur_query))
+    if reset == refine:
+        return None
+    return "reset" if reset else "refine"
+
+def classify_semantic_fields(cur_query):
+    return [field for field, cue in SEMANTIC_FIELD_CUES.items() if cue.search(cur_query)]
+
+def classify_raw_fields(cur_query):
+    """ Raw fields mentioned in the query with their SQL clauses, as (field, clause) pairs """
+    clauses = []
+    for match in COLUMN_COUNT_CUE.finditer(cur_query):
+        clauses.append(("column_numbers", f"{COLUMN_COUNT_OPERATORS[match.group(1).lower()]} {match.group(2)}"))
+    if POPULARITY_CUE.search(cur_query):
+        clauses.append(("popularity", "ORDER BY popularity DESC"))
+    match = TABLE_NAME_CUE.search(cur_query)
+    if match:
+        clauses.append(("table_name", f"ILIKE '%{match.group(1)}%'"))
+    for field, cues in (("temporal_granularity", TEMPORAL_GRANULARITY_CUES), ("geographic_granularity", GEOGRAPHIC_GRANULARITY_CUES)):
+        values = [value for value, cue in cues.items() if cue.search(cur_query)]
+        # Two granularities of the same kind are ambiguous
+        if len(values) > 1:
+            return None
+        if values and isinstance(values[0], tuple):
+            # Any of the stored values matches, which execute_sql turns into an array overlap
+            clauses.append((field, "IN (" + ", ".join(f"'{value}'" for value in values[0]) + ")"))
+        elif values:
+            clauses.append((field, f"= '{values[0]}'"))
+    return clauses
+
+def classify_query(cur_query, prev_query, mention_semantic_fields, mention_raw_fields):
+    """ Keyword-rule classification of a follow-up query: (action, semantic fields, raw fields, [(field, clause), ...]).
+    Returns None unless every part the query needs was matched unambiguously, so the LLM handles the rest """
+    if not cur_query:
+        return None
+    action = classify_action(cur_query, prev_query)
+    if action is None:
+        return None
+    if action == "reset":
+        return action, [], [], []
+
+    semantic_fields, raw_fields, sql_clauses = [], [], []
+    if mention_semantic_fields:
+        semantic_fields = classify_semantic_fields(cur_query)
+        if not semantic_fields:
+            return None
+    if mention_raw_fields:
+        sql_clauses = classify_raw_fields(cur_query)
+        if not sql_clauses:
+            return None
+        raw_fields = list(dict.fromkeys(field for field, _ in sql_clauses))
+    return action, semantic_fields, raw_fields, sql_clauses
@@ -0,0 +1,41 @@
+from rapidfuzz import fuzz, process
+import numpy as np
+
+FUZZY_THRESHOLD = 80
+# thefuzz rounds rapidfuzz's float score to an int, so "int score >= 80" is "float score >= 79.5"
+FUZZY_SCORE_CUTOFF = FUZZY_THRESHOLD - 0.5
+
+
+class FuzzyTextIndex:
+    """ Vocabulary of one text field with token -> row postings; each search term is scored
+    against the distinct tokens once instead of against every word of every row """
+    def __init__(self, row_tokens):
+        self.size = len(row_tokens)
+        vocabulary = {}
+        token_id = vocabulary.setdefault
+        flat_tokens = [token for tokens in row_tokens for token in tokens or []]
+        self.token_ids = np.fromiter((token_id(token, len(vocabulary)) for token in flat_tokens), dtype=np.int64, count=len(flat_tokens))
+        self.row_ids = np.repeat(np.arange(self.size), [len(tokens or []) for tokens in row_tokens])
+        self.vocabulary = list(vocabulary)
+        # Rows without a string or list value are not constrained by text filters
+        self.unconstrained = np.array([tokens is None for tokens in row_tokens], dtype=bool)
+        self._term_rows = {}
+
+    def term_rows(self, term):
+        """ Bitmap of the rows with at least one token fuzzy matching term """
+        if term not in self._term_rows:
+            rows = np.zeros(self.size, dtype=bool)
+            if self.vocabulary:
+                scores = process.cdist([term], self.vocabulary, scorer=fuzz.partial_ratio,
+                                       score_cutoff=FUZZY_SCORE_CUTOFF, dtype=np.float32)[0]
+                matched_tokens = scores >= FUZZY_SCORE_CUTOFF
+                rows[self.row_ids[matched_tokens[self.token_ids]]] = True
+            self._term_rows[term] = rows
+        return self._term_rows[term]
+
+    def match(self, terms):
+        """ Bitmap of the rows matching every term """
+        rows = np.ones(self.size, dtype=bool)
+        for term in terms:
+            rows &= self.term_rows(term)
+        return rows | self.unconstrained
@@ -1,12 +1,19 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
 from uuid import uuid4
 import logging
 from backend.app.table_representation.openai_client import OpenAIClient
-from backend.app.hyse.hypo_schema_search import hyse_search, most_popular_datasets, get_datasets, hnsw_search, hnsw_semantics_search
-from backend.app.actions.infer_action import infer_action, infer_mentioned_metadata_fields, prune_query, TaskReasonListResponse
+from backend.app.hyse.hypo_schema_search import hyse_search, stream_hyse_search, most_popular_datasets, get_datasets, hnsw_semantics_search, fetch_table_embeddings
+from backend.app.hyse.vector_index import refresh_vector_indexes
+from backend.app.hyse.column_clusters import cluster_columns
+from backend.app.actions.infer_action import infer_mentioned_metadata_fields, infer_mentioned_fields, understand_query, prune_query, TaskReasonListResponse, TextToSQL
 from backend.app.actions.handle_action import handle_semantic_fields, handle_raw_fields, handle_raw_filters
+from backend.app.actions.filter_engine import apply_filters
+from backend.app.chat.result_sessions import register_results, resolve_result_session
+from backend.app.chat.relevance_worker import active_filters, get_relevance, precompute_relevance
 from backend.app.chat.handle_chat_history import append_user_query, append_system_response, get_user_queries, get_last_results, get_mentioned_fields
+from backend.app.utils.embedding_codec import decode_embedding
+from backend.app.db.connect_db import get_connection_pool
 from backend.app.db.table_schema import table_schema_dict, table_schema_dict_frontend, metadata_filtering_operations, metadata_values, metadata_descriptions
 
 import json
@@ -16,6 +23,7 @@ import time
 import asyncio
 import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any
 import autogen
 from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager, ConversableAgent, Agent
@@ -27,7 +35,6 @@ import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import cosine_similarity
-from thefuzz import fuzz, process
 
 
 # Flask app configuration
@@ -59,8 +66,16 @@ llm_config = {
 }
 
 
+# Per-cluster query suggestions run concurrently, each completion bounded by a timeout
+SUGGESTION_MAX_WORKERS = int(os.getenv("SUGGESTION_MAX_WORKERS", 10))
+SUGGESTION_CALL_TIMEOUT = float(os.getenv("SUGGESTION_CALL_TIMEOUT", 20))
+suggestion_executor = ThreadPoolExecutor(max_workers=SUGGESTION_MAX_WORKERS, thread_name_prefix="suggestion")
+
 # https://www.youtube.com/watch?v=4mO2TmDervU&ab_channel=YeyuLab
 
+def expired_session_response():
+    return jsonify({"error": "Unknown or expired search_id"}), 404
+
 #########
 # When start chat session, create a new thread (conversation session between an Assistant and a user).
 #########
@@ -113,8 +128,8 @@ def update_chat_history():
     try:
         # Identify metadata fields
         # TODO: Make sure for user's initial query, mention_semantic_fields is always True
-        semantic_fields_identified = infer_mentioned_metadata_fields(cur_query=query, semantic_metadata=True).get_true_fields()
-        raw_fields_identified = infer_mentioned_metadata_fields(cur_query=query, semantic_metadata=False).get_true_fields()
+        semantic_fields, raw_fields = infer_mentioned_fields(query)
+        semantic_fields_identified, raw_fields_identified = semantic_fields.get_true_fields(), raw_fields.get_true_fields()
 
         # Update chat history with additional metadata field information
         append_user_query(chat_history, thread_id, query, bool(semantic_fields_identified), bool(raw_fields_identified))
@@ -139,6 +154,32 @@ def get_most_popular_datasets():
     return jsonify(popular_results)
 
 
+#########
+# This function reloads the in-process vector indexes after the corpus changed.
+#########
+@app.route('/api/refresh_vector_index', methods=['POST'])
+def refresh_vector_index():
+    try:
+        refreshed = refresh_vector_indexes()
+        logging.info(f"✅Refreshed vector indexes: {refreshed}")
+        return jsonify({"success": True, "refreshed": refreshed}), 200
+    except Exception as e:
+        logging.error(f"Vector index refresh failed, Error: {e}")
+        return jsonify({"error": "Vector index refresh failed due to an internal error"}), 500
+
+
+#########
+# This function reports the database connection pool metrics: checkouts, timeouts, reconnects and wait times.
+#########
+@app.route('/api/health', methods=['GET'])
+def health():
+    try:
+        return jsonify({"status": "ok", "db_pool": get_connection_pool().get_metrics()}), 200
+    except Exception as e:
+        logging.error(f"Health check failed, Error: {e}")
+        return jsonify({"status": "error", "error": "Database connection pool unavailable"}), 503
+
+
 #########
 # This function does first initial hyse_search based on first query.
 #########
@@ -164,7 +205,11 @@ def initial_search():
         response_data = {
             "top_results": initial_results[:10],
             "complete_results": initial_results[:100],
+            # Follow-up filter / suggestion endpoints can reference this result set instead of posting it back
+            "search_id": register_results(initial_results[:100]),
         }
+        # The result cards' relevance explanations are ready by the time they are opened
+        precompute_relevance(initial_results, initial_query)
 
         logging.info(f"✅Search successful for query: {initial_query}")
         # logging.info(f"💬 Current chat history: {chat_history}")
@@ -174,6 +219,44 @@ def initial_search():
         logging.error(f"Search failed for query: {initial_query}, Error: {e}")
         return jsonify({"error": "Search failed due to an internal error"}), 500
 
+def sse_event(event, data):
+    """ One Server-Sent Event, serialized like jsonify """
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+#########
+# Streaming variant of hyse_search: a preliminary ranking from the raw query first, then one update per hypothetical schema.
+# GET ?query=... works with EventSource; POST {"query": ...} with a streaming fetch.
+#########
+@app.route('/api/hyse_search/stream', methods=['GET', 'POST'])
+def stream_search():
+    initial_query = request.args.get('query') if request.method == 'GET' else (request.json or {}).get('query')
+
+    if not initial_query or len(initial_query.strip()) == 0:
+        logging.error("Empty query provided")
+        return jsonify({"error": "No query provided"}), 400
+
+    def generate():
+        try:
+            for stage, results, num_probes in stream_hyse_search(initial_query, search_space=None, num_schema=3, k=100):
+                response_data = {
+                    "stage": stage,
+                    "num_probes": num_probes,
+                    "top_results": results[:10],
+                    "complete_results": results[:100],
+                }
+                if stage == "final":
+                    response_data["search_id"] = register_results(results[:100])
+                    precompute_relevance(results, initial_query)
+                yield sse_event(stage, response_data)
+            logging.info(f"✅Streaming search successful for query: {initial_query}")
+        except Exception as e:
+            logging.error(f"Streaming search failed for query: {initial_query}, Error: {e}")
+            yield sse_event("error", {"error": "Search failed due to an internal error"})
+
+    # No proxy buffering, so each event reaches the client as soon as it is ready
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
 #########
 # This function 
 #########
@@ -191,15 +274,16 @@ def refine_search_space():
         # logging.info(f"📩Current cached results: {cached_results}")
 
         # Initialize defaults
-        refined_results, inferred_semantic_fields, inferred_raw_fields = [], [], []
+        refined_results, inferred_semantic_fields, inferred_raw_fields, sql_clauses = [], [], [], []
 
         # Get user current and previous queries
         cur_query, prev_query = get_user_queries(chat_history, thread_id)
         # Check if the current query mentions semantic / raw metadata fields
         mention_semantic_fields, mention_raw_fields = get_mentioned_fields(chat_history, thread_id)
 
-        # Step 1: Determine action (reset / refine) based on query delta
-        inferred_action = infer_action(cur_query=cur_query, prev_query=prev_query)
+        # Step 1: Determine action (reset / refine), mentioned fields and SQL clauses in one stage
+        understanding = understand_query(cur_query, prev_query, mention_semantic_fields, mention_raw_fields)
+        inferred_action = understanding.action
         logging.info(f"✅Inferred action for current query '{cur_query}' and previous query '{prev_query}': {inferred_action.model_dump()}")
 
         # Neither reset nor refine: error with LLM inference
@@ -219,7 +303,7 @@ def refine_search_space():
         # Step 3.1: Handle mentioned SEMANTIC metadata fields in user current query
         if mention_semantic_fields:
             # Identify mentioned semantic metadata fields
-            inferred_semantic_fields = infer_mentioned_metadata_fields(cur_query=cur_query, semantic_metadata=True).get_true_fields()
+            inferred_semantic_fields = understanding.semantic_fields.get_true_fields()
             logging.info(f"✅Inferred mentioned semantic metadata fields for current query '{cur_query}': {inferred_semantic_fields}")
 
             # TODO: Filter semantic refined results based on cosine similarity scores for better precision?
@@ -229,10 +313,12 @@ def refine_search_space():
         # Step 3.2: Handle mentioned RAW metadata fields in user current query
         if mention_raw_fields:
             # Identify mentioned raw metadata fields
-            inferred_raw_fields = infer_mentioned_metadata_fields(cur_query=cur_query, semantic_metadata=False).get_true_fields()
+            inferred_raw_fields = understanding.raw_fields.get_true_fields()
             logging.info(f"✅Inferred mentioned raw metadata fields for current query '{cur_query}': {inferred_raw_fields}")
             
-            sql_clauses, refined_results = handle_raw_fields(cur_query, inferred_raw_fields, search_space=cached_results)
+            sql_clauses, refined_results = handle_raw_fields(
+                cur_query, inferred_raw_fields, search_space=cached_results, sql_clauses=TextToSQL(sql_clauses=understanding.sql_clauses)
+            )
             append_system_response(chat_history, thread_id, refined_results, refine_type="raw")
 
         # logging.info(f"💬Current chat history: {chat_history}")
@@ -308,6 +394,7 @@ def refine_metadata():
             "mention_semantic_fields": inferred_semantic_fields,
             "mention_raw_fields": inferred_raw_fields,   
             "filter_prompts" : sql_clauses,         
+            "search_id": register_results(refined_results) if isinstance(refined_results, list) else None,
         }
 
         return jsonify(response_data), 200
@@ -321,99 +408,40 @@ def refine_metadata():
 @app.route('/api/suggest_relevant_cols', methods=['POST'])
 def suggest_relevant_cols():
     task_description = request.json.get('task')  
-    results_data = request.json.get('results')  
-    results_df = pd.DataFrame(results_data)  # Convert results to a DataFrame for easier processing
-
-    # Initialize lists to store embeddings, column names, and dataset names
-    column_embeddings = []  
-    column_names = []  
-    dataset_names = []  
+    session = resolve_result_session(request.json)
+    if session is None:
+        return expired_session_response()
+    results_df = session.frame  # DataFrame view of the results, built once per result set
 
     logging.info("SUGGEST_RELEVANT_COLS")
-    # Iterate through each row in the results DataFrame and extract the example schema
-    for _, row in results_df.iterrows():
-        column_embedding_dict = ast.literal_eval(row['example_cols_embed'])
-        dataset_name = row['table_name'] 
-        for column_name, embedding in column_embedding_dict.items():
-            if isinstance(embedding, (list, np.ndarray)) and len(embedding) == 1536:
-                column_names.append(column_name)  
-                column_embeddings.append(embedding) 
-                dataset_names.append(dataset_name)
-            else:
-                logging.warning(f"❌ Skipping column '{column_name}' in dataset '{dataset_name}': Expected length 1536, got {len(embedding) if isinstance(embedding, (list, np.ndarray)) else 'Invalid type'}")
-
-    # Convert the list of embeddings into a NumPy array (one embedding per row)
-    embedding_matrix = np.array(column_embeddings)
-    logging.info(f"Embedding matrix shape: {embedding_matrix.shape}")
-
-    # Perform K-Means clustering on the embeddings
-    num_clusters = 15  # Number of clusters to create (can be adjusted based on data)
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-    kmeans.fit(embedding_matrix)
-
-    # Initialize dictionaries to store columns and datasets by cluster
-    columns_by_cluster = {}  
-    datasets_by_cluster = {}  
-
-    # Assign columns and datasets to their respective clusters
-    for idx, column_name in enumerate(column_names):
-        cluster_id = kmeans.labels_[idx]  
-        dataset_name = dataset_names[idx] 
-
-        # Initialize lists for the cluster if they don't exist
-        if cluster_id not in columns_by_cluster:
-            columns_by_cluster[cluster_id] = []
-            datasets_by_cluster[cluster_id] = []
-
-        columns_by_cluster[cluster_id].append(column_name)
-        datasets_by_cluster[cluster_id].append(dataset_name)
-
-    # Log the columns and datasets in each cluster
-    for cluster_id, columns in sorted(columns_by_cluster.items()):
-        logging.info(f"Cluster {cluster_id} columns: {columns}")
-        logging.info(f"Cluster {cluster_id} datasets: {datasets_by_cluster[cluster_id]}")
-
-    # Calculate the average embedding for each cluster
-    average_embeddings_by_cluster = {}
-    for idx, cluster_id in enumerate(kmeans.labels_):
-        if cluster_id not in average_embeddings_by_cluster:
-            average_embeddings_by_cluster[cluster_id] = []
-        average_embeddings_by_cluster[cluster_id].append(embedding_matrix[idx])
-
-    # Compute the mean embedding for each cluster
-    mean_embeddings_by_cluster = {}
-    for cluster_id, embeddings in average_embeddings_by_cluster.items():
-        mean_embeddings_by_cluster[cluster_id] = np.mean(np.array(embeddings), axis=0)
-
-    # Calculate the similarity between the task embedding and each cluster's mean embedding
+    # Column embeddings are parsed once per table and clusterings are cached per search space
+    clustering = cluster_columns(results_df['table_name'].tolist())
+    if clustering is None:
+        return jsonify({"top_clusters": [], "columns_in_clusters": [], "datasets_in_clusters": [], "consolidated_results": []})
+
+    # Gather the columns and datasets of each cluster
+    columns_by_cluster = {}
+    datasets_by_cluster = {}
+    for cluster_id in clustering.cluster_ids:
+        columns_by_cluster[int(cluster_id)], datasets_by_cluster[int(cluster_id)] = clustering.members(cluster_id)
+        logging.info(f"Cluster {cluster_id} columns: {columns_by_cluster[int(cluster_id)]}")
+        logging.info(f"Cluster {cluster_id} datasets: {datasets_by_cluster[int(cluster_id)]}")
+
+    # Rank clusters by the similarity between the task embedding and each cluster's mean embedding
     task_embedding = openai_client.generate_embeddings(task_description)  # Generate embedding for the task
-    similarity_by_cluster = {}
-
-    for cluster_id, mean_embedding in mean_embeddings_by_cluster.items():
-        mean_embedding = np.array(mean_embedding).reshape(1, -1) 
-        task_embedding = np.array(task_embedding).reshape(1, -1) 
-        similarity = cosine_similarity(mean_embedding, task_embedding)[0][0]  # 
-        similarity_by_cluster[cluster_id] = similarity
-
-    # Sort clusters by similarity in descending order
-    sorted_clusters_by_similarity = sorted(
-        similarity_by_cluster.items(), key=lambda x: x[1], reverse=True
-    )
-    
-    # Format the top clusters for the response
     top_clusters = [
-        {"cluster": int(cluster_id), "similarity": float(similarity)}
-        for cluster_id, similarity in sorted_clusters_by_similarity
+        {"cluster": cluster_id, "similarity": similarity}
+        for cluster_id, similarity in clustering.rank_clusters(task_embedding)
     ]
 
     # Extract column and dataset information for the top clusters
     top_columns_by_cluster = {
-        int(item["cluster"]): columns_by_cluster[int(item["cluster"])]
+        item["cluster"]: columns_by_cluster[item["cluster"]]
         for item in top_clusters
     }
 
     top_datasets_by_cluster = {
-    int(item["cluster"]): list(set(datasets_by_cluster[int(item["cluster"])]))
+    item["cluster"]: list(set(datasets_by_cluster[item["cluster"]]))
     for item in top_clusters
     }
 
@@ -477,78 +505,28 @@ def consolidate(clusters, task):
 
 @app.route('/api/relevance_map', methods=['POST'])
 def relevance_map():
-    results = request.json.get('results')
+    session = resolve_result_session(request.json)
+    if session is None:
+        return expired_session_response()
+    results = session.results
     task = request.json.get('task')
     filters = request.json.get('filters')
     index = request.json.get('index')
     logging.info(task)
     logging.info(filters)
-    filter_content = []
-    for filter in filters:
-        if filter["visible"] and filter['active']:
-            filter_content.append(filter['filter'])
+    filter_content = active_filters(filters)
     logging.info(filter_content)
 
-    results_df = pd.DataFrame(results)
     relevance_results = []
     
-    if index > len(results) or len(results)==0:
+    if index is None or index >= len(results):
         return jsonify({
         "results": relevance_results,
     })
 
-    schema = results_df.loc[index, 'example_rows_md']
-    description = results_df.loc[index, 'dataset_context']
-    source = results_df.loc[index, 'dataset_collection_method']
-    purpose = results_df.loc[index, 'dataset_purpose']
-
-    messages = [
-        {
-            "role": "system",
-            "content": f"""
-            You are an assistant that provides a dictionary with two keys: `isRelevant` and `notRelevant`. 
-
-            ### **Dataset Details:**
-            - **Description**: {description}  
-            - **Example Rows**: {schema}  
-            - **Purpose of dataset use**: {purpose}  
-            - **Collection Method**: {source} 
-
-            ### **Instructions:**  
-            1. **"isRelevant"** ✅ Identify the **strongest** factors that make this dataset useful. Consider:
-            - **Relevant attributes**
-            - **Data quality**
-            - **Matching features**
-            - 🔹 If there are **no strong advantages**, return `"No significant utilities"`.
-
-            2. **"notRelevant"** ❌ Identify **limitations** such as:
-            - **Missing attributes**
-            - **Specific geographical location, e.g. "dataset is only in x location"**
-            - **Time period, e.g. "dataset is only between x and y range"**
-            - **Incomplete data**
-            - 🔹 If no major issues exist, return `"No significant limitations"`.
-            
-            ### **Guidelines:**  
-            - **Stay factual**: Base responses strictly on the provided dataset details. Do not assume information that isn’t explicitly stated. Make sure to distinguish your sources from the example rows or description (includes description, purpose, and collection method). 
-            - **Be concise**: Limit each response to 1-2 sentences.  
-            - **Avoid hallucination**: If no strong reason exists for relevance or irrelevance, default to `"No significant utilities"` or `"No significant limitations"`.  
-            
-            ### **Expected Output Format:**  
-            Return your response as a dictionary with two keys: **"isRelevant"** and **"notRelevant"**, 
-            where each value is a short, clear reason."""
-        },
-        {
-            "role": "user",
-            "content": f"Evaluate the dataset for my task: {task}, using these filters: {filter_content}. Make sure to identify limitations that involve time and location. Distinguish if the information is from the description or the dataset preview. "
-        }
-    ]
-
-    result = openai_client.infer_metadata_wo_instructor(messages)
-    if isinstance(result, str):
-        try:
-            result = ast.literal_eval(result)
-        except (ValueError, SyntaxError) as e:
-            print("Error evaluating the result string:", e)
+    # Served from the background jobs started with the search; the other top results are queued for this filter set too
+    result = get_relevance(results[index], task, filter_content)
+    precompute_relevance(results, task, filter_content)
     relevance_results.append(result)
     logging.info(relevance_results)
 
@@ -560,15 +538,18 @@ def relevance_map():
 def and_dataset_filter():
     unique_datasets = request.json.get('uniqueDatasets')
     task = request.json.get('task')
-    results = request.json.get('results')
+    session = resolve_result_session(request.json)
+    if session is None:
+        return expired_session_response()
     
     # Filter the DataFrame to include only rows where 'table_name' is in unique_datasets
-    results_df = pd.DataFrame(results)
+    results_df = session.frame
     filtered_results_df = results_df[results_df["table_name"].isin(unique_datasets)]
-
+    filtered_results = filtered_results_df.to_dict(orient="records")
 
     return jsonify({
-        "filtered_results": filtered_results_df.to_dict(orient="records"),
+        "filtered_results": filtered_results,
+        "search_id": register_results(filtered_results),
     })
 
 @app.route('/api/reset_search_space', methods=['POST'])
@@ -668,85 +649,16 @@ def remaining_attributes():
 def remove_metadata_update():
     data = request.get_json()
     filters = data.get("filters")
-    results = data.get("results")
     unique_datasets = data.get("uniqueDatasets")
+    session = resolve_result_session(data)
+    if session is None:
+        return expired_session_response()
 
     logging.info(filters)
 
-    final_results = results  # Start with all results
-    for filter in filters:
-        selected_filter = filter["subject"]
-        search_value = filter["value"]
-        selected_operand = filter["operand"]
-
-        if selected_filter == "time_granularity":
-            selected_filter = "time_granu"
-        elif selected_filter == "geo_granularity":
-            selected_filter = "geo_granu"
-        elif selected_filter == "total downloads":
-            selected_filter = "popularity"
-        elif selected_filter =="file_size_in_MB":
-            selected_filter == "file_size_in_byte"
-
-
-        if selected_filter == "column_specification":
-            final_results = hnsw_search(search_value, final_results)
-        
-        elif selected_filter in ["time_granu", "geo_granu"]:  
-            temp_results = []
-            logging.info(search_value)
-            for row in final_results:
-                value = row.get(selected_filter)
-                if value and value.lower() == search_value.lower():
-                    temp_results.append(row)
-            final_results = temp_results
-
-        elif selected_filter in ["table_name", "database_name", "db_description", "tags", "keywords", "metadata_queries", "time_granu", "geo_granu"]:
-            clean_search_input = clean_input_value(search_value)
-            logging.info(clean_search_input)
-
-            temp_results = []
-            for row in final_results:
-                matches_all_inputs = True  
-
-                for input_value in clean_search_input:
-                    value = row.get(selected_filter)
-                    if isinstance(value, list):  
-                        if not any(fuzzy_match(input_value, str(item), 80) for item in value):
-                            matches_all_inputs = False
-                            break  
-                    elif isinstance(value, str):  
-                        words_in_value = value.split()
-                        if not any(fuzzy_match(input_value, word, 80) for word in words_in_value):
-                            matches_all_inputs = False
-                            break  
-
-                if matches_all_inputs:
-                    temp_results.append(row)
-
-            final_results = temp_results  # Update after filtering
-
-        elif selected_filter in ["popularity", "col_num", "row_num", "usability_rating", "file_size_in_byte"]:
-            df = pd.DataFrame(final_results)
-            if selected_filter == "usability_rating":
-                search_value = str(int(search_value) / 100)
-            elif selected_filter == "file_size_in_byte":
-                search_value = str(int(search_value) * 1024 * 1024)
-
-            query = f"{selected_filter} {selected_operand} {search_value}"
-            logging.info(query)
-            filtered_results = df.query(query).copy()
-            logging.info(len(filtered_results))
-            final_results = filtered_results.to_dict(orient="records")
-
-
-    results_df = pd.DataFrame(final_results)
-    if unique_datasets:
-        filtered_results_df = results_df[results_df["table_name"].isin(unique_datasets)].copy()
-    else:
-        filtered_results_df = results_df
-
-    return jsonify({"filtered_results": filtered_results_df.to_dict(orient="records")})
+    # All filters, including the dataset selection, are compiled into one plan over the session's columns
+    filtered_results = apply_filters(session, filters, unique_datasets)
+    return jsonify({"filtered_results": filtered_results, "search_id": register_results(filtered_results)})
 
 
            
@@ -759,110 +671,14 @@ def manual_metadata():
     selected_filter = request.get_json().get('selectedFilter')
     selected_operation = request.get_json().get('selectedOperation')
     search_input = request.get_json().get('value')
-    results = request.get_json().get('results')
+    session = resolve_result_session(request.get_json())
+    if session is None:
+        return expired_session_response()
     logging.info(selected_filter)
 
-    if selected_filter == "time_granularity":
-        selected_filter = "time_granu"
-    elif selected_filter == "geo_granularity":
-        selected_filter = "geo_granu"
-    elif selected_filter == "total downloads":
-        selected_filter = "popularity"
-    elif selected_filter =="file_size_in_MB":
-        selected_filter == "file_size_in_byte"
-
-
-    # HNSW search
-    if selected_filter == 'column_specification':
-        logging.info("COLUMN")
-        final_results = hnsw_search(search_input, results) 
-
-    # Exact search based on search input
-    elif selected_filter in ["time_granu", "geo_granu"]:  
-        final_results = []
-        logging.info(search_input)
-        for row in results:
-            value = row.get(selected_filter)
-            if value and value.lower() == search_input.lower():
-                final_results.append(row)
-
-    # Fuzzy search based on search input
-    elif selected_filter in ["table_name", "database_name", "db_description", "tags", "keywords", "metadata_queries"]:
-        clean_search_input = clean_input_value(search_input)
-        logging.info(clean_search_input)
-        final_results = []
-
-        # Iterate over each row in the results
-        for row in results:
-            # For each row, check if all inputs in clean_search_input match
-            matches_all_inputs = True  # Start assuming the row will match all inputs
-            
-            for input in clean_search_input:
-                value = row.get(selected_filter)
-                if isinstance(value, list):  # Handle lists (e.g., tags, keywords)
-                    # Check if any item in the list matches the current search input
-                    if not any(fuzzy_match(input, str(item), 80) for item in value):
-                        matches_all_inputs = False
-                        break  # No need to check further if one input doesn't match
-
-                elif isinstance(value, str):  # Handle single string fields
-                    words_in_value = value.split()  # Split the string into individual words
-                    # Check if any word in the value matches the current search input
-                    if not any(fuzzy_match(input, word, 80) for word in words_in_value):
-                        matches_all_inputs = False
-                        break  # No need to check further if one input doesn't match
-
-            # If the row matches all inputs, add it to the final results
-            if matches_all_inputs:
-                final_results.append(row)
-    
-    elif selected_filter in ["popularity", "col_num", "row_num", "usability_rating", "file_size_in_byte"]:
-        df = pd.DataFrame(results)
-        if selected_filter == "usability_rating":
-            search_input = str(int(search_input) / 100)
-        elif selected_filter == "file_size_in_byte":
-            search_input = str(int(search_input) * 1024 * 1024)
-        query = selected_filter + selected_operation + search_input
-        logging.info(query)
-
-        filtered_results = df.query(query)
-        logging.info(len(filtered_results))
-        final_results = filtered_results.to_dict(orient="records")
-
-    return jsonify({"results": final_results})
+    final_results = apply_filters(session, [{"subject": selected_filter, "operand": selected_operation, "value": search_input}])
 
-
-def fuzzy_match(query, value, threshold=80):
-    """Returns True if the fuzzy match score is above the threshold."""
-    return fuzz.partial_ratio(query.lower(), value.lower()) >= threshold
-
-def clean_input_value(search_input):
-    messages = [ 
-        {"role": "system", 
-        "content": f"""You are an assistant that processes user input and returns a list of strings. The user may provide search parameters in different formats. Here's how to handle each format:
-        
-        1. If the input is a single string (e.g., "x" or x), return a list with that string: [x].
-        2. If the input is multiple items separated by "and" (e.g., "x and y and z"), return a list with those items: [x, y, z].
-        3. If the input uses commas and "or" (e.g., "x, y, z or a, b, c"), return a combined list of all items from both parts: [x, y, z, a, b, c].
-        4. If the input uses "and" and commas together (e.g., "x, y and z"), split the input into individual items: [x, y, z].
-    
-        Your task is to parse the input and return the correct list of strings based on the format above.
-        """},
-        {"role": "user", "content": search_input}
-
-    ]
-
-    result = openai_client.infer_metadata_wo_instructor(messages)
-    logging.info(result)
-    if isinstance(result, str):  # Checking if result is a string
-        try:
-            # Safely evaluate the string to convert to a list or other Python literal
-            result = ast.literal_eval(result)
-        except (ValueError, SyntaxError) as e:
-            # Handle possible exceptions during evaluation
-            logging.error(f"Error evaluating string: {e}")
-            return jsonify({"error": "Invalid string format"}), 400
-    return result
+    return jsonify({"results": final_results, "search_id": register_results(final_results)})
 
 
 @app.route('/api/suggest_metadata', methods=['POST'])
@@ -954,8 +770,11 @@ def task_suggestions():
 def task_semantic_suggestion():
     logging.info("SEMANTIC SEARCH")
     task_description = request.json.get('task')  
-    results_data = request.json.get('results')  
     goal = request.json.get('goal')
+    session = resolve_result_session(request.json)
+    if session is None:
+        return expired_session_response()
+    results_data = session.results
 
     semantic_results = hnsw_semantics_search(goal + task_description, results_data)
     df = pd.DataFrame(semantic_results)
@@ -964,22 +783,22 @@ def task_semantic_suggestion():
     semantics_embeddings = []  
     dataset_names = []  
 
+    # Search results do not carry embeddings, so fetch the semantics embeddings of these tables
+    semantics_embeddings_by_table = fetch_table_embeddings(df['table_name'].tolist() if not df.empty else [], 'result_semantics_embed')
+
     # Iterate through each row in the results DataFrame
     for _, row in df.iterrows():
-        dataset_names.append(row['database_name'])
-        embed_str = row['result_semantics_embed']
-        if isinstance(embed_str, str):
-            try:
-                embedding = np.array(ast.literal_eval(embed_str), dtype=np.float32)
-                semantics_embeddings.append(embedding)
-            except (ValueError, SyntaxError) as e:
-                logging.warning(f"Could not parse embedding: {embed_str}")
-                continue
-        elif isinstance(embed_str, (list, np.ndarray)):
-            semantics_embeddings.append(np.array(embed_str, dtype=np.float32))
-        else:
-            logging.warning(f"Unexpected embedding format: {type(embed_str)}")
+        embed_value = semantics_embeddings_by_table.get(row['table_name'])
+        if embed_value is None:
+            logging.warning(f"Missing semantics embedding for {row['table_name']}")
+            continue
+        try:
+            # BYTEA values decode zero-copy; legacy text values are still parsed
+            semantics_embeddings.append(decode_embedding(embed_value))
+        except (ValueError, SyntaxError, TypeError) as e:
+            logging.warning(f"Could not parse embedding of {row['table_name']}: {e}")
             continue
+        dataset_names.append(row['database_name'])
 
     if not semantics_embeddings:
         return jsonify({"error": "No valid embeddings found"}), 400
@@ -1060,78 +879,92 @@ def task_semantic_suggestion():
     
     return jsonify(response_data)
 
+def infer_cluster_semantics(i, cluster, task, goal):
+    """ One suggested query (query -> reason) for a cluster of database names """
+    try:
+        messages = [
+            {
+                "role": "system",
+                "content": f"""
+                You are a helpful assistant that generates a vague search query based on a collection of database names.
+                For the given cluster of related database names, generate ONE VAGUE search query that:
+                1. Incorporates the common theme of these database names: {cluster}
+                2. Relates to the original task: {task}
+                3. Is specific enough to include both a topic and clear objective
+                
+                Also provide a brief reason (under 10 words) why this query improves upon the original.
+                
+                Return your response as a dictionary with exactly one key-value pair:
+                - Key: The refined query (should not contain anything about a specific location)
+                - Value: The improvement reason
+                
+                Example output format:
+                {{
+                    "Analyze voter demographics in presidential elections": "adds demographic focus"
+                }}
+                """
+            },
+            {
+                "role": "user",
+                "content": f"""
+                Database cluster to analyze:
+                {cluster}
+                
+                Original task: {task}
+                
+                Please generate one vague search query and reason for this database cluster. If goal: {goal} is not an empty string, all queries should be related to that but vary slightly with different variations of the task.
+                """
+            }
+        ]
+        
+        # Make individual API call for this cluster
+        result = openai_client.infer_metadata_wo_instructor(messages, timeout=SUGGESTION_CALL_TIMEOUT)
+        logging.info(f"Cluster {i} result: {result}")
+        
+        # Process the result
+        if isinstance(result, str):
+            try:
+                cluster_result = json.loads(result)
+                if isinstance(cluster_result, dict):
+                    return cluster_result
+            except json.JSONDecodeError:
+                try:
+                    cluster_result = ast.literal_eval(result)
+                    if isinstance(cluster_result, dict):
+                        return cluster_result
+                except (ValueError, SyntaxError):
+                    logging.warning(f"Could not parse result for cluster {i}: {result}")
+                    return {f"Cluster {i}": "Unable to generate query"}
+        elif isinstance(result, dict):
+            return result
+        return {}
+    except Exception as e:
+        logging.error(f"Error processing cluster {i}: {str(e)}")
+        return {f"Cluster {i} Error": str(e)}
+
 def consolidate_semantics(clusters, task, goal):
     logging.info("CONSOLIDATION")
     logging.info(clusters)
     clusters_serializable = [list(cluster) for cluster in clusters]
     logging.info(f"Consolidate clusters: {type(clusters_serializable)}")
 
+    # Prompt every cluster concurrently; clusters that miss the deadline are left out instead of delaying the rest
+    futures = [
+        suggestion_executor.submit(infer_cluster_semantics, i, cluster, task, goal)
+        for i, cluster in enumerate(clusters_serializable)
+    ]
+    waves = -(-len(futures) // SUGGESTION_MAX_WORKERS)
+    done, not_done = wait(futures, timeout=SUGGESTION_CALL_TIMEOUT * max(waves, 1))
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        logging.warning(f"{len(not_done)} of {len(futures)} cluster suggestions timed out, returning partial results")
+
     consolidated_results = {}
-    
-    # Process each cluster individually
-    for i, cluster in enumerate(clusters_serializable):
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"""
-                    You are a helpful assistant that generates a vague search query based on a collection of database names.
-                    For the given cluster of related database names, generate ONE VAGUE search query that:
-                    1. Incorporates the common theme of these database names: {cluster}
-                    2. Relates to the original task: {task}
-                    3. Is specific enough to include both a topic and clear objective
-                    
-                    Also provide a brief reason (under 10 words) why this query improves upon the original.
-                    
-                    Return your response as a dictionary with exactly one key-value pair:
-                    - Key: The refined query (should not contain anything about a specific location)
-                    - Value: The improvement reason
-                    
-                    Example output format:
-                    {{
-                        "Analyze voter demographics in presidential elections": "adds demographic focus"
-                    }}
-                    """
-                },
-                {
-                    "role": "user",
-                    "content": f"""
-                    Database cluster to analyze:
-                    {cluster}
-                    
-                    Original task: {task}
-                    
-                    Please generate one vague search query and reason for this database cluster. If goal: {goal} is not an empty string, all queries should be related to that but vary slightly with different variations of the task.
-                    """
-                }
-            ]
-            
-            # Make individual API call for this cluster
-            result = openai_client.infer_metadata_wo_instructor(messages)
-            logging.info(f"Cluster {i} result: {result}")
-            
-            # Process the result
-            if isinstance(result, str):
-                try:
-                    cluster_result = json.loads(result)
-                    if isinstance(cluster_result, dict):
-                        consolidated_results.update(cluster_result)
-                except json.JSONDecodeError:
-                    try:
-                        cluster_result = ast.literal_eval(result)
-                        if isinstance(cluster_result, dict):
-                            consolidated_results.update(cluster_result)
-                    except (ValueError, SyntaxError):
-                        logging.warning(f"Could not parse result for cluster {i}: {result}")
-                        consolidated_results[f"Cluster {i}"] = "Unable to generate query"
-            elif isinstance(result, dict):
-                consolidated_results.update(result)
-                
-        except Exception as e:
-            logging.error(f"Error processing cluster {i}: {str(e)}")
-            consolidated_results[f"Cluster {i} Error"] = str(e)
-            continue
-            
+    for future in futures:
+        if future in done:
+            consolidated_results.update(future.result())
+
     logging.info(f"Final consolidated results: {consolidated_results}")
     return consolidated_results
 
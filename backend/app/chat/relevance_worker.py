@@ -0,0 +1,123 @@
+import ast
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.app.table_representation.openai_client import OpenAIClient
+from backend.app.utils.cache import TTLCache
+
+openai_client = OpenAIClient()
+
+# isRelevant / notRelevant explanations of the top results are computed in the background once a search returns
+RELEVANCE_PRECOMPUTE_TOP_N = int(os.getenv("RELEVANCE_PRECOMPUTE_TOP_N", 10))
+RELEVANCE_MAX_WORKERS = int(os.getenv("RELEVANCE_MAX_WORKERS", 4))
+RELEVANCE_CALL_TIMEOUT = float(os.getenv("RELEVANCE_CALL_TIMEOUT", 30))
+RELEVANCE_CACHE_TTL = int(os.getenv("RELEVANCE_CACHE_TTL", 3600))
+
+relevance_executor = ThreadPoolExecutor(max_workers=RELEVANCE_MAX_WORKERS, thread_name_prefix="relevance")
+relevance_cache = TTLCache(max_items=4096, ttl=RELEVANCE_CACHE_TTL)
+# Explanations being computed, so a card opened mid-job waits for it instead of asking again
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+
+def active_filters(filters):
+    """ Filter contents of the visible, active UI filters """
+    return [f['filter'] for f in filters or [] if f.get("visible") and f.get('active')]
+
+def relevance_key(row, task, filter_content):
+    return (row.get('table_name'), task, repr(sorted(map(repr, filter_content))))
+
+def relevance_messages(row, task, filter_content):
+    return [
+        {
+            "role": "system",
+            "content": f"""
+            You are an assistant that provides a dictionary with two keys: `isRelevant` and `notRelevant`.
+
+            ### **Dataset Details:**
+            - **Description**: {row.get('dataset_context')}
+            - **Example Rows**: {row.get('example_rows_md')}
+            - **Purpose of dataset use**: {row.get('dataset_purpose')}
+            - **Collection Method**: {row.get('dataset_collection_method')}
+
+            ### **Instructions:**
+            1. **"isRelevant"** ✅ Identify the **strongest** factors that make this dataset useful. Consider:
+            - **Relevant attributes**
+            - **Data quality**
+            - **Matching features**
+            - 🔹 If there are **no strong advantages**, return `"No significant utilities"`.
+
+            2. **"notRelevant"** ❌ Identify **limitations** such as:
+            - **Missing attributes**
+            - **Specific geographical location, e.g. "dataset is only in x location"**
+            - **Time period, e.g. "dataset is only between x and y range"**
+            - **Incomplete data**
+            - 🔹 If no major issues exist, return `"No significant limitations"`.
+
+            ### **Guidelines:**
+            - **Stay factual**: Base responses strictly on the provided dataset details. Do not assume information that isn’t explicitly stated. Make sure to distinguish your sources from the example rows or description (includes description, purpose, and collection method).
+            - **Be concise**: Limit each response to 1-2 sentences.
+            - **Avoid hallucination**: If no strong reason exists for relevance or irrelevance, default to `"No significant utilities"` or `"No significant limitations"`.
+
+            ### **Expected Output Format:**
+            Return your response as a dictionary with two keys: **"isRelevant"** and **"notRelevant"**,
+            where each value is a short, clear reason."""
+        },
+        {
+            "role": "user",
+            "content": f"Evaluate the dataset for my task: {task}, using these filters: {filter_content}. Make sure to identify limitations that involve time and location. Distinguish if the information is from the description or the dataset preview. "
+        }
+    ]
+
+def explain_relevance(row, task, filter_content):
+    """ One LLM call for the isRelevant / notRelevant explanation of a result row """
+    result = openai_client.infer_metadata_wo_instructor(relevance_messages(row, task, filter_content), timeout=RELEVANCE_CALL_TIMEOUT)
+    if isinstance(result, str):
+        try:
+            result = ast.literal_eval(result)
+        except (ValueError, SyntaxError) as e:
+            print("Error evaluating the result string:", e)
+    return result
+
+def run_relevance_job(key, row, task, filter_content):
+    try:
+        result = explain_relevance(row, task, filter_content)
+        # Failed or unparsed replies are not cached, the next request asks again
+        if isinstance(result, dict):
+            relevance_cache.set(key, result)
+        return result
+    finally:
+        with in_flight_lock:
+            in_flight.pop(key, None)
+
+def submit_relevance(row, task, filter_content):
+    """ The cached explanation, or the future of the job computing it (started if needed) """
+    key = relevance_key(row, task, filter_content)
+    with in_flight_lock:
+        cached = relevance_cache.get(key)
+        if cached is not None:
+            return cached
+        future = in_flight.get(key)
+        if future is None:
+            future = relevance_executor.submit(run_relevance_job, key, row, task, filter_content)
+            in_flight[key] = future
+        return future
+
+def get_relevance(row, task, filter_content):
+    """ Explanation of one result row, served from the cache or the in-flight job when there is one """
+    result = submit_relevance(row, task, filter_content)
+    if isinstance(result, dict):
+        return result
+    try:
+        return result.result(timeout=RELEVANCE_CALL_TIMEOUT)
+    except Exception as e:
+        logging.error(f"Relevance explanation failed for {row.get('table_name')}: {e}")
+        return None
+
+def precompute_relevance(results, task, filter_content=None, top_n=RELEVANCE_PRECOMPUTE_TOP_N):
+    """ Start the explanations of the top_n results in the background """
+    if not task:
+        return
+    for row in results[:top_n]:
+        submit_relevance(row, task, filter_content or [])
@@ -0,0 +1,61 @@
+import json
+import os
+from uuid import uuid4
+import pandas as pd
+from backend.app.utils.cache import TTLCache
+from backend.app.actions.filter_engine import ColumnarResults
+
+# Server-side result sets so follow-up endpoints take a search_id instead of the full result list
+RESULT_SESSION_TTL = int(os.getenv("RESULT_SESSION_TTL", 1800))
+RESULT_SESSION_MAX_ITEMS = int(os.getenv("RESULT_SESSION_MAX_ITEMS", 1000))
+RESULT_SESSION_MAX_BYTES = int(os.getenv("RESULT_SESSION_MAX_BYTES", 256 * 1024 * 1024))
+# Rows serialized to estimate the size of a result set, instead of serializing all of them
+RESULT_SESSION_SAMPLE_ROWS = 5
+
+
+class ResultSession:
+    """ One registered result set; the DataFrame and columnar views are built at most once """
+    def __init__(self, results, search_id=None):
+        self.search_id = search_id
+        self.results = results
+        self._frame = None
+        self._columns = None
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self._frame = pd.DataFrame(self.results)
+        return self._frame
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = ColumnarResults(self.results)
+        return self._columns
+
+
+result_sessions = TTLCache(max_items=RESULT_SESSION_MAX_ITEMS, ttl=RESULT_SESSION_TTL, max_weight=RESULT_SESSION_MAX_BYTES)
+
+def estimate_size(results):
+    """ Approximate memory held by a result set: its row count times the serialized size of a few sample rows """
+    if not results:
+        return 1
+    sample = results[:RESULT_SESSION_SAMPLE_ROWS]
+    return max(1, len(json.dumps(sample, default=str)) * len(results) // len(sample))
+
+def register_results(results):
+    """ Store a result set server-side and return its search_id """
+    search_id = str(uuid4())
+    result_sessions.set(search_id, ResultSession(results, search_id), weight=estimate_size(results))
+    return search_id
+
+def get_result_session(search_id):
+    """ The registered result set for search_id, or None if it is unknown or expired """
+    return result_sessions.get(search_id)
+
+def resolve_result_session(data, results_key='results'):
+    """ Result set of a follow-up request: the registered one when a search_id is given, else the posted results """
+    search_id = data.get('search_id')
+    if search_id:
+        return get_result_session(search_id)
+    return ResultSession(data.get(results_key) or [])
@@ -0,0 +1,83 @@
+import csv
+import io
+import math
+import time
+import pandas as pd
+from psycopg2.extras import execute_values
+
+# Rows read from a CSV, embedded and written per round trip
+BULK_LOAD_CHUNK_SIZE = 1000
+EXECUTE_VALUES_PAGE_SIZE = 500
+EMBEDDING_DIM = 1536
+
+
+def iter_csv_chunks(csv_file_path, chunk_size=BULK_LOAD_CHUNK_SIZE):
+    """ Stream a (possibly compressed) CSV as DataFrames of chunk_size rows """
+    yield from pd.read_csv(csv_file_path, chunksize=chunk_size)
+
+def insert_rows(db, table_name, columns, rows, template=None):
+    """ Multi-row INSERT of a chunk with execute_values, for rows holding arrays or JSON """
+    if not rows:
+        return
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s"
+    execute_values(db.cursor, query, rows, template=template, page_size=EXECUTE_VALUES_PAGE_SIZE)
+
+def format_copy_value(value):
+    """ CSV text of a value for COPY: vectors as pgvector literals, None as NULL """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(map(str, value)) + "]"
+    return value
+
+def is_valid_embedding(embedding, dim=EMBEDDING_DIM):
+    """ Whether a vector fits a VECTOR(dim) column; one bad vector would otherwise fail the COPY of a whole chunk """
+    try:
+        return len(embedding) == dim and all(math.isfinite(float(value)) for value in embedding)
+    except (TypeError, ValueError):
+        return False
+
+def copy_rows(db, table_name, columns, rows):
+    """ Stream a chunk of scalar / vector rows into a table with COPY FROM STDIN """
+    if not rows:
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([format_copy_value(value) for value in row])
+    buffer.seek(0)
+    db.cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def drop_index(db, index_name):
+    """ Drop an index before a bulk load; maintaining an HNSW graph row by row is much slower than one build """
+    db.cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+    db.conn.commit()
+
+def create_hnsw_index(db, index_name, table_name, column_name):
+    """ Build the HNSW cosine index once the table is loaded """
+    start = time.time()
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {index_name}
+        ON {table_name} USING hnsw ({column_name} vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+    """)
+    db.conn.commit()
+    print(f"✅ Index {index_name} created in {time.time() - start:.1f}s.")
+
+class LoadProgress:
+    """ Per-chunk progress of a bulk load instead of a line per row """
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.failed = 0
+        self.skipped = 0
+        self.start = time.time()
+
+    def update(self, rows, failed=0, skipped=0):
+        self.rows += rows
+        self.failed += failed
+        self.skipped += skipped
+        elapsed = time.time() - self.start
+        print(f"⏳ {self.name}: {self.rows} rows loaded, {self.skipped} unchanged, {self.failed} failed, {self.rows / max(elapsed, 1e-9):.0f} rows/s")
+
+    def done(self):
+        print(f"✅ {self.name}: {self.rows} rows loaded, {self.skipped} unchanged, {self.failed} failed in {time.time() - self.start:.1f}s.")
@@ -1,11 +1,22 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import os
+import threading
+import time
+import logging
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Connection pool configuration
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# Connections idle for longer than this many seconds are pinged before being handed out
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', 30))
+
 def get_db_connection():
     try:
         connection = psycopg2.connect(
@@ -22,31 +33,133 @@ def get_db_connection():
         raise error
 
 
+class ConnectionPool:
+    """ Process-wide pool of database connections with health checks on checkout and wait-time metrics """
+    def __init__(self, minconn=DB_POOL_MIN_SIZE, maxconn=DB_POOL_MAX_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            dbname=os.getenv('EVAL_DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT'),
+            cursor_factory=RealDictCursor
+        )
+        self.timeout = timeout
+        # ThreadedConnectionPool raises when exhausted, so the semaphore makes callers wait for a free connection
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.last_used = {}
+        self.lock = threading.Lock()
+        self.metrics = {"checkouts": 0, "timeouts": 0, "reconnects": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def checkout(self):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.metrics["timeouts"] += 1
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        waited = time.perf_counter() - start
+
+        try:
+            conn = self.pool.getconn()
+            if not self.is_healthy(conn):
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                with self.lock:
+                    self.metrics["reconnects"] += 1
+        except Exception:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.metrics["checkouts"] += 1
+            self.metrics["total_wait_seconds"] += waited
+            self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], waited)
+        return conn
+
+    def checkin(self, conn, discard=False):
+        try:
+            # Never return a connection with an open or failed transaction to the pool
+            discard = discard or conn.closed or conn.status != psycopg2.extensions.STATUS_READY
+            with self.lock:
+                if discard:
+                    self.last_used.pop(id(conn), None)
+                else:
+                    self.last_used[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=discard)
+        finally:
+            self.slots.release()
+
+    def is_healthy(self, conn):
+        if conn.closed:
+            return False
+        with self.lock:
+            idle = time.monotonic() - self.last_used.get(id(conn), 0)
+        if idle < DB_POOL_HEALTHCHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as error:
+            logging.warning(f"Discarding unhealthy database connection: {error}")
+            return False
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics["avg_wait_seconds"] = metrics["total_wait_seconds"] / metrics["checkouts"] if metrics["checkouts"] else 0.0
+        return metrics
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """ Lazily create the process-wide connection pool """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = ConnectionPool()
+        return _connection_pool
+
+
 class DatabaseConnection:
     def __enter__(self):
-        self.conn = get_db_connection()
+        self.pool = get_connection_pool()
+        self.conn = self.pool.checkout()
         self.cursor = self.conn.cursor()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if exc_type is not None:
-            self.conn.rollback()
-        else:
-            self.conn.commit()
-        self.cursor.close()
-        self.conn.close()
+        if self.conn is None:
+            # reset_connection gave the old connection back and failed to check out a new one
+            return
+        try:
+            if exc_type is not None:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+            if self.cursor:
+                self.cursor.close()
+        finally:
+            self.pool.checkin(self.conn)
         
     def reset_connection(self):
         """Reset the connection and cursor."""
         try:
-            # Close current connection and cursor
+            # Close current cursor and drop the connection from the pool
             if self.cursor:
                 self.cursor.close()
-            if self.conn:
-                self.conn.close()
+            # Cleared first, so __exit__ never checks in (and releases the pool slot of) a connection twice
+            conn, self.conn, self.cursor = self.conn, None, None
+            if conn:
+                self.pool.checkin(conn, discard=True)
 
             # Re-establish connection and cursor
-            self.conn = get_db_connection()
+            self.conn = self.pool.checkout()
             self.cursor = self.conn.cursor()
 
             print("Database connection and cursor have been reset.")
@@ -4,12 +4,33 @@ import pandas as pd
 from connect_db import DatabaseConnection
 from backend.app.table_representation.openai_client import OpenAIClient
 from backend.app.utils.utils import parse_list_column, parse_json_column
+from backend.app.db.bulk_load import iter_csv_chunks, insert_rows, drop_index, create_hnsw_index, LoadProgress
+from backend.app.db.ingest_manifest import IngestionManifest, content_hash
 from psycopg2.extras import Json
 import tiktoken
 
 # OpenAI client instantiation
 openai_client = OpenAIClient()
 
+EVAL_DATA_COLUMNS = [
+    "table_name",
+    "database_name",
+    "example_rows_md",
+    "time_granu",
+    "geo_granu",
+    "db_description",
+    "col_num",
+    "row_num",
+    "popularity",
+    "usability_rating",
+    "tags",
+    "file_size_in_byte",
+    "keywords",
+    "task_queries",
+    "metadata_queries",
+    "example_rows_embed",
+]
+
 class MockData:
     def __init__(self, file_path):
         self.file_path = file_path
@@ -43,6 +64,10 @@ class MockData:
                 # Execute the insert query
                 db.cursor.execute(insert_query, (table_name, col_num, popularity, time_granu, geo_granu, comb_embed, query_embed))
 
+def eval_row_key(key):
+    """ Manifest key of a (database_name, table_name) pair """
+    return f"{key[0]}/{key[1]}"
+
 class EvalData:
     def __init__(self, openai_client):
         self.openai_client = openai_client
@@ -87,31 +112,18 @@ class EvalData:
 
         return truncated_text
 
-    def compute_embedding(self, text):
-        if text:
-            # Define the maximum token limit (8000 tokens to be safe vs. 8192 maximum)
-            MAX_TOKENS = 8000
-            num_rows = 3  # Start with 3 data rows
-
-            while num_rows >= 0:
-                truncated_text = self.truncate_example_rows_md(text, max_tokens=MAX_TOKENS, num_rows=num_rows)
-                tokenizer = tiktoken.encoding_for_model('text-embedding-3-small')
-                tokens = tokenizer.encode(truncated_text)
-                if len(tokens) <= MAX_TOKENS:
-                    break
-                num_rows -= 1  # Reduce the number of data rows
-
-            if num_rows < 0:
-                print("Unable to truncate text to within token limit.")
-                return None
-
-            try:
-                return self.openai_client.generate_embeddings(truncated_text)
-            except Exception as e:
-                print(f"Error generating embeddings: {e}")
-                return None
-        else:
-            return None
+    def embedding_text(self, text):
+        """ The part of the example rows that is embedded; truncate_example_rows_md already caps the tokens, so 3 data rows always fit """
+        return self.truncate_example_rows_md(text, max_tokens=8000, num_rows=3) if text else None
+
+    def embed_texts(self, texts):
+        """ Embeddings of a whole chunk of embedding texts with batched requests; None texts get None """
+        to_embed = [(idx, text) for idx, text in enumerate(texts) if text]
+        embeddings = [None] * len(texts)
+        batch_embeddings = self.openai_client.generate_embeddings_batch([text for _, text in to_embed])
+        for (idx, _), embedding in zip(to_embed, batch_embeddings):
+            embeddings[idx] = embedding
+        return embeddings
     
     def create_table_if_not_exists(self, db, table_name):
         create_table_query = f'''
@@ -136,13 +148,125 @@ class EvalData:
         '''
         db.cursor.execute(create_table_query)
 
-        # Create index on the embedding column for efficient similarity search
-        index_query = f'''
-        CREATE INDEX IF NOT EXISTS {table_name}_example_rows_embed_idx
-        ON {table_name} USING hnsw (example_rows_embed vector_cosine_ops) WITH (m = 16, ef_construction = 64);
-        '''
-        db.cursor.execute(index_query)
-    
+    def eval_row_values(self, row):
+        """ Table values of a raw evaluation CSV row, without the embedding """
+        return (
+            str(row['File Name']) if 'File Name' in row else None,
+            str(row['Dataset Name']) if 'Dataset Name' in row else None,
+            str(row['Example Rows']) if 'Example Rows' in row else None,
+            str(row['Time Granularity']) if 'Time Granularity' in row else None,
+            str(row['Geographic Granularity']) if 'Geographic Granularity' in row else None,
+            str(row['Description']) if 'Description' in row else None,
+            int(row['Number of Columns']) if pd.notna(row.get('Number of Columns')) else None,
+            int(row['Number of Rows']) if pd.notna(row.get('Number of Rows')) else None,
+            int(row['Popularity']) if pd.notna(row.get('Popularity')) else None,
+            float(row['Usability Rating']) if pd.notna(row.get('Usability Rating')) else None,
+            # Parse list-like columns
+            parse_list_column(row['Tags']) if 'Tags' in row else [],
+            int(row['File Size (bytes)']) if pd.notna(row.get('File Size (bytes)')) else None,
+            parse_list_column(row['Keywords']) if 'Keywords' in row else [],
+            parse_list_column(row['Task Queries']) if 'Task Queries' in row else [],
+            parse_json_column(row['Metadata Queries']) if 'Metadata Queries' in row else None,
+        )
+
+    def processed_eval_row_values(self, row):
+        """ Table values of a processed evaluation CSV row, whose columns are already named like the table's """
+        return (
+            str(row['table_name']),
+            str(row['database_name']),
+            str(row['example_rows_md']),
+            str(row['time_granu']),
+            str(row['geo_granu']),
+            str(row['db_description']),
+            int(row['col_num']),
+            int(row['row_num']),
+            int(row['popularity']),
+            float(row['usability_rating']),
+            None,
+            int(row['file_size_in_byte']),
+            None,
+            None,
+            None,
+        )
+
+    def fetch_example_rows_embeds(self, db, table_name, keys):
+        """ Stored example_rows_embed of (database_name, table_name) keys """
+        if not keys:
+            return {}
+        db.cursor.execute(f"""
+            SELECT t.database_name, t.table_name, t.example_rows_embed
+            FROM {table_name} t
+            JOIN unnest(%s::TEXT[], %s::TEXT[]) AS k(database_name, table_name)
+              ON t.database_name = k.database_name AND t.table_name = k.table_name;
+        """, ([key[0] for key in keys], [key[1] for key in keys]))
+        return {(row["database_name"], row["table_name"]): row["example_rows_embed"] for row in db.cursor.fetchall()}
+
+    def delete_eval_rows(self, db, table_name, keys):
+        """ Remove the previous version of changed rows before they are inserted again """
+        if not keys:
+            return
+        db.cursor.execute(f"""
+            DELETE FROM {table_name} t
+            USING unnest(%s::TEXT[], %s::TEXT[]) AS k(database_name, table_name)
+            WHERE t.database_name = k.database_name AND t.table_name = k.table_name;
+        """, ([key[0] for key in keys], [key[1] for key in keys]))
+
+    def load_eval_csv(self, db, csv_file_path, table_name, row_values):
+        """ Stream a CSV into table_name chunk by chunk. Rows unchanged since the last load are skipped, changed rows
+        are replaced and only re-embedded if their example rows or the embedding model changed """
+        self.create_table_if_not_exists(db, table_name)
+        manifest = IngestionManifest(db, table_name, self.openai_client.embedding_model_default).load()
+        if manifest.is_empty():
+            # Full load: build the HNSW index once afterwards rather than maintaining it on every insert
+            drop_index(db, f"{table_name}_example_rows_embed_idx")
+
+        progress = LoadProgress(table_name)
+        offset = 0
+        for chunk in iter_csv_chunks(csv_file_path):
+            records, texts, embedding_hashes, failed, skipped = {}, {}, {}, 0, 0
+            for index, row in enumerate(chunk.to_dict(orient="records"), start=offset):
+                try:
+                    record = row_values(row)
+                except Exception as e:
+                    print(f"Error processing row {index} in file {csv_file_path}: {e}")
+                    failed += 1
+                    continue
+                key = (record[1], record[0])
+                row_hash = content_hash(*record)
+                text = self.embedding_text(record[2])
+                embedding_hash = content_hash(text)
+                # Rows whose embedding failed last time are loaded again even if their content did not change
+                if manifest.is_unchanged(eval_row_key(key), row_hash) and manifest.has_embedding(eval_row_key(key), embedding_hash):
+                    skipped += 1
+                    continue
+                records[key] = (record, row_hash)
+                texts[key], embedding_hashes[key] = text, embedding_hash
+            offset += len(chunk)
+
+            # Reuse stored embeddings of rows whose embedded text did not change
+            reusable = [key for key in records if manifest.has_embedding(eval_row_key(key), embedding_hashes[key])]
+            embeddings = self.fetch_example_rows_embeds(db, table_name, reusable)
+            to_embed = [key for key in records if key not in embeddings]
+            embeddings.update(zip(to_embed, self.embed_texts([texts[key] for key in to_embed])))
+
+            rows = [
+                (*record[:14], Json(record[14]) if record[14] is not None else None, embeddings[key])
+                for key, (record, _) in records.items()
+            ]
+            self.delete_eval_rows(db, table_name, [key for key in records if manifest.is_loaded(eval_row_key(key))])
+            insert_rows(db, table_name, EVAL_DATA_COLUMNS, rows)
+            # A failed embedding is recorded without its hash, so the next run embeds the row again
+            manifest.record([
+                (eval_row_key(key), row_hash, embedding_hashes[key] if embeddings[key] is not None or texts[key] is None else None)
+                for key, (_, row_hash) in records.items()
+            ])
+            # Data and manifest commit together, so a rerun resumes after the last committed chunk
+            db.conn.commit()
+            progress.update(len(rows), failed, skipped)
+        progress.done()
+
+        create_hnsw_index(db, f"{table_name}_example_rows_embed_idx", table_name, "example_rows_embed")
+
     def insert_eval_data(self):
         with DatabaseConnection() as db:
             # Enable the pgvector extension
@@ -157,90 +281,7 @@ class EvalData:
                     continue
 
                 print(f"⏳ Processing {csv_file_path} into table {table_name}.")
-
-                # Create the table if it does not exist
-                self.create_table_if_not_exists(db, table_name)
-
-                # Read the CSV file
-                df = pd.read_csv(csv_file_path)
-
-                # Prepare the insert query
-                insert_query = f'''
-                INSERT INTO {table_name} (
-                    table_name,
-                    database_name,
-                    example_rows_md,
-                    time_granu,
-                    geo_granu,
-                    db_description,
-                    col_num,
-                    row_num,
-                    popularity,
-                    usability_rating,
-                    tags,
-                    file_size_in_byte,
-                    keywords,
-                    task_queries,
-                    metadata_queries,
-                    example_rows_embed
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                '''
-
-                # Iterate over the DataFrame rows
-                for index, row in df.iterrows():
-                    try:
-                        # Map CSV columns to table columns
-                        table_name_val = str(row['File Name']) if 'File Name' in df.columns else None
-                        database_name = str(row['Dataset Name']) if 'Dataset Name' in df.columns else None
-                        example_rows_md = str(row['Example Rows']) if 'Example Rows' in df.columns else None
-                        time_granu = str(row['Time Granularity']) if 'Time Granularity' in df.columns else None
-                        geo_granu = str(row['Geographic Granularity']) if 'Geographic Granularity' in df.columns else None
-                        db_description = str(row['Description']) if 'Description' in df.columns else None
-                        col_num = int(row['Number of Columns']) if pd.notna(row.get('Number of Columns')) else None
-                        row_num = int(row['Number of Rows']) if pd.notna(row.get('Number of Rows')) else None
-                        popularity = int(row['Popularity']) if pd.notna(row.get('Popularity')) else None
-                        usability_rating = float(row['Usability Rating']) if pd.notna(row.get('Usability Rating')) else None
-                        file_size_in_byte = int(row['File Size (bytes)']) if pd.notna(row.get('File Size (bytes)')) else None
-
-                        # Parse list-like columns
-                        tags = parse_list_column(row['Tags']) if 'Tags' in df.columns else []
-                        keywords = parse_list_column(row['Keywords']) if 'Keywords' in df.columns else []
-                        task_queries = parse_list_column(row['Task Queries']) if 'Task Queries' in df.columns else []
-                        metadata_queries = parse_json_column(row['Metadata Queries']) if 'Metadata Queries' in df.columns else None
-
-                        # Compute embedding for example_rows_md
-                        example_rows_embed = self.compute_embedding(example_rows_md)
-
-                        # Insert data into the table
-                        db.cursor.execute(
-                            insert_query,
-                            (
-                                table_name_val,
-                                database_name,
-                                example_rows_md,
-                                time_granu,
-                                geo_granu,
-                                db_description,
-                                col_num,
-                                row_num,
-                                popularity,
-                                usability_rating,
-                                tags,
-                                file_size_in_byte,
-                                keywords,
-                                task_queries,
-                                Json(metadata_queries) if metadata_queries is not None else None,
-                                example_rows_embed
-                            )
-                        )           
-                
-                    except Exception as e:
-                        print(f"Error processing row {index} in file {csv_file_path}: {e}")
-                        continue          
-                db.cursor.execute("SELECT * FROM eval_data_all LIMIT 5;")
-                rows = db.cursor.fetchall()
-                print(rows)     
+                self.load_eval_csv(db, csv_file_path, table_name, self.eval_row_values)
 
         print("✅ Evaluation data inserted successfully from CSV files.")
 
@@ -258,99 +299,7 @@ class EvalData:
                     continue
 
                 print(f"⏳ Processing {csv_file_path} into table {table_name}.")
-
-                # Create the table if it does not exist
-                self.create_table_if_not_exists(db, table_name)
-
-                # Read the CSV file
-                df = pd.read_csv(csv_file_path)
-
-                # Prepare the insert query
-                insert_query = f'''
-                INSERT INTO {table_name} (
-                    table_name,
-                    database_name,
-                    example_rows_md,
-                    time_granu,
-                    geo_granu,
-                    db_description,
-                    col_num,
-                    row_num,
-                    popularity,
-                    usability_rating,
-                    tags,
-                    file_size_in_byte,
-                    keywords,
-                    task_queries,
-                    metadata_queries,
-                    example_rows_embed
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                '''
-
-                # Iterate over the DataFrame rows
-                for index, row in df.iterrows():
-
-                    try:
-                        if index == 5545:
-                            print(row)
-                            print(row[table_name])
-                            
-                        # Map CSV columns to table columns
-                        table_name_val = str(row[table_name])
-                        database_name = str(row[database_name])
-                        example_rows_md = str(row[example_rows_embed])
-                        time_granu = str(row[time_granu])
-                        geo_granu = str(row[geo_granu])
-                        db_description = str(row[db_description])
-                        col_num = int(row[col_num])
-                        row_num = int(row[row_num])
-                        popularity = int(row[popularity])
-                        usability_rating = float(row[usability_rating])
-                        file_size_in_byte = int(row[file_size_in_byte])
-
-                        # Parse list-like columns
-                        # tags = parse_list_column(row['tags']) if 'Tags' in df.columns else []
-                        # keywords = parse_list_column(row['keywords']) if 'Keywords' in df.columns else []
-                        # task_queries = parse_list_column(row['task_queries']) if 'Task Queries' in df.columns else []
-                        # metadata_queries = parse_json_column(row['metadata_queries']) if 'Metadata Queries' in df.columns else None
-                        tags = None
-                        keywords = None
-                        task_queries = None
-                        metadata_queries = None
-
-                        # Compute embedding for example_rows_md
-                        example_rows_embed = self.compute_embedding(example_rows_md)
-
-                        # Insert data into the table
-                        db.cursor.execute(
-                            insert_query,
-                            (
-                                table_name_val,
-                                database_name,
-                                example_rows_md,
-                                time_granu,
-                                geo_granu,
-                                db_description,
-                                col_num,
-                                row_num,
-                                popularity,
-                                usability_rating,
-                                tags,
-                                file_size_in_byte,
-                                keywords,
-                                task_queries,
-                                Json(metadata_queries) if metadata_queries is not None else None,
-                                example_rows_embed
-                            )
-                        )           
-                
-                    except Exception as e:
-                        print(f"Error processing row {index} in file {csv_file_path}: {e}")
-                        continue          
-                # db.cursor.execute("SELECT * FROM eval_data_all LIMIT 5;")
-                # rows = db.cursor.fetchall()
-                # print(rows)     
+                self.load_eval_csv(db, csv_file_path, table_name, self.processed_eval_row_values)
 
         print("✅ Evaluation data processed inserted successfully from CSV files.")
 
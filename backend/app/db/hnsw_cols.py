@@ -4,10 +4,12 @@ import pandas as pd
 from connect_db import DatabaseConnection
 from backend.app.table_representation.openai_client import OpenAIClient
 from backend.app.utils.utils import parse_list_column, parse_json_column
+from backend.app.utils.embedding_codec import parse_embedding_text
+from backend.app.db.bulk_load import iter_csv_chunks, copy_rows, drop_index, create_hnsw_index, is_valid_embedding, LoadProgress, EMBEDDING_DIM
+from backend.app.db.ingest_manifest import IngestionManifest, content_hash
 from psycopg2.extras import Json
 import tiktoken
 import hnswlib
-import ast
 import logging
 
 
@@ -22,21 +24,32 @@ def create_column_embeddings_table():
             eval_row_id SERIAL PRIMARY KEY,  -- Unique row in new table
             table_name TEXT NOT NULL,  -- Reference to the table_name in paper
             column_name TEXT NOT NULL,  -- Column name within the dataset
-            embedding VECTOR(1536)  -- Store the embedding vector
+            embedding VECTOR(1536),  -- Store the embedding vector
+            source_row INT  -- Row of the source CSV, the unit the ingestion manifest tracks
         );
         """
         db.cursor.execute(query)
         db.conn.commit()
 
-        # Create index using HNSW for efficient nearest neighbor search
-        index_query = """
-        CREATE INDEX IF NOT EXISTS paper_filtered_column_embeddings_idx
-        ON paper_filtered_column_embeddings USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
-        """
-        db.cursor.execute(index_query)
-        db.conn.commit()
-        print("✅ Index paper_filtered_column_embeddings_idx created successfully.")
 
+def source_row_key(table_name, index):
+    """ Manifest key of a CSV row; table names such as train.csv repeat across rows, so the row index is part of it """
+    return f"{table_name}#{index}"
+
+def prepare_source_rows(db, target_table, manifest):
+    """ Rows loaded before source_row existed cannot be matched to the manifest; drop them so this load replaces them """
+    db.cursor.execute(f"ALTER TABLE {target_table} ADD COLUMN IF NOT EXISTS source_row INT;")
+    db.cursor.execute(f"DELETE FROM {target_table} WHERE source_row IS NULL;")
+    if db.cursor.rowcount:
+        print(f"⏳ Deleted {db.cursor.rowcount} rows of {target_table} loaded without a source row, reloading them")
+        manifest.clear()
+    db.conn.commit()
+
+def delete_loaded_rows(db, target_table, manifest, entries, source_rows):
+    """ Remove the previous rows of CSV rows that changed since they were loaded """
+    changed = [source_rows[row_key] for row_key, _, _ in entries if manifest.is_loaded(row_key)]
+    if changed:
+        db.cursor.execute(f"DELETE FROM {target_table} WHERE source_row = ANY(%s);", (changed,))
 
 def insert_column_embeddings():
     with DatabaseConnection() as db:
@@ -55,33 +68,47 @@ def insert_column_embeddings():
         # Create the table if it does not exist
         create_column_embeddings_table()
 
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-
-        # Query to fetch the rows from eval_cols_test
-        query = "SELECT table_name, example_cols_embed FROM paper"
-        db.cursor.execute(query)
-        rows = db.cursor.fetchall()
-        print(rows[0:5])
-
-        insert_query = """
-        INSERT INTO paper_filtered_column_embeddings (table_name, column_name, embedding)
-        VALUES (%s, %s, %s)
-        """
-
-        for index, row in df.iterrows():
-            try:
-                table_name = str(row['table_name']) if 'table_name' in df.columns else None
-                example_cols_embed_dict = ast.literal_eval(row['example_cols_embed'])
-                for col_name, embedding in example_cols_embed_dict.items(): 
-                    print(f"processing row {index}: {col_name}, {len(embedding)}")
-                    db.cursor.execute(insert_query, (table_name, col_name, embedding))
-            except Exception as e:
-                        print(f"Error processing row {index} in file {csv_file_path}: {e}")
-                        continue  
-            
-
-        db.conn.commit()
+        manifest = IngestionManifest(db, "paper_filtered_column_embeddings").load()
+        prepare_source_rows(db, "paper_filtered_column_embeddings", manifest)
+        if manifest.is_empty():
+            # Full load: build the HNSW index once afterwards instead of updating it on every insert
+            drop_index(db, "paper_filtered_column_embeddings_idx")
+
+        columns = ["table_name", "column_name", "embedding", "source_row"]
+        progress = LoadProgress("paper_filtered_column_embeddings")
+        offset = 0
+        for chunk in iter_csv_chunks(csv_file_path):
+            rows, entries, source_rows, failed, skipped = [], [], {}, 0, 0
+            for index, row in enumerate(chunk.to_dict(orient="records"), start=offset):
+                try:
+                    table_name = str(row['table_name']) if 'table_name' in row else None
+                    row_key = source_row_key(table_name, index)
+                    # Hash the raw text so unchanged rows are skipped before parsing their embeddings
+                    row_hash = content_hash(table_name, row['example_cols_embed'])
+                    if manifest.is_unchanged(row_key, row_hash):
+                        skipped += 1
+                        continue
+                    example_cols_embed_dict = parse_embedding_text(row['example_cols_embed'])
+                    invalid = [col_name for col_name, embedding in example_cols_embed_dict.items() if not is_valid_embedding(embedding)]
+                    if invalid:
+                        raise ValueError(f"embeddings of columns {invalid} are not {EMBEDDING_DIM}-dimensional vectors")
+                    for col_name, embedding in example_cols_embed_dict.items():
+                        rows.append((table_name, col_name, embedding, index))
+                    entries.append((row_key, row_hash, None))
+                    source_rows[row_key] = index
+                except Exception as e:
+                    print(f"Error processing row {index} in file {csv_file_path}: {e}")
+                    failed += 1
+            offset += len(chunk)
+            delete_loaded_rows(db, "paper_filtered_column_embeddings", manifest, entries, source_rows)
+            copy_rows(db, "paper_filtered_column_embeddings", columns, rows)
+            manifest.record(entries)
+            # Rows and manifest commit together, so a rerun resumes after the last committed chunk
+            db.conn.commit()
+            progress.update(len(rows), failed, skipped)
+        progress.done()
+
+        create_hnsw_index(db, "paper_filtered_column_embeddings_idx", "paper_filtered_column_embeddings", "embedding")
         print("✅ Column embeddings inserted successfully.")
 
 def create_semantics_embeddings_table():
@@ -91,22 +118,13 @@ def create_semantics_embeddings_table():
         CREATE TABLE IF NOT EXISTS paper_filtered_semantics_embeddings (
             eval_row_id SERIAL PRIMARY KEY,
             table_name TEXT NOT NULL,
-            semantics_embedding VECTOR(1536)  -- Assuming same dimension as column embeddings
+            semantics_embedding VECTOR(1536),  -- Assuming same dimension as column embeddings
+            source_row INT  -- Row of the source CSV, the unit the ingestion manifest tracks
         );
         """
         db.cursor.execute(query)
         db.conn.commit()
 
-        # Create HNSW index for semantic embeddings
-        index_query = """
-        CREATE INDEX IF NOT EXISTS paper_filtered_semantics_embeddings_idx
-        ON paper_filtered_semantics_embeddings USING hnsw (semantics_embedding vector_cosine_ops) 
-        WITH (m = 16, ef_construction = 64);
-        """
-        db.cursor.execute(index_query)
-        db.conn.commit()
-        print("✅ Index paper_filtered_semantics_embeddings_idx created successfully.")
-
 def insert_semantics_embeddings():
     with DatabaseConnection() as db:
         db.cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
@@ -124,26 +142,44 @@ def insert_semantics_embeddings():
         # Create the table if it doesn't exist
         create_semantics_embeddings_table()
 
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-
-        insert_query = """
-        INSERT INTO paper_filtered_semantics_embeddings (table_name, semantics_embedding)
-        VALUES (%s, %s)
-        """
-
-        for index, row in df.iterrows():
-            try:
-                table_name = str(row['table_name']) if 'table_name' in df.columns else None
-                semantics_embed = ast.literal_eval(row['result_semantics_embed'])
-                
-                print(f"Processing row {index}: {table_name}, embedding length {len(semantics_embed)}")
-                db.cursor.execute(insert_query, (table_name, semantics_embed))
-            except Exception as e:
-                print(f"Error processing row {index} in file {csv_file_path}: {e}")
-                continue
-
-        db.conn.commit()
+        manifest = IngestionManifest(db, "paper_filtered_semantics_embeddings").load()
+        prepare_source_rows(db, "paper_filtered_semantics_embeddings", manifest)
+        if manifest.is_empty():
+            # Full load: build the HNSW index once afterwards instead of updating it on every insert
+            drop_index(db, "paper_filtered_semantics_embeddings_idx")
+
+        columns = ["table_name", "semantics_embedding", "source_row"]
+        progress = LoadProgress("paper_filtered_semantics_embeddings")
+        offset = 0
+        for chunk in iter_csv_chunks(csv_file_path):
+            rows, entries, source_rows, failed, skipped = [], [], {}, 0, 0
+            for index, row in enumerate(chunk.to_dict(orient="records"), start=offset):
+                try:
+                    table_name = str(row['table_name']) if 'table_name' in row else None
+                    row_key = source_row_key(table_name, index)
+                    row_hash = content_hash(table_name, row['result_semantics_embed'])
+                    if manifest.is_unchanged(row_key, row_hash):
+                        skipped += 1
+                        continue
+                    embedding = parse_embedding_text(row['result_semantics_embed'])
+                    if not is_valid_embedding(embedding):
+                        raise ValueError(f"semantics embedding is not a {EMBEDDING_DIM}-dimensional vector")
+                    rows.append((table_name, embedding, index))
+                    entries.append((row_key, row_hash, None))
+                    source_rows[row_key] = index
+                except Exception as e:
+                    print(f"Error processing row {index} in file {csv_file_path}: {e}")
+                    failed += 1
+            offset += len(chunk)
+            delete_loaded_rows(db, "paper_filtered_semantics_embeddings", manifest, entries, source_rows)
+            copy_rows(db, "paper_filtered_semantics_embeddings", columns, rows)
+            manifest.record(entries)
+            # Rows and manifest commit together, so a rerun resumes after the last committed chunk
+            db.conn.commit()
+            progress.update(len(rows), failed, skipped)
+        progress.done()
+
+        create_hnsw_index(db, "paper_filtered_semantics_embeddings_idx", "paper_filtered_semantics_embeddings", "semantics_embedding")
         print("✅ Semantic embeddings inserted successfully.")
 
 # Example of how you can use both functions
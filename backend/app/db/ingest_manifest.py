@@ -0,0 +1,81 @@
+import hashlib
+import json
+from psycopg2.extras import execute_values
+
+
+def content_hash(*values):
+    """ Stable hash of row content; lists, dicts and numbers hash the same across runs """
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """ What was loaded into a table: per row key the content hash, the hash of the embedded text and
+    the embedding model. Written in the same transaction as each loaded chunk, so it doubles as the checkpoint """
+    def __init__(self, db, target_table, embedding_model=None):
+        self.db = db
+        self.target_table = target_table
+        self.embedding_model = embedding_model
+        self.entries = {}  # row_key -> (content_hash, embedding_hash, embedding_model)
+
+    def load(self):
+        self.db.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_manifest (
+                target_table TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                embedding_hash TEXT,
+                embedding_model TEXT,
+                loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (target_table, row_key)
+            );
+        """)
+        self.db.conn.commit()
+        self.db.cursor.execute(
+            "SELECT row_key, content_hash, embedding_hash, embedding_model FROM ingestion_manifest WHERE target_table = %s;",
+            (self.target_table,)
+        )
+        self.entries = {
+            row["row_key"]: (row["content_hash"], row["embedding_hash"], row["embedding_model"])
+            for row in self.db.cursor.fetchall()
+        }
+        return self
+
+    def is_empty(self):
+        return not self.entries
+
+    def is_unchanged(self, row_key, row_hash):
+        entry = self.entries.get(row_key)
+        return entry is not None and entry[0] == row_hash
+
+    def has_embedding(self, row_key, embedding_hash):
+        """ True if the stored embedding of the row was computed from the same text with the current model """
+        entry = self.entries.get(row_key)
+        return entry is not None and entry[1] == embedding_hash and entry[2] == self.embedding_model
+
+    def is_loaded(self, row_key):
+        return row_key in self.entries
+
+    def record(self, entries):
+        """ Upsert (row_key, content_hash, embedding_hash) entries; the caller commits them with the chunk """
+        # One upsert may not touch a key twice, so the last entry of a repeated key wins
+        entries = list({row_key: (row_key, row_hash, embedding_hash) for row_key, row_hash, embedding_hash in entries}.values())
+        if not entries:
+            return
+        values = [(self.target_table, row_key, row_hash, embedding_hash, self.embedding_model) for row_key, row_hash, embedding_hash in entries]
+        execute_values(self.db.cursor, """
+            INSERT INTO ingestion_manifest (target_table, row_key, content_hash, embedding_hash, embedding_model)
+            VALUES %s
+            ON CONFLICT (target_table, row_key) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash,
+                embedding_hash = EXCLUDED.embedding_hash,
+                embedding_model = EXCLUDED.embedding_model,
+                loaded_at = now();
+        """, values)
+        for row_key, row_hash, embedding_hash in entries:
+            self.entries[row_key] = (row_hash, embedding_hash, self.embedding_model)
+
+    def clear(self):
+        """ Forget the table, e.g. before a full reload """
+        self.db.cursor.execute("DELETE FROM ingestion_manifest WHERE target_table = %s;", (self.target_table,))
+        self.entries = {}
@@ -0,0 +1,96 @@
+import threading
+from psycopg2 import sql
+
+METADATA_TABLE = "eval_final_all_with_descriptions"
+
+# Comparison operators allowed in metadata filter clauses; they are spliced into the query
+METADATA_SQL_OPERATORS = {">", "<", ">=", "<=", "=", "!=", "<>", "LIKE", "ILIKE"}
+# Column types left out of metadata results: pgvector embeddings (USER-DEFINED) and binary embeddings
+EMBEDDING_COLUMN_TYPES = {"USER-DEFINED", "bytea"}
+
+column_types_cache = {}
+column_types_lock = threading.Lock()
+primary_key_cache = {}
+
+
+def get_column_types(db, table_name=METADATA_TABLE):
+    """ {column: information_schema data_type} of a table, read once per process; arrays are "ARRAY" """
+    with column_types_lock:
+        if table_name not in column_types_cache:
+            db.cursor.execute(
+                "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;",
+                (table_name,)
+            )
+            column_types_cache[table_name] = {row["column_name"]: row["data_type"] for row in db.cursor.fetchall()}
+        return column_types_cache[table_name]
+
+def is_table_name_unique(db, table_name=METADATA_TABLE):
+    """ Whether the table has PRIMARY KEY (table_name), read once per process. Without it (migrate_metadata_table
+    not run, or run without --dedupe on duplicates) the metadata queries keep SELECT DISTINCT """
+    with column_types_lock:
+        if table_name not in primary_key_cache:
+            db.cursor.execute("""
+                SELECT array_agg(kcu.column_name::text) AS key_columns
+                FROM information_schema.table_constraints tc
+                JOIN information_schema.key_column_usage kcu
+                    ON kcu.constraint_schema = tc.constraint_schema AND kcu.constraint_name = tc.constraint_name
+                WHERE tc.table_name = %s AND tc.constraint_type = 'PRIMARY KEY';
+            """, (table_name,))
+            row = db.cursor.fetchone()
+            primary_key_cache[table_name] = row is not None and row["key_columns"] == ["table_name"]
+        return primary_key_cache[table_name]
+
+def result_columns(column_types):
+    """ Every column but the embeddings, which metadata results never show """
+    return [column for column, data_type in column_types.items() if data_type not in EMBEDDING_COLUMN_TYPES]
+
+def metadata_predicate(column_types, field, operator, value):
+    """ (condition, parameters) of one clause, written so the metadata indexes can serve it, or None if invalid.
+    Array equality becomes containment (@>, GIN), a list of values overlap (&&, GIN), scalars plain comparisons (B-tree) """
+    operator = str(operator).upper()
+    if field not in column_types or operator not in METADATA_SQL_OPERATORS:
+        return None
+    column = sql.Identifier(field)
+
+    if column_types[field] != "ARRAY":
+        return sql.SQL("{} {} %s").format(column, sql.SQL(operator)), [value]
+    if operator == "=":
+        if isinstance(value, (list, tuple)):
+            return sql.SQL("{} && %s::text[]").format(column), [[str(item) for item in value]]
+        return sql.SQL("{} @> ARRAY[%s]::text[]").format(column), [str(value)]
+    if operator in ("!=", "<>"):
+        return sql.SQL("NOT ({} @> ARRAY[%s]::text[])").format(column), [str(value)]
+    # Pattern and range matches on elements cannot use the GIN index
+    return sql.SQL("EXISTS (SELECT 1 FROM unnest({}) AS elem WHERE elem {} %s)").format(column, sql.SQL(operator)), [value]
+
+def build_metadata_query(column_types, clauses, search_space, columns=None, ordering=None, table_name=METADATA_TABLE, distinct=True):
+    """ SELECT over the search space (the whole table if None) with [(field, operator, value), ...] clauses ANDed
+    and optional [(field, direction), ...] ordering. Pass distinct=not is_table_name_unique(...) to drop the
+    DISTINCT once table_name is the primary key """
+    columns = columns or result_columns(column_types)
+    query = sql.SQL("SELECT DISTINCT {} FROM {}" if distinct else "SELECT {} FROM {}").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns)), sql.Identifier(table_name))
+    conditions, parameters, skipped = [], [], []
+    if search_space is not None:
+        conditions.append(sql.SQL("table_name = ANY(%s)"))
+        parameters.append(search_space)
+
+    for field, operator, value in clauses:
+        predicate = metadata_predicate(column_types, field, operator, value)
+        if predicate is None:
+            skipped.append((field, operator, value))
+            continue
+        conditions.append(predicate[0])
+        parameters.extend(predicate[1])
+    if conditions:
+        query = query + sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+
+    order_terms = [
+        sql.SQL("{} {}").format(sql.Identifier(field), sql.SQL("ASC" if str(direction).upper() == "ASC" else "DESC"))
+        for field, direction in ordering or [] if field in column_types
+        # SELECT DISTINCT can only be ordered by selected columns
+        and (not distinct or field in columns)
+    ]
+    if order_terms:
+        query = query + sql.SQL(" ORDER BY ") + sql.SQL(", ").join(order_terms)
+    return query, parameters, skipped
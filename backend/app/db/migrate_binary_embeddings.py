@@ -0,0 +1,108 @@
+"""
+- Converts the embeddings that were stored as Python-literal text into float32 BYTEA columns.
+    * example_cols_embed (TEXT, repr of {column name: embedding}) -> example_cols_names TEXT[] + example_cols_embed BYTEA ((columns, 1536) matrix)
+    * result_semantics_embed (TEXT, repr of an embedding) -> result_semantics_embed BYTEA
+- Readers decode the BYTEA values with np.frombuffer (see utils/embedding_codec.py) and still accept the text format.
+- The converted values are written to staging columns in batches; the text columns are only swapped out once every row is converted.
+- Run from the repository root: python -m backend.app.db.migrate_binary_embeddings [table_name ...]
+"""
+
+import sys
+import logging
+from psycopg2.extras import execute_values
+from backend.app.db.connect_db import DatabaseConnection
+from backend.app.utils.embedding_codec import parse_column_embeddings, parse_embedding_text, encode_embedding, encode_embedding_matrix
+
+DEFAULT_TABLES = ["paper_filtered"]
+BATCH_SIZE = 200
+
+
+def column_type(db, table_name, column_name):
+    db.cursor.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+        (table_name, column_name)
+    )
+    row = db.cursor.fetchone()
+    return row["data_type"] if row else None
+
+def convert_column_embeddings(table_name, value):
+    names, matrix = parse_column_embeddings(table_name, value)
+    return names, encode_embedding_matrix(matrix)
+
+def convert_semantics_embedding(value):
+    return encode_embedding(parse_embedding_text(value))
+
+def migrate_column(table_name, column_name, staging_columns, convert):
+    """ Convert one text column into staging columns batch by batch, then swap them in """
+    with DatabaseConnection() as db:
+        if column_type(db, table_name, column_name) != "text":
+            print(f"✅ {table_name}.{column_name} is not a text column, nothing to migrate.")
+            return
+
+        for staging_column, staging_type in staging_columns:
+            db.cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {staging_column} {staging_type};")
+        db.conn.commit()
+
+        # Only rows that were not converted yet, so an interrupted migration resumes where it stopped
+        db.cursor.execute(f"""
+            SELECT table_name FROM {table_name}
+            WHERE {column_name} IS NOT NULL AND {staging_columns[-1][0]} IS NULL;
+        """)
+        pending = [row["table_name"] for row in db.cursor.fetchall()]
+        print(f"⏳ Converting {len(pending)} rows of {table_name}.{column_name}")
+        failed = 0
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = pending[start:start + BATCH_SIZE]
+            db.cursor.execute(
+                f"SELECT table_name, {column_name} FROM {table_name} WHERE table_name = ANY(%s);",
+                (batch,)
+            )
+            values = []
+            for row in db.cursor.fetchall():
+                try:
+                    converted = convert(row["table_name"], row[column_name])
+                except (ValueError, SyntaxError, AttributeError) as e:
+                    logging.error(f"Could not convert {table_name}.{column_name} of {row['table_name']}: {e}")
+                    failed += 1
+                    continue
+                values.append((row["table_name"], *converted))
+
+            assignments = ", ".join(f"{staging_column} = v.{staging_column}" for staging_column, _ in staging_columns)
+            value_columns = ", ".join(["table_name"] + [staging_column for staging_column, _ in staging_columns])
+            execute_values(db.cursor, f"""
+                UPDATE {table_name} AS t SET {assignments}
+                FROM (VALUES %s) AS v ({value_columns})
+                WHERE t.table_name = v.table_name;
+            """, values, template="(" + ", ".join(["%s"] * (len(staging_columns) + 1)) + ")")
+            db.conn.commit()
+            print(f"processed {min(start + BATCH_SIZE, len(pending))}/{len(pending)}")
+
+        if failed:
+            print(f"❌ {failed} rows of {table_name}.{column_name} could not be converted, keeping the text column. Fix them and rerun.")
+            return
+
+        # Swap the binary column in under the original name in one transaction
+        binary_column = staging_columns[-1][0]
+        db.cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN {column_name};")
+        db.cursor.execute(f"ALTER TABLE {table_name} RENAME COLUMN {binary_column} TO {column_name};")
+        db.conn.commit()
+        print(f"✅ {table_name}.{column_name} migrated to BYTEA.")
+
+
+def migrate_table(table_name):
+    migrate_column(
+        table_name, "example_cols_embed",
+        [("example_cols_names", "TEXT[]"), ("example_cols_embed_bin", "BYTEA")],
+        convert_column_embeddings
+    )
+    migrate_column(
+        table_name, "result_semantics_embed",
+        [("result_semantics_embed_bin", "BYTEA")],
+        lambda _, value: (convert_semantics_embedding(value),)
+    )
+
+
+if __name__ == "__main__":
+    for table_name in sys.argv[1:] or DEFAULT_TABLES:
+        migrate_table(table_name)
@@ -0,0 +1,141 @@
+"""
+- Indexes the metadata table that execute_metadata_sql and execute_sql filter (eval_final_all_with_descriptions by default).
+    * PRIMARY KEY (table_name), so the queries drop their SELECT DISTINCT (checked once per app process, restart it after migrating)
+    * GIN indexes on the array columns tags, keywords, time_granu and geo_granu, for the @> / && predicates of db/metadata_query.py
+    * B-tree indexes on col_num, row_num, popularity, usability_rating and file_size_in_byte
+- Duplicate or NULL table_name rows block the primary key; --dedupe keeps the first physical copy of each duplicate and
+  deletes the others and the NULL rows. Without it nothing is deleted and the primary key is skipped.
+- --check EXPLAINs one query per index, built with build_metadata_query, and reports whether the planner can use it.
+- Run from the repository root: python -m backend.app.db.migrate_metadata_table [--dedupe] [--check] [table_name]
+"""
+
+import argparse
+from psycopg2 import sql
+from backend.app.db.connect_db import DatabaseConnection
+from backend.app.db.metadata_query import METADATA_TABLE, get_column_types, is_table_name_unique, build_metadata_query
+
+GIN_COLUMNS = ["tags", "keywords", "time_granu", "geo_granu"]
+BTREE_COLUMNS = ["col_num", "row_num", "popularity", "usability_rating", "file_size_in_byte"]
+
+# One representative clause per indexed column for --check
+CHECK_CLAUSES = {
+    "tags": ("tags", "=", "health"),
+    "keywords": ("keywords", "=", "covid"),
+    "time_granu": ("time_granu", "=", "year"),
+    "geo_granu": ("geo_granu", "=", "country"),
+    "col_num": ("col_num", ">", 50),
+    "row_num": ("row_num", ">", 1000000),
+    "popularity": ("popularity", ">", 10000),
+    "usability_rating": ("usability_rating", ">=", 0.9),
+    "file_size_in_byte": ("file_size_in_byte", "<", 1024),
+}
+
+
+def index_name(table_name, column_name):
+    return f"{table_name}_{column_name}_idx"
+
+def has_primary_key(db, table_name):
+    db.cursor.execute("""
+        SELECT 1 FROM information_schema.table_constraints
+        WHERE table_name = %s AND constraint_type = 'PRIMARY KEY';
+    """, (table_name,))
+    return db.cursor.fetchone() is not None
+
+def count_duplicates(db, table_name):
+    db.cursor.execute(sql.SQL("SELECT COUNT(table_name) - COUNT(DISTINCT table_name) AS duplicates FROM {};").format(sql.Identifier(table_name)))
+    return db.cursor.fetchone()["duplicates"]
+
+def count_null_names(db, table_name):
+    db.cursor.execute(sql.SQL("SELECT COUNT(*) AS nulls FROM {} WHERE table_name IS NULL;").format(sql.Identifier(table_name)))
+    return db.cursor.fetchone()["nulls"]
+
+def delete_duplicates(db, table_name):
+    db.cursor.execute(sql.SQL("""
+        DELETE FROM {table} AS t USING {table} AS d
+        WHERE t.table_name = d.table_name AND t.ctid > d.ctid;
+    """).format(table=sql.Identifier(table_name)))
+    return db.cursor.rowcount
+
+def add_primary_key(db, table_name, dedupe=False):
+    if has_primary_key(db, table_name):
+        print(f"✅ {table_name} already has a primary key.")
+        return True
+    duplicates, nulls = count_duplicates(db, table_name), count_null_names(db, table_name)
+    if (duplicates or nulls) and not dedupe:
+        print(f"❌ {table_name} has {duplicates} duplicate and {nulls} NULL table_name rows, skipping the primary key. "
+              f"Rerun with --dedupe to delete them.")
+        return False
+    if duplicates:
+        print(f"⏳ Deleted {delete_duplicates(db, table_name)} duplicate rows of {table_name}")
+    if nulls:
+        db.cursor.execute(sql.SQL("DELETE FROM {} WHERE table_name IS NULL;").format(sql.Identifier(table_name)))
+        print(f"⏳ Deleted {db.cursor.rowcount} rows of {table_name} without a table_name")
+    db.cursor.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY (table_name);").format(sql.Identifier(table_name)))
+    db.conn.commit()
+    print(f"✅ Primary key on {table_name}.table_name added.")
+    return True
+
+def create_indexes(db, table_name):
+    column_types = get_column_types(db, table_name)
+    for column in GIN_COLUMNS:
+        if column_types.get(column) != "ARRAY":
+            print(f"❌ {table_name}.{column} is {column_types.get(column, 'missing')}, not an array, skipping its GIN index.")
+            continue
+        db.cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING gin ({});").format(
+            sql.Identifier(index_name(table_name, column)), sql.Identifier(table_name), sql.Identifier(column)))
+    for column in BTREE_COLUMNS:
+        if column not in column_types:
+            print(f"❌ {table_name}.{column} does not exist, skipping its index.")
+            continue
+        db.cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ({});").format(
+            sql.Identifier(index_name(table_name, column)), sql.Identifier(table_name), sql.Identifier(column)))
+    db.cursor.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(table_name)))
+    db.conn.commit()
+    print(f"✅ Indexes on {table_name} created.")
+
+def plan_indexes(plan):
+    """ Names of the indexes an EXPLAIN (FORMAT JSON) plan reads """
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+def explain_index_usage(db, table_name, column, clause):
+    """ Whether the planner can answer the clause from the column's index, regardless of table size """
+    query, parameters, _ = build_metadata_query(
+        get_column_types(db, table_name), [clause], None, table_name=table_name, distinct=not is_table_name_unique(db, table_name)
+    )
+    # Sequential scans off, so a small table does not hide a missing index
+    db.cursor.execute("SET LOCAL enable_seqscan = off;")
+    db.cursor.execute(sql.SQL("EXPLAIN (FORMAT JSON) ") + query, parameters)
+    plan = db.cursor.fetchone()["QUERY PLAN"][0]["Plan"]
+    db.conn.rollback()
+    return index_name(table_name, column) in plan_indexes(plan)
+
+def check_indexes(db, table_name):
+    column_types = get_column_types(db, table_name)
+    failed = 0
+    for column, clause in CHECK_CLAUSES.items():
+        if column not in column_types:
+            continue
+        if explain_index_usage(db, table_name, column, clause):
+            print(f"✅ {clause[0]} {clause[1]} {clause[2]!r} uses {index_name(table_name, column)}")
+        else:
+            failed += 1
+            print(f"❌ {clause[0]} {clause[1]} {clause[2]!r} does not use {index_name(table_name, column)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table_name", nargs="?", default=METADATA_TABLE)
+    parser.add_argument("--dedupe", action="store_true", help="delete duplicate and NULL table_name rows before adding the primary key")
+    parser.add_argument("--check", action="store_true", help="only EXPLAIN the filter queries and report index usage")
+    args = parser.parse_args()
+
+    with DatabaseConnection() as db:
+        if args.check:
+            raise SystemExit(0 if check_indexes(db, args.table_name) else 1)
+        add_primary_key(db, args.table_name, dedupe=args.dedupe)
+        create_indexes(db, args.table_name)
+        check_indexes(db, args.table_name)
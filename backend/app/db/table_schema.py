@@ -15,7 +15,8 @@ table_schema_dict = {
     "task_queries": "TEXT[]",
     "metadata_queries": "JSONB",
     "example_rows_embed": "VECTOR(1536)",
-    "example_cols_embed": "TEXT"
+    "example_cols_names": "TEXT[]",
+    "example_cols_embed": "BYTEA"
 }
 
 table_schema_dict_frontend = {
@@ -0,0 +1,133 @@
+from backend.app.hyse.hypo_schema_search import fetch_table_columns
+from backend.app.utils.cache import TTLCache
+from backend.app.utils.embedding_codec import decode_column_embeddings, EMBEDDING_DIM
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from collections import deque
+import hashlib
+import logging
+import os
+import numpy as np
+
+COLUMN_EMBEDDING_DIM = EMBEDDING_DIM
+NUM_COLUMN_CLUSTERS = 15
+
+# Parsed float32 column embeddings per table, bounded by their size in bytes
+COLUMN_EMBEDDING_CACHE_TTL = int(os.getenv("COLUMN_EMBEDDING_CACHE_TTL", 24 * 3600))
+COLUMN_EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("COLUMN_EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Clusterings per search space fingerprint
+COLUMN_CLUSTER_CACHE_TTL = int(os.getenv("COLUMN_CLUSTER_CACHE_TTL", 3600))
+COLUMN_CLUSTER_CACHE_MAX_ITEMS = int(os.getenv("COLUMN_CLUSTER_CACHE_MAX_ITEMS", 256))
+# A new search space sharing at least this fraction of tables with a recent one starts from its centroids
+COLUMN_CLUSTER_WARM_START_OVERLAP = float(os.getenv("COLUMN_CLUSTER_WARM_START_OVERLAP", 0.7))
+
+column_embedding_cache = TTLCache(max_items=1_000_000, ttl=COLUMN_EMBEDDING_CACHE_TTL, max_weight=COLUMN_EMBEDDING_CACHE_MAX_BYTES)
+column_cluster_cache = TTLCache(max_items=COLUMN_CLUSTER_CACHE_MAX_ITEMS, ttl=COLUMN_CLUSTER_CACHE_TTL)
+# (table set, centroids) of the latest clusterings, candidates for warm starts
+recent_clusterings = deque(maxlen=16)
+
+
+class ColumnClustering:
+    """ Clustered columns of a search space with the normalized mean embedding of every non-empty cluster """
+    def __init__(self, column_names, dataset_names, labels, cluster_ids, cluster_means, centroids):
+        self.column_names = column_names
+        self.dataset_names = dataset_names
+        self.labels = labels
+        self.cluster_ids = cluster_ids
+        self.cluster_means = cluster_means
+        self.centroids = centroids
+
+    def rank_clusters(self, task_embedding):
+        """ (cluster_id, cosine similarity to the task) pairs, most similar first, in one matrix product """
+        task = np.asarray(task_embedding, dtype=np.float32)
+        similarities = self.cluster_means @ (task / (np.linalg.norm(task) or 1))
+        order = np.argsort(-similarities, kind="stable")
+        return [(int(self.cluster_ids[i]), float(similarities[i])) for i in order]
+
+    def members(self, cluster_id):
+        """ Column names and dataset names of one cluster """
+        positions = np.flatnonzero(self.labels == cluster_id)
+        return [self.column_names[i] for i in positions], [self.dataset_names[i] for i in positions]
+
+
+def get_column_embeddings(table_names):
+    """ table_name -> (column names, float32 matrix); tables are fetched and decoded only on a cache miss """
+    columns_by_table = {}
+    missing = []
+    for table_name in table_names:
+        cached = column_embedding_cache.get(table_name)
+        if cached is None:
+            missing.append(table_name)
+        else:
+            columns_by_table[table_name] = cached
+
+    for table_name, row in fetch_table_columns(missing, ["example_cols_names", "example_cols_embed"]).items():
+        if not row["example_cols_embed"]:
+            continue
+        try:
+            parsed = decode_column_embeddings(table_name, row["example_cols_names"], row["example_cols_embed"], COLUMN_EMBEDDING_DIM)
+        except (ValueError, SyntaxError) as e:
+            logging.error(f"Could not parse column embeddings of {table_name}: {e}")
+            continue
+        column_embedding_cache.set(table_name, parsed, weight=parsed[1].nbytes + 1)
+        columns_by_table[table_name] = parsed
+    return columns_by_table
+
+def search_space_fingerprint(table_names, num_clusters):
+    return hashlib.sha256("\0".join([str(num_clusters)] + sorted(table_names)).encode("utf-8")).hexdigest()
+
+def warm_start_centroids(table_names, num_clusters):
+    """ Centroids of the recent clustering that overlaps the most with this search space, if close enough """
+    best_overlap, best_centroids = 0, None
+    for recent_tables, centroids in list(recent_clusterings):
+        if len(centroids) != num_clusters:
+            continue
+        overlap = len(table_names & recent_tables) / len(table_names | recent_tables)
+        if overlap > best_overlap:
+            best_overlap, best_centroids = overlap, centroids
+    return best_centroids if best_overlap >= COLUMN_CLUSTER_WARM_START_OVERLAP else None
+
+def cluster_columns(table_names, num_clusters=NUM_COLUMN_CLUSTERS):
+    """ Cluster the columns of the given tables, reusing the clustering of an identical search space """
+    table_names = list(dict.fromkeys(table_names))
+    fingerprint = search_space_fingerprint(table_names, num_clusters)
+    cached = column_cluster_cache.get(fingerprint)
+    if cached is not None:
+        return cached
+
+    columns_by_table = get_column_embeddings(table_names)
+    column_names, dataset_names, matrices = [], [], []
+    for table_name in table_names:
+        if table_name not in columns_by_table:
+            continue
+        names, matrix = columns_by_table[table_name]
+        column_names.extend(names)
+        dataset_names.extend([table_name] * len(names))
+        matrices.append(matrix)
+    embedding_matrix = np.vstack(matrices) if matrices else np.empty((0, COLUMN_EMBEDDING_DIM), dtype=np.float32)
+    logging.info(f"Embedding matrix shape: {embedding_matrix.shape}")
+    if len(embedding_matrix) == 0:
+        return None
+
+    num_clusters = min(num_clusters, len(embedding_matrix))
+    table_set = set(columns_by_table)
+    centroids = warm_start_centroids(table_set, num_clusters)
+    if centroids is not None:
+        # The space only changed a little: a single run from the previous centroids converges quickly
+        kmeans = KMeans(n_clusters=num_clusters, init=centroids, n_init=1, random_state=42)
+    elif len(embedding_matrix) > 4096:
+        kmeans = MiniBatchKMeans(n_clusters=num_clusters, random_state=42, n_init=3, batch_size=1024)
+    else:
+        kmeans = KMeans(n_clusters=num_clusters, random_state=42)
+    labels = kmeans.fit_predict(embedding_matrix)
+
+    # Mean embedding of every non-empty cluster with one (clusters x columns) @ (columns x dim) product
+    cluster_ids, counts = np.unique(labels, return_counts=True)
+    membership = (labels[None, :] == cluster_ids[:, None]).astype(np.float32)
+    cluster_means = (membership @ embedding_matrix) / counts[:, None]
+    cluster_means /= np.maximum(np.linalg.norm(cluster_means, axis=1, keepdims=True), 1e-12)
+
+    clustering = ColumnClustering(column_names, dataset_names, labels, cluster_ids, cluster_means,
+                                  kmeans.cluster_centers_.astype(np.float32))
+    column_cluster_cache.set(fingerprint, clustering)
+    recent_clusterings.append((table_set, clustering.centroids))
+    return clustering
@@ -1,9 +1,15 @@
 from backend.app.table_representation.openai_client import OpenAIClient
 from backend.app.utils.utils import format_prompt, format_cos_sim_results
+from backend.app.utils.cache import TTLCache
 from backend.app.db.connect_db import DatabaseConnection
+from backend.app.hyse.vector_index import get_vector_index
 from pydantic import BaseModel
 from typing import List, Any
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import os
 import random
+import re
 import logging
 import numpy as np
 from dotenv import load_dotenv
@@ -13,6 +19,36 @@ load_dotenv()
 # Initialize OpenAI client
 openai_client = OpenAIClient()
 
+# Bounded thread pool shared by concurrent HySE searches (LLM calls, embeddings and DB queries are all I/O bound)
+HYSE_MAX_WORKERS = int(os.getenv("HYSE_MAX_WORKERS", 8))
+hyse_executor = ThreadPoolExecutor(max_workers=HYSE_MAX_WORKERS, thread_name_prefix="hyse")
+
+# Columns returned to the UI for a search result; embedding columns are fetched only by endpoints that need them
+DISPLAY_COLUMNS = [
+    "table_name", "database_name", "example_rows_md", "time_granu", "geo_granu", "db_description",
+    "col_num", "row_num", "popularity", "usability_rating", "tags", "file_size_in_byte", "keywords",
+    "task_queries", "metadata_queries", "dataset_context", "dataset_purpose", "dataset_source",
+    "dataset_collection_method", "dataset_column_dictionary", "dataset_references", "dataset_acknowledgements"
+]
+
+# Columns returned by the vector search itself: just enough to rank and filter tables
+SLIM_COLUMNS = ["table_name", "database_name"]
+
+# How per-probe results are fused into one ranking: "mean", "max" or "rrf"
+HYSE_FUSION = os.getenv("HYSE_FUSION", "mean")
+RRF_K = 60
+
+# Databases that are never returned as search results
+BLOCKED_DATABASE_KEYWORDS = ["building data genome", "georgia voter lists", "ohio census data", "costa rica", "life expectancy", "who health indicators", "nasdaq", "coffee"]
+BLOCKED_DATABASE_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in BLOCKED_DATABASE_KEYWORDS))
+
+# Validated hypothetical schemas keyed by (prompt template, model, query[, num_left]), so repeated searches skip the LLM
+# Their embeddings are served by the OpenAIClient embedding cache
+schema_cache = TTLCache(
+    max_items=int(os.getenv("SCHEMA_CACHE_MAX_ITEMS", 1024)),
+    ttl=int(os.getenv("SCHEMA_CACHE_TTL", 3600))
+)
+
 # Craft schema inference prompt
 PROMPT_SINGLE_SCHEMA = """
 Given the task of {query}, help me generate a database schema to to implement the task.
@@ -64,9 +100,12 @@ class TableSchema(BaseModel):
     data_types: List[str]
     example_row: List[Any]
 
-def hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name="paper_filtered", column_name="example_rows_embed"):
-    # Step 0: Initialize the results list and num_left
-    results = []
+def hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name="paper_filtered", column_name="example_rows_embed", concurrent=True):
+    if concurrent:
+        return concurrent_hyse_search(initial_query, search_space, num_schema, k, table_name, column_name)
+
+    # Step 0: Initialize the embeddings list and num_left
+    embeddings = []
     num_left = num_schema
 
     # Step 1: Single HySE search
@@ -75,12 +114,9 @@ def hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name
 
     # Step 1.2: Generate embedding for the single hypothetical schema
     single_hypo_schema_embedding = openai_client.generate_embeddings(text=single_hypo_schema_json)
+    embeddings.append(single_hypo_schema_embedding)
 
-    # Step 1.3: Cosine similarity search between e(hypo_schema_embed) and e(existing_scheme_embed)
-    single_hyse_results = cos_sim_search(single_hypo_schema_embedding, search_space, table_name, column_name)
-    results.append(single_hyse_results)
-
-    # Step 1.4: Update num_left by decrementing it by 1
+    # Step 1.3: Update num_left by decrementing it by 1
     num_left -= 1
     
     # Step 2: Multiple HySE search
@@ -94,27 +130,131 @@ def hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name
         logging.info(f"Multiple hypothetical schemas JSON: {multi_hypo_schemas_json}")
 
         # Step 2.3: Generate embeddings for the multiple hypothetical schemas
-        multi_hypo_schemas_embeddings = [openai_client.generate_embeddings(text=schema_json) for schema_json in multi_hypo_schemas_json]
-
-        # Step 2.4: Cosine similarity search for each multiple hypothetical schema embedding
-        for hypo_schema_embedding in multi_hypo_schemas_embeddings:
-            results.append(cos_sim_search(hypo_schema_embedding, search_space, table_name, column_name))
+        embeddings.extend(openai_client.generate_embeddings_batch(multi_hypo_schemas_json))
         
-        # Step 2.5: Update num_left by decrementing it by m
+        # Step 2.4: Update num_left by decrementing it by m
         num_left -= m
 
-    # Step 3: Aggregate results from single & multiple HySE searches
-    aggregated_results = aggregate_hyse_search_results(results)
+    # Step 3: Cosine similarity search between every e(hypo_schema_embed) and e(existing_scheme_embed) in one query
+    results = multi_cos_sim_search(embeddings, search_space, table_name, column_name)
+
+    # Step 4: Aggregate results from single & multiple HySE searches and keep top k
+    aggregated_results = aggregate_hyse_search_results(results, k=k)
 
-    # Sort aggregated results by cosine similarity and keep top k
-    aggregated_results.sort(key=lambda x: x['cosine_similarity'], reverse=True)
+    # Attach display metadata to the top k only
+    top_k_results = hydrate_results(aggregated_results, table_name)
 
+    return top_k_results, single_hypo_schema_json, single_hypo_schema_embedding
 
-    top_k_results = aggregated_results[:k]
+def concurrent_hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name="paper_filtered", column_name="example_rows_embed"):
+    """ Same steps as the sequential hyse_search, but the single and multiple schema inferences start together
+    and every hypothetical schema is embedded as soon as it is inferred """
+    # Step 0: Initialize the pending futures and num_left
+    num_left = num_schema - 1
+    pending = {hyse_executor.submit(infer_single_hypothetical_schema, initial_query): "single"}
+    if num_left > 0:
+        pending[hyse_executor.submit(infer_multiple_hypothetical_schema, initial_query, random.randint(1, num_left))] = "multi"
+
+    single_embedding_future = None
+    multi_embedding_futures = []
+
+    # Step 1: Fan out the embedding of each inferred schema as soon as it arrives
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind = pending.pop(future)
+            if kind == "single":
+                single_hypo_schema_json = future.result().json()
+                single_embedding_future = hyse_executor.submit(openai_client.generate_embeddings, text=single_hypo_schema_json)
+            else:
+                multi_hypo_schemas, m = future.result()
+                multi_hypo_schemas_json = [schema.json() for schema in multi_hypo_schemas]
+                logging.info(f"Multiple hypothetical schemas JSON: {multi_hypo_schemas_json}")
+                for schema_json in multi_hypo_schemas_json:
+                    multi_embedding_futures.append(hyse_executor.submit(openai_client.generate_embeddings, text=schema_json))
+
+                # Request more normalized schemas if the LLM returned fewer than needed
+                num_left -= m
+                if num_left > 0:
+                    pending[hyse_executor.submit(infer_multiple_hypothetical_schema, initial_query, random.randint(1, num_left))] = "multi"
+
+    # Step 2: Join the embeddings, keeping the single schema embedding first
+    single_hypo_schema_embedding = single_embedding_future.result()
+    embeddings = [single_hypo_schema_embedding] + [future.result() for future in multi_embedding_futures]
+
+    # Step 3: Search all hypothetical schema embeddings in one round trip and aggregate
+    results = multi_cos_sim_search(embeddings, search_space, table_name, column_name)
+    aggregated_results = aggregate_hyse_search_results(results, k=k)
+    top_k_results = hydrate_results(aggregated_results, table_name)
 
     return top_k_results, single_hypo_schema_json, single_hypo_schema_embedding
 
+def stream_hyse_search(initial_query, search_space=None, num_schema=3, k=10, table_name="paper_filtered", column_name="example_rows_embed"):
+    """ Progressive concurrent_hyse_search: yields (stage, top_k_results, num_probes) as the ranking improves.
+    "preliminary" ranks by the raw query embedding, one "update" follows each hypothetical schema's search,
+    and "final" fuses the same probes in the same order as concurrent_hyse_search, so it returns the same ranking """
+    def search_probe(embedding):
+        results = multi_cos_sim_search([embedding], search_space, table_name, column_name)
+        return results[0] if results else []
+
+    # Step 0: Start the raw query probe and the schema inferences together
+    raw_query_future = hyse_executor.submit(lambda: search_probe(openai_client.generate_embeddings(text=initial_query)))
+    num_left = num_schema - 1
+    pending = {hyse_executor.submit(infer_single_hypothetical_schema, initial_query): "single"}
+    if num_left > 0:
+        pending[hyse_executor.submit(infer_multiple_hypothetical_schema, initial_query, random.randint(1, num_left))] = "multi"
+
+    # Per-probe results in concurrent_hyse_search's order: the single schema first, then the multiple schemas as requested
+    probe_results = {}
+    probe_futures = {}
+    next_multi_slot = 1
+    # Display metadata of the tables ranked so far, so each event only queries the tables that just entered the top k
+    metadata_cache = {}
+
+    def fuse():
+        ordered = [probe_results[slot] for slot in sorted(probe_results)]
+        return hydrate_results(aggregate_hyse_search_results(ordered, k=k), table_name, metadata_cache=metadata_cache)
+
+    # Step 1: The raw query ranking arrives after one embedding and one search
+    preliminary = aggregate_hyse_search_results([raw_query_future.result()], k=k)
+    yield "preliminary", hydrate_results(preliminary, table_name, metadata_cache=metadata_cache), 1
+
+    # Step 2: Embed and search every schema as soon as it is inferred, re-fusing after each probe
+    while pending or probe_futures:
+        done, _ = wait(list(pending) + list(probe_futures), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future in probe_futures:
+                probe_results[probe_futures.pop(future)] = future.result()
+                if pending or probe_futures:
+                    yield "update", fuse(), len(probe_results)
+                continue
+            kind = pending.pop(future)
+            if kind == "single":
+                schemas_json = [(0, future.result().json())]
+            else:
+                multi_hypo_schemas, m = future.result()
+                schemas_json = [(next_multi_slot + i, schema.json()) for i, schema in enumerate(multi_hypo_schemas)]
+                next_multi_slot += m
+                num_left -= m
+                if num_left > 0:
+                    pending[hyse_executor.submit(infer_multiple_hypothetical_schema, initial_query, random.randint(1, num_left))] = "multi"
+            for slot, schema_json in schemas_json:
+                probe_future = hyse_executor.submit(lambda text: search_probe(openai_client.generate_embeddings(text=text)), schema_json)
+                probe_futures[probe_future] = slot
+
+    # Step 3: Final ranking over all hypothetical schema probes
+    yield "final", fuse(), len(probe_results)
+
+def schema_cache_key(prompt_template, query, *args):
+    """ Cache key of a structured schema inference; whitespace differences in the query do not matter """
+    return (prompt_template, openai_client.text_generation_model_default, " ".join(query.split()), *args)
+
 def infer_single_hypothetical_schema(initial_query):
+    cache_key = schema_cache_key(PROMPT_SINGLE_SCHEMA, initial_query)
+    cached_schema = schema_cache.get(cache_key)
+    if cached_schema is not None:
+        return cached_schema
+
     prompt = format_prompt(PROMPT_SINGLE_SCHEMA, query=initial_query)
 
     response_model = TableSchema
@@ -124,9 +264,17 @@ def infer_single_hypothetical_schema(initial_query):
         {"role": "user", "content": prompt}
     ]
 
-    return openai_client.infer_metadata(messages, response_model)
+    response = openai_client.infer_metadata(messages, response_model)
+    if response is not None:
+        schema_cache.set(cache_key, response)
+    return response
 
 def infer_multiple_hypothetical_schema(initial_query, num_left):
+    cache_key = schema_cache_key(PROMPT_MULTI_SCHEMA, initial_query, num_left)
+    cached_schemas = schema_cache.get(cache_key)
+    if cached_schemas is not None:
+        return cached_schemas, len(cached_schemas)
+
     prompt = format_prompt(PROMPT_MULTI_SCHEMA, query=initial_query, num_left=num_left)
 
     response_model = List[TableSchema]
@@ -138,6 +286,8 @@ def infer_multiple_hypothetical_schema(initial_query, num_left):
 
     response = openai_client.infer_metadata(messages, response_model)
     m = len(response)
+    if m > 0:
+        schema_cache.set(cache_key, response)
     return response, m
 
 def hnsw_search(column, search_space, table_name="paper_filtered_column_embeddings", column_name="embedding"):
@@ -145,80 +295,86 @@ def hnsw_search(column, search_space, table_name="paper_filtered_column_embeddin
     given_column_embedding = openai_client.generate_embeddings(column) 
     table_names = [item['table_name'] for item in search_space]
     logging.info(search_space)
-    with DatabaseConnection() as db:
-        if table_names:
-            # Filter by specific table names
-            query = f"""
-                SELECT *, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
-                FROM {table_name}
-                WHERE table_name = ANY(%s)
-                ORDER BY cosine_similarity DESC
-                LIMIT 50;
-            """
-            db.cursor.execute(query, (given_column_embedding, table_names))
-        
-        logging.info("FETCH ")
-        results = db.cursor.fetchall()
-        if results:
-            table_names = []
-
-            for idx, result in enumerate(results, start=1):
-                # Extract cosine_similarity, table_name, and column_name
-                cos_sim = result['cosine_similarity']
-                table_name = result['table_name']
 
-                # Print only results with cosine_similarity > 0.4 (40%)
-                if cos_sim > 0.4:
-                    logging.info(f"Rank {idx}: {cos_sim} - Table: {table_name}, Column: {result['column_name']}")
-
-                    # Append table name if it has a cosine similarity greater than 40%
-                    table_names.append(table_name)
+    index = get_vector_index(table_name, column_name, ("table_name", "column_name"))
+    if index is not None:
+        results = index.search(given_column_embedding, k=50, search_space=table_names)
+    else:
+        with DatabaseConnection() as db:
+            results = []
+            if table_names:
+                # Filter by specific table names
+                query = f"""
+                    SELECT table_name, column_name, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
+                    FROM {table_name}
+                    WHERE table_name = ANY(%s)
+                    ORDER BY cosine_similarity DESC
+                    LIMIT 50;
+                """
+                db.cursor.execute(query, (given_column_embedding, table_names))
+                logging.info("FETCH ")
+                results = db.cursor.fetchall()
+
+    if results:
+        table_names = []
+
+        for idx, result in enumerate(results, start=1):
+            # Extract cosine_similarity, table_name, and column_name
+            cos_sim = result['cosine_similarity']
+            table_name = result['table_name']
+
+            # Print only results with cosine_similarity > 0.4 (40%)
+            if cos_sim > 0.4:
+                logging.info(f"Rank {idx}: {cos_sim} - Table: {table_name}, Column: {result['column_name']}")
+
+                # Append table name if it has a cosine similarity greater than 40%
+                table_names.append(table_name)
 
-        # Get unique table names where cosine similarity is greater than 40%
-        unique_table_names = list(set(table_names))
-        logging.info(f"Unique table names with cosine_similarity > 40%: {unique_table_names}")
-        logging.info(len(unique_table_names))
+    # Get unique table names where cosine similarity is greater than 40%
+    unique_table_names = list(set(table_names))
+    logging.info(f"Unique table names with cosine_similarity > 40%: {unique_table_names}")
+    logging.info(len(unique_table_names))
 
-        logging.info("Search Space: %s", search_space)
-        filtered_datasets = [dataset for dataset in search_space if dataset['table_name'] in unique_table_names]
-        logging.info(filtered_datasets)
-        return filtered_datasets
+    logging.info("Search Space: %s", search_space)
+    filtered_datasets = [dataset for dataset in search_space if dataset['table_name'] in unique_table_names]
+    logging.info(filtered_datasets)
+    return filtered_datasets
 
 def hnsw_semantics_search(task, search_space, table_name="paper_filtered_semantics_embeddings", column_name="semantics_embedding"):
     logging.info(task)
     given_column_embedding = openai_client.generate_embeddings(task) 
     table_names = [item['table_name'] for item in search_space]
     logging.info(len(search_space))
-    with DatabaseConnection() as db:
-        if table_names:
-            # Filter by specific table names
-            query = f"""
-                SELECT *, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
-                FROM {table_name}
-                WHERE table_name = ANY(%s)
-                ORDER BY cosine_similarity DESC;
-            """
-            db.cursor.execute(query, (given_column_embedding, table_names))
-        
-        logging.info("FETCH ")
-        results = db.cursor.fetchall()
-        if results:
-            table_names = []
 
-            for idx, result in enumerate(results, start=1):
-                # Extract cosine_similarity, table_name, and column_name
-                cos_sim = result['cosine_similarity']
-                table_name = result['table_name']
-                table_names.append(table_name)
-
-        # Get unique table names where cosine similarity is greater than 40%
-        unique_table_names = list(set(table_names))
-        logging.info(f"Unique table names for semantics: {len(unique_table_names)}")
-
-        filtered_datasets = [dataset for dataset in search_space if dataset['table_name'] in unique_table_names]
-        return filtered_datasets
-
-def cos_sim_search(input_embedding, search_space, table_name="paper_filtered", column_name="example_rows_embed"):  
+    index = get_vector_index(table_name, column_name)
+    if index is not None:
+        results = index.search(given_column_embedding, search_space=table_names)
+    else:
+        with DatabaseConnection() as db:
+            results = []
+            if table_names:
+                # Filter by specific table names
+                query = f"""
+                    SELECT table_name, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
+                    FROM {table_name}
+                    WHERE table_name = ANY(%s)
+                    ORDER BY cosine_similarity DESC;
+                """
+                db.cursor.execute(query, (given_column_embedding, table_names))
+                logging.info("FETCH ")
+                results = db.cursor.fetchall()
+
+    if results:
+        table_names = [result['table_name'] for result in results]
+
+    # Get unique table names where cosine similarity is greater than 40%
+    unique_table_names = list(set(table_names))
+    logging.info(f"Unique table names for semantics: {len(unique_table_names)}")
+
+    filtered_datasets = [dataset for dataset in search_space if dataset['table_name'] in unique_table_names]
+    return filtered_datasets
+
+def cos_sim_search(input_embedding, search_space, table_name="paper_filtered", column_name="example_rows_embed", slim=True):  
     # Ensure input_embedding is a list before passing to execute
     if isinstance(input_embedding, np.ndarray):
         input_embedding = input_embedding.tolist()
@@ -227,13 +383,16 @@ def cos_sim_search(input_embedding, search_space, table_name="paper_filtered", c
     else:
         input_embedding = list(input_embedding)
     
-    with DatabaseConnection() as db:
-        db.reset_connection()
+    index = get_vector_index(table_name, column_name, SLIM_COLUMNS) if slim else None
+    if index is not None:
+        return index.search(input_embedding, k=None if search_space else 100, search_space=search_space or None)
 
+    projection = ", ".join(SLIM_COLUMNS) if slim else "*"
+    with DatabaseConnection() as db:
         if search_space:
             # Filter by specific table names
             query = f"""
-                SELECT *, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
+                SELECT {projection}, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
                 FROM {table_name}
                 WHERE table_name = ANY(%s)
                 ORDER BY cosine_similarity DESC;
@@ -249,7 +408,7 @@ def cos_sim_search(input_embedding, search_space, table_name="paper_filtered", c
             print(f"Total rows in db: {row_count}")
 
             query = f"""
-                SELECT *, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
+                SELECT {projection}, 1 - ({column_name} <=> %s::VECTOR(1536)) AS cosine_similarity
                 FROM {table_name}
                 ORDER BY cosine_similarity DESC
                 LIMIT 100;
@@ -264,103 +423,164 @@ def cos_sim_search(input_embedding, search_space, table_name="paper_filtered", c
     # logging.info(formatted_results)
     return results
 
-def aggregate_hyse_search_results(results):
-    # Flatten the list of results
-    flat_results = [item for sublist in results for item in sublist]
-    logging.info("AGGREGATE_HYSE")
-    # Aggregate by table name and calculate mean cosine similarity
-    aggregated_results = {}
-    logging.info("TRYING RESULTS")
-    for result in flat_results:
-        db_name = result['database_name'].lower()
-        logging.info(db_name)
-
-        keywords = ["building data genome", "georgia voter lists", "ohio census data", "costa rica", "life expectancy", "who health indicators", "nasdaq", "coffee"]
-
-        if any(keyword in db_name for keyword in keywords):            
-            logging.info("SKIPPING")
-            continue
-        
-        table_name = result['table_name']
-        database_name = result['database_name']
-        cosine_similarity = result['cosine_similarity']
-        example_rows_md = result['example_rows_md']
-        time_granu = result['time_granu']
-        geo_granu = result['geo_granu']
-        db_description = result['db_description']
-        col_num = result['col_num']
-        row_num = result['row_num']
-        popularity = result['popularity']
-        usability_rating = result['usability_rating']
-        tags = result['tags']
-        file_size_in_byte = result['file_size_in_byte']
-        keywords = result['keywords']
-        task_queries = result['task_queries']
-        metadata_queries = result['metadata_queries']
-        example_rows_embed = result['example_rows_embed']
-        example_cols_embed = result['example_cols_embed']
-        dataset_context = result['dataset_context']
-        dataset_purpose = result['dataset_purpose']
-        dataset_source = result['dataset_source']
-        dataset_collection_method = result['dataset_collection_method']
-        dataset_column_dictionary = result['dataset_column_dictionary']
-        dataset_references = result['dataset_references']
-        dataset_acknowledgements = result['dataset_acknowledgements']
-        result_semantics_embed = result['result_semantics_embed']
+def to_vector_literal(embedding):
+    """ Format an embedding as a pgvector text literal, e.g. '[0.1,0.2]' """
+    if isinstance(embedding, np.ndarray):
+        embedding = embedding.tolist()
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+def multi_cos_sim_search(input_embeddings, search_space, table_name="paper_filtered", column_name="example_rows_embed", limit=100, slim=True):
+    """ Cosine similarity search for several probe embeddings in a single query, returning one result list per probe """
+    input_embeddings = [embedding for embedding in input_embeddings if embedding is not None]
+    if not input_embeddings:
+        return []
+
+    # Serve the probes from the in-process index when it is available
+    index = get_vector_index(table_name, column_name, SLIM_COLUMNS) if slim else None
+    if index is not None:
+        return [
+            index.search(embedding, k=None if search_space else limit, search_space=search_space or None)
+            for embedding in input_embeddings
+        ]
+
+    probes = [to_vector_literal(embedding) for embedding in input_embeddings]
+
+    if search_space:
+        # Score every table in the search space for each probe
+        candidate_filter, candidate_limit = "WHERE table_name = ANY(%s)", ""
+        parameters = (probes, search_space)
+    else:
+        # No specific search space, keep the nearest tables of each probe
+        candidate_filter, candidate_limit = "", f"LIMIT {int(limit)}"
+        parameters = (probes,)
+
+    projection = ", ".join(SLIM_COLUMNS) if slim else "*"
+    query = f"""
+        SELECT probe.probe_id, candidate.*
+        FROM unnest(%s::TEXT[]) WITH ORDINALITY AS probe(embedding, probe_id)
+        CROSS JOIN LATERAL (
+            SELECT {projection}, 1 - ({column_name} <=> probe.embedding::VECTOR(1536)) AS cosine_similarity
+            FROM {table_name}
+            {candidate_filter}
+            ORDER BY {column_name} <=> probe.embedding::VECTOR(1536)
+            {candidate_limit}
+        ) AS candidate
+        ORDER BY probe.probe_id, candidate.cosine_similarity DESC;
+    """
 
-        
-        if not isinstance(cosine_similarity, (int, float)):
-            logging.error(f"Unexpected type for cosine_similarity: {type(cosine_similarity)} with value {cosine_similarity}")
-            raise ValueError(f"Unexpected type for cosine_similarity: {type(cosine_similarity)}")
-        
-          # Add cosine similarity and other data to aggregated results by table name
-        if table_name not in aggregated_results:
-            aggregated_results[table_name] = {
-                'table_name': table_name,
-                'database_name': database_name,
-                'example_rows_md': example_rows_md,
-                'time_granu': time_granu,
-                'geo_granu': geo_granu,
-                'db_description': db_description,
-                'col_num': col_num,
-                'row_num': row_num,
-                'popularity': popularity,
-                'usability_rating': usability_rating,
-                'tags': tags,
-                'file_size_in_byte': file_size_in_byte,
-                'keywords': keywords,
-                'task_queries': task_queries,
-                'metadata_queries': metadata_queries,
-                'example_rows_embed': example_rows_embed,
-                'example_cols_embed': example_cols_embed,
-                'dataset_context': dataset_context,
-                'dataset_purpose': dataset_purpose,
-                'dataset_source': dataset_source,
-                'dataset_collection_method': dataset_collection_method,
-                'dataset_column_dictionary': dataset_column_dictionary,
-                'dataset_references': dataset_references,
-                'dataset_acknowledgements': dataset_acknowledgements,
-                'result_semantics_embed': result_semantics_embed,
-                'cosine_similarity': [cosine_similarity],
-            }
-        else:
-            # Add cosine similarity to existing entry
-            aggregated_results[table_name]['cosine_similarity'].append(cosine_similarity)
-    
-    # Calculate the mean cosine similarity for each table
-    final_results = [
-    {
-        **aggregated_results[table_name],  # Include all the aggregated data
-        'cosine_similarity': sum(aggregated_results[table_name]['cosine_similarity']) / len(aggregated_results[table_name]['cosine_similarity'])
-    }
-    for table_name in aggregated_results
+    with DatabaseConnection() as db:
+        db.cursor.execute(query, parameters)
+        rows = db.cursor.fetchall()
+
+    # Split the rows back into one result list per probe
+    results = [[] for _ in probes]
+    for row in rows:
+        results[row.pop('probe_id') - 1].append(row)
+    return results
+
+def is_blocked_database(database_name):
+    """ Whether a database matches the hard-coded blocklist; cached per distinct database name """
+    return _is_blocked_database((database_name or "").lower())
+
+@lru_cache(maxsize=None)
+def _is_blocked_database(database_name):
+    return BLOCKED_DATABASE_PATTERN.search(database_name) is not None
+
+def aggregate_hyse_search_results(results, fusion=HYSE_FUSION, k=None):
+    """ Fuse per-probe results into one ranking using a (probes x tables) score matrix.
+    fusion is "mean" (mean cosine similarity over every hit of a table), "max" or "rrf" (reciprocal rank fusion) """
+    # Map table names to columns of the score matrix, in order of first appearance
+    table_ids, database_names = {}, []
+    for probe_results in results:
+        for result in probe_results:
+            if result['table_name'] not in table_ids:
+                table_ids[result['table_name']] = len(table_ids)
+                database_names.append(result['database_name'])
+    if not table_ids:
+        return []
+
+    # A probe can return a table more than once, so hits are summed and counted per (probe, table)
+    sums = np.zeros((len(results), len(table_ids)))
+    counts = np.zeros((len(results), len(table_ids)))
+    for probe_id, probe_results in enumerate(results):
+        columns = [table_ids[result['table_name']] for result in probe_results]
+        np.add.at(sums, (probe_id, columns), [result['cosine_similarity'] for result in probe_results])
+        np.add.at(counts, (probe_id, columns), 1)
+    # Mean score of each table in each probe, NaN where the probe missed it
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = sums / counts
+
+    # Drop blocklisted databases with one mask over the distinct tables
+    keep = ~np.array([is_blocked_database(database_name) for database_name in database_names])
+
+    # Mean over every hit of a table, as the flat per-result average did
+    mean_scores = sums.sum(axis=0) / counts.sum(axis=0)
+    if fusion == "max":
+        fused_scores = np.nanmax(scores, axis=0)
+    elif fusion == "rrf":
+        # Rank of each table within each probe (1 = best); tables missing from a probe contribute nothing
+        ranks = np.argsort(np.argsort(-np.nan_to_num(scores, nan=-np.inf), axis=1), axis=1) + 1
+        fused_scores = np.where(np.isnan(scores), 0, 1 / (RRF_K + ranks)).sum(axis=0)
+    else:
+        fused_scores = mean_scores
+
+    ranked = [table_id for table_id in np.argsort(-fused_scores, kind="stable") if keep[table_id]]
+    if k is not None:
+        ranked = ranked[:k]
+
+    table_names = list(table_ids)
+    return [
+        {
+            'table_name': table_names[table_id],
+            'database_name': database_names[table_id],
+            'cosine_similarity': float(mean_scores[table_id]),
+            'fused_score': float(fused_scores[table_id]),
+        }
+        for table_id in ranked
     ]
-    
-    # Sort the final results by mean cosine similarity in descending order
-    final_results.sort(key=lambda x: x['cosine_similarity'], reverse=True)
 
-    return final_results
-    
+def hydrate_results(results, table_name="paper_filtered", columns=DISPLAY_COLUMNS, metadata_cache=None):
+    """ Attach display metadata to ranked (table_name, cosine_similarity) results with one batched query.
+    metadata_cache (table_name -> row) keeps the rows of earlier calls, so only tables not seen yet are queried """
+    if not results:
+        return []
+    metadata_by_table = metadata_cache if metadata_cache is not None else {}
+    table_names = [result['table_name'] for result in results if result['table_name'] not in metadata_by_table]
+    if table_names:
+        with DatabaseConnection() as db:
+            query = f"""
+                SELECT {", ".join(columns)}
+                FROM {table_name}
+                WHERE table_name = ANY(%s);
+            """
+            db.cursor.execute(query, (table_names,))
+            rows = {row['table_name']: row for row in db.cursor.fetchall()}
+        # Tables without metadata are remembered as well, so they are not queried again
+        metadata_by_table.update({name: rows.get(name, {}) for name in table_names})
+
+    # Keep the ranking order and scores of the input results
+    return [
+        {**metadata_by_table[result['table_name']], **result}
+        for result in results
+    ]
+
+def fetch_table_columns(table_names, column_names, table_name="paper_filtered"):
+    """ Fetch a few columns of the given tables as table_name -> row """
+    if not table_names:
+        return {}
+    with DatabaseConnection() as db:
+        query = f"""
+            SELECT table_name, {", ".join(column_names)}
+            FROM {table_name}
+            WHERE table_name = ANY(%s);
+        """
+        db.cursor.execute(query, (list(table_names),))
+        return {row['table_name']: row for row in db.cursor.fetchall()}
+
+def fetch_table_embeddings(table_names, column_name, table_name="paper_filtered"):
+    """ Fetch one embedding column for the given tables, for the endpoints that actually need embeddings """
+    rows = fetch_table_columns(table_names, [column_name], table_name)
+    return {name: row[column_name] for name, row in rows.items()}
 
 def most_popular_datasets():
     with DatabaseConnection() as db:        
@@ -0,0 +1,178 @@
+from backend.app.db.connect_db import DatabaseConnection
+import os
+import threading
+import time
+import logging
+import numpy as np
+import hnswlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The in-process index is optional; when disabled (or not loadable) searches fall back to pgvector
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+# "exact" scores every row with one matrix-vector product, "hnsw" uses an hnswlib graph
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "exact")
+VECTOR_INDEX_EF = int(os.getenv("VECTOR_INDEX_EF", 200))
+# A table whose index failed to load uses pgvector for this long before the load is tried again
+VECTOR_INDEX_RETRY_SECONDS = float(os.getenv("VECTOR_INDEX_RETRY_SECONDS", 300))
+
+
+def parse_vector(value):
+    """ Parse a pgvector value, returned either as a '[x,y,...]' string or as a sequence """
+    if isinstance(value, str):
+        return np.fromstring(value.strip("[]"), dtype=np.float32, sep=",")
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorIndex:
+    """ In-memory cosine similarity index over one embedding column of a Postgres table """
+    def __init__(self, table_name, column_name, label_columns=("table_name",), backend=VECTOR_INDEX_BACKEND):
+        self.table_name = table_name
+        self.column_name = column_name
+        self.label_columns = list(label_columns)
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.matrix = None  # (rows, dim) float32, L2-normalized rows grouped by table
+        self.labels = None  # label column -> np.ndarray of values per row
+        self.table_ids = None  # table_name -> integer table id
+        self.table_offsets = None  # rows of table id i are table_offsets[i]:table_offsets[i + 1]
+        self.hnsw = None
+
+    @property
+    def loaded(self):
+        return self.matrix is not None
+
+    def load(self):
+        """ (Re)load the embeddings from Postgres; searches keep using the previous snapshot until the swap """
+        with DatabaseConnection() as db:
+            query = f"""
+                SELECT {", ".join(self.label_columns)}, {self.column_name}
+                FROM {self.table_name}
+                WHERE {self.column_name} IS NOT NULL;
+            """
+            db.cursor.execute(query)
+            rows = db.cursor.fetchall()
+
+        if not rows:
+            raise ValueError(f"No embeddings found in {self.table_name}.{self.column_name}")
+
+        # Map table names to integer ids once and group the rows of each table contiguously
+        table_ids = {}
+        row_table_ids = np.array([table_ids.setdefault(row["table_name"], len(table_ids)) for row in rows])
+        order = np.argsort(row_table_ids, kind="stable")
+        rows = [rows[i] for i in order]
+        table_offsets = np.searchsorted(row_table_ids[order], np.arange(len(table_ids) + 1))
+
+        matrix = np.ascontiguousarray(np.vstack([parse_vector(row[self.column_name]) for row in rows]), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        labels = {column: np.array([row[column] for row in rows], dtype=object) for column in self.label_columns}
+
+        hnsw = None
+        if self.backend == "hnsw":
+            hnsw = hnswlib.Index(space="ip", dim=matrix.shape[1])
+            hnsw.init_index(max_elements=matrix.shape[0], ef_construction=200, M=16)
+            hnsw.add_items(matrix, np.arange(matrix.shape[0]))
+            hnsw.set_ef(VECTOR_INDEX_EF)
+
+        with self.lock:
+            self.matrix, self.labels, self.hnsw = matrix, labels, hnsw
+            self.table_ids, self.table_offsets = table_ids, table_offsets
+        logging.info(f"Loaded vector index {self.table_name}.{self.column_name}: {matrix.shape[0]} rows ({self.backend})")
+
+    def candidate_rows(self, search_space, table_ids=None, table_offsets=None):
+        """ Row ids of the tables in the search space, gathered from the per-table row ranges """
+        table_ids = self.table_ids if table_ids is None else table_ids
+        table_offsets = self.table_offsets if table_offsets is None else table_offsets
+        ids = np.fromiter((table_ids[name] for name in set(search_space) if name in table_ids), dtype=np.int64)
+        if len(ids) == 0:
+            return ids
+        starts = table_offsets[ids]
+        counts = table_offsets[ids + 1] - starts
+        # Expand every [start, start + count) range without a Python loop
+        shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return shifts + np.arange(counts.sum())
+
+    def search(self, query_embedding, k=None, search_space=None):
+        """ Top-k rows by cosine similarity as dicts of the label columns plus cosine_similarity.
+        With a search space only the rows of those tables are scored, so cost scales with the space, not the corpus """
+        with self.lock:
+            matrix, labels, hnsw = self.matrix, self.labels, self.hnsw
+            table_ids, table_offsets = self.table_ids, self.table_offsets
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        if hnsw is not None and search_space is None and k is not None:
+            ids, distances = hnsw.knn_query(query, k=min(k, matrix.shape[0]))
+            ids, scores = ids[0], 1 - distances[0]
+        else:
+            if search_space is None:
+                ids = np.arange(matrix.shape[0])
+                scores = matrix @ query
+            else:
+                ids = self.candidate_rows(search_space, table_ids, table_offsets)
+                scores = matrix[ids] @ query
+            if k is not None and k < len(ids):
+                top = np.argpartition(-scores, k)[:k]
+                ids, scores = ids[top], scores[top]
+            order = np.argsort(-scores)
+            ids, scores = ids[order], scores[order]
+
+        return [
+            {**{column: labels[column][row_id] for column in self.label_columns}, "cosine_similarity": float(score)}
+            for row_id, score in zip(ids, scores)
+        ]
+
+
+_vector_indexes = {}
+_vector_index_failures = {}  # key -> time.monotonic() of the last failed load
+_vector_index_locks = {}  # key -> lock held while that index loads
+# Guards the dicts above only; loads run under the per-key lock so one slow load does not block other indexes
+_vector_indexes_lock = threading.Lock()
+
+def _cached_vector_index(key):
+    """ (index, failed_recently) for key; the caller holds _vector_indexes_lock """
+    failed_at = _vector_index_failures.get(key)
+    return _vector_indexes.get(key), failed_at is not None and time.monotonic() - failed_at < VECTOR_INDEX_RETRY_SECONDS
+
+def get_vector_index(table_name, column_name, label_columns=("table_name",)):
+    """ Shared index for (table_name, column_name, label_columns), loaded on first use; None means use pgvector instead """
+    if not VECTOR_INDEX_ENABLED:
+        return None
+    key = (table_name, column_name, tuple(label_columns))
+    with _vector_indexes_lock:
+        index, failed_recently = _cached_vector_index(key)
+        if index is not None or failed_recently:
+            return index
+        key_lock = _vector_index_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        # Another request may have loaded the index, or failed to, while this one waited
+        with _vector_indexes_lock:
+            index, failed_recently = _cached_vector_index(key)
+        if index is not None or failed_recently:
+            return index
+
+        index = VectorIndex(table_name, column_name, label_columns)
+        try:
+            index.load()
+        except Exception as e:
+            logging.error(f"Could not load vector index {table_name}.{column_name}, falling back to pgvector: {e}")
+            with _vector_indexes_lock:
+                _vector_index_failures[key] = time.monotonic()
+            return None
+        with _vector_indexes_lock:
+            _vector_indexes[key] = index
+            _vector_index_failures.pop(key, None)
+        return index
+
+def refresh_vector_indexes():
+    """ Reload every loaded index, e.g. after new datasets were ingested; indexes that failed to load are retried on next use """
+    with _vector_indexes_lock:
+        indexes = list(_vector_indexes.values())
+        _vector_index_failures.clear()
+    for index in indexes:
+        index.load()
+    return [f"{index.table_name}.{index.column_name}" for index in indexes]
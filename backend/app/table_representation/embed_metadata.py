@@ -5,8 +5,8 @@ from .openai_client import OpenAIClient
 # Initialize OpenAI client
 openai_client = OpenAIClient()
 
-# Function to generate a single embedding for multiple metadata fields
-def generate_combined_embedding(dataset, metadata_fields):
+# Function to combine multiple metadata fields into the text of a single embedding
+def build_combined_text(dataset, metadata_fields):
     combined_text = []
 
     for field in metadata_fields:
@@ -22,8 +22,11 @@ def generate_combined_embedding(dataset, metadata_fields):
             # For simple string fields
             combined_text.append(f"{field}: {value}")
     
-    combined_text_str = '\n'.join(combined_text)
-    return openai_client.generate_embeddings(combined_text_str)
+    return '\n'.join(combined_text)
+
+# Function to generate a single embedding for multiple metadata fields
+def generate_combined_embedding(dataset, metadata_fields):
+    return openai_client.generate_embeddings(build_combined_text(dataset, metadata_fields))
 
 # Load the mock data
 with open('mock_data/updated_data_gov_mock_data.json', 'r') as file:
@@ -39,11 +42,15 @@ COMBINED_METADATA_FIELDS = [
 ]
 
 # TODO: Try differenet model embeddings to compare performance
-for dataset in tqdm(mock_data_corpus, desc="Embedding datasets"):
-    dataset['Combined embedding'] = generate_combined_embedding(dataset=dataset, metadata_fields=COMBINED_METADATA_FIELDS)
-    
-    query_text = json.dumps(dataset['Previous queries'])
-    dataset['Query embedding'] = openai_client.generate_embeddings(text=query_text)
+# Embed the whole corpus with batched requests instead of one request per dataset
+combined_texts = [build_combined_text(dataset, COMBINED_METADATA_FIELDS) for dataset in tqdm(mock_data_corpus, desc="Preparing datasets")]
+query_texts = [json.dumps(dataset['Previous queries']) for dataset in mock_data_corpus]
+combined_embeddings = openai_client.generate_embeddings_batch(combined_texts)
+query_embeddings = openai_client.generate_embeddings_batch(query_texts)
+
+for dataset, combined_embedding, query_embedding in zip(mock_data_corpus, combined_embeddings, query_embeddings):
+    dataset['Combined embedding'] = combined_embedding
+    dataset['Query embedding'] = query_embedding
 
 # Save the updated data w/ embeddings back to a new JSON file
 with open('mock_data/mock_data_with_embedding.json', 'w') as file:
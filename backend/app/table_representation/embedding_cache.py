@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_embedding_text(text):
+    """ Normalize text the same way it is sent to the embeddings API """
+    return text.replace("\n", " ").strip()
+
+def embedding_cache_key(model, text):
+    """ Content address of an embedding: hash of the model and the normalized text """
+    return hashlib.sha256(f"{model}\0{normalize_embedding_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """ Two-tier embedding cache: an in-process LRU in front of a SQLite store of float32 vectors.
+    Disk hits refresh last_access at most once per touch_interval seconds, so hot reads rarely write """
+    def __init__(self, path, max_memory_items=4096, max_disk_bytes=512 * 1024 * 1024, touch_interval=600):
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.touch_interval = touch_interval
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access_idx ON embeddings (last_access)")
+        self.conn.commit()
+        self.disk_bytes = self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get(self, model, text):
+        key = embedding_cache_key(model, text)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self.memory[key].tolist()
+
+            row = self.conn.execute("SELECT vector, last_access FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.time()
+            if now - row[1] > self.touch_interval:
+                self.conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            self.stats["disk_hits"] += 1
+            return vector.tolist()
+
+    def put(self, model, text, embedding):
+        if embedding is None:
+            return
+        key = embedding_cache_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        blob = vector.tobytes()
+        with self.lock:
+            self._remember(key, vector)
+            previous = self.conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                (key, model, blob, time.time())
+            )
+            self.disk_bytes += len(blob) - (previous[0] if previous else 0)
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+            self.conn.commit()
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "memory_items": len(self.memory), "disk_bytes": self.disk_bytes}
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Drop least recently used vectors until the store is back under 90% of its budget
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self.conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.disk_bytes <= target:
+                break
+            evicted.append((key,))
+            self.disk_bytes -= size
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+        logging.info(f"Embedding cache evicted {len(evicted)} vectors, {self.disk_bytes} bytes on disk")
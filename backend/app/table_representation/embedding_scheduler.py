@@ -0,0 +1,117 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+
+# Parallel embeddings requests, bounded by the deployment's requests/min and tokens/min quota
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", 8))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 3000))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 1000000))
+# Retries of throttled (429) or failed (5xx, connection) requests, with exponential backoff and jitter
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+EMBEDDING_RETRY_BASE_DELAY = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY", 1.0))
+EMBEDDING_RETRY_MAX_DELAY = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY", 60.0))
+
+
+class TokenBucket:
+    """ Thread-safe token bucket refilled continuously at rate_per_minute.
+    The capacity defaults to 10 seconds of quota, the window Azure OpenAI enforces limits on """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(rate_per_minute / 6.0, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # A request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def retry_delay(error, attempt):
+    """ Full-jitter exponential backoff, never shorter than the server's Retry-After """
+    delay = random.uniform(0, min(EMBEDDING_RETRY_MAX_DELAY, EMBEDDING_RETRY_BASE_DELAY * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+class EmbeddingScheduler:
+    """ Runs packed embeddings batches on a worker pool under request and token rate limits.
+    Results come back in batch order whatever order the requests finish in """
+    def __init__(self, client, max_workers=EMBEDDING_MAX_WORKERS, requests_per_minute=EMBEDDING_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=EMBEDDING_TOKENS_PER_MINUTE, max_retries=EMBEDDING_MAX_RETRIES):
+        # Retries are scheduled here, with the rate limiters, rather than inside the SDK
+        self.client = client.with_options(max_retries=0)
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding")
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens": 0, "retries": 0, "failed_batches": 0}
+
+    def embed(self, batches, model):
+        """ Embed [(texts, tokens), ...]; returns one list of embeddings per batch, None for batches that failed """
+        if not batches:
+            return []
+        start = time.monotonic()
+        futures = [self.executor.submit(self._embed_batch, texts, tokens, model) for texts, tokens in batches]
+        results = [future.result() for future in futures]
+
+        elapsed = max(time.monotonic() - start, 1e-9)
+        num_texts = sum(len(texts) for texts, _ in batches)
+        num_tokens = sum(tokens for _, tokens in batches)
+        if len(batches) > 1:
+            logging.info(
+                f"Embedded {num_texts} texts in {len(batches)} requests in {elapsed:.1f}s: "
+                f"{len(batches) / elapsed * 60:.0f} requests/min, {num_tokens / elapsed * 60:.0f} tokens/min ({self.get_stats()})"
+            )
+        return results
+
+    def _embed_batch(self, texts, tokens, model):
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire()
+            self.token_bucket.acquire(tokens)
+            try:
+                response = self.client.embeddings.create(model=model, input=texts)
+                self._count(requests=1, tokens=tokens)
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    logging.error(f"Error generating batch embeddings: {e}")
+                    self._count(failed_batches=1)
+                    return None
+                delay = retry_delay(e, attempt)
+                logging.warning(f"Embeddings request failed ({e.__class__.__name__}), retry {attempt + 1} in {delay:.1f}s")
+                self._count(retries=1)
+                time.sleep(delay)
+
+    def _count(self, **counts):
+        with self.stats_lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
@@ -1,13 +1,127 @@
 from dotenv import load_dotenv
+import logging
 import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
 from openai import OpenAI
 from openai import AzureOpenAI
 import instructor
+import tiktoken
+from backend.app.table_representation.embedding_cache import EmbeddingCache
+from backend.app.table_representation.embedding_scheduler import EmbeddingScheduler
 
 load_dotenv()
 
+# Limits of a single embeddings request: at most 2048 inputs, 8191 tokens per input and 300k tokens in total
+EMBEDDING_BATCH_MAX_ITEMS = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 300000
+EMBEDDING_INPUT_MAX_TOKENS = 8191
+
+# Concurrent single-text embedding calls arriving within this window (in seconds) are merged into one request.
+# The window is only waited while an earlier flush is in flight, so an isolated call is sent right away
+EMBEDDING_COALESCE_ENABLED = os.getenv("EMBEDDING_COALESCE_ENABLED", "true").lower() == "true"
+EMBEDDING_COALESCE_WINDOW = float(os.getenv("EMBEDDING_COALESCE_WINDOW", 0.01))
+
+# Persistent embedding cache keyed by (model, normalized text)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+EMBEDDING_CACHE_MAX_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MAX_MEMORY_ITEMS", 4096))
+EMBEDDING_CACHE_MAX_DISK_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_DISK_BYTES", 512 * 1024 * 1024))
+# Seconds between last_access refreshes of a vector read from disk
+EMBEDDING_CACHE_TOUCH_INTERVAL = float(os.getenv("EMBEDDING_CACHE_TOUCH_INTERVAL", 600))
+
+# Send embeddings requests to an OpenAI-compatible endpoint instead, e.g. scripts/fake_embeddings_server.py
+EMBEDDING_API_BASE_URL = os.getenv("EMBEDDING_API_BASE_URL")
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model):
+    """ tiktoken encoding of an embedding model; deployment names tiktoken does not know use cl100k_base """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+# A failing cache (locked, corrupt or unwritable SQLite file) only costs a cache miss, never the embedding
+def cache_get(cache, model, text):
+    if cache is None:
+        return None
+    try:
+        return cache.get(model, text)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Embedding cache read failed: {e}")
+        return None
+
+def cache_put(cache, model, text, embedding):
+    if cache is None:
+        return
+    try:
+        cache.put(model, text, embedding)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Embedding cache write failed: {e}")
+
+
+class EmbeddingCoalescer:
+    """ Micro-batches concurrent single-text embedding calls into one upstream embeddings request """
+    def __init__(self, embed_batch, window=EMBEDDING_COALESCE_WINDOW, max_workers=4):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.pending = {}  # model -> list of (text, future)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.flush_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding-flush")
+        self.collector = threading.Thread(target=self._collect, name="embedding-coalescer", daemon=True)
+        self.collector.start()
+
+    def submit(self, text, model):
+        future = Future()
+        with self.cond:
+            self.pending.setdefault(model, []).append((text, future))
+            self.cond.notify()
+        return future
+
+    def _collect(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                busy = self.in_flight > 0
+            # Under load, give concurrent callers a short window to join the batch
+            if busy:
+                time.sleep(self.window)
+            with self.cond:
+                pending, self.pending = self.pending, {}
+                self.in_flight += len(pending)
+            # Flush on the executor so slow upstream calls never block collection of the next batch
+            for model, items in pending.items():
+                self.flush_executor.submit(self._flush, model, items)
+
+    def _flush(self, model, items):
+        try:
+            embeddings = self.embed_batch([text for text, _ in items], model=model)
+            for (_, future), embedding in zip(items, embeddings):
+                future.set_result(embedding)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+        finally:
+            with self.cond:
+                self.in_flight -= 1
+
+
 # Azure OpenAI Assistants allows you to create AI assistants tailored to your needs
 class OpenAIClient:
+    # Shared by every client instance so calls from different modules / Flask requests are merged together
+    _embedding_coalescer = None
+    _embedding_coalescer_lock = threading.Lock()
+    _embedding_cache = None
+    _embedding_cache_lock = threading.Lock()
+    _embedding_scheduler = None
+    _embedding_scheduler_lock = threading.Lock()
+
     def __init__(self):
         # self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         # self.text_generation_model_default = "gpt-4o-mini"
@@ -19,6 +133,10 @@ class OpenAIClient:
                 ) 
         self.text_generation_model_default = "gpt-4o-mini"
         self.embedding_model_default = "text-embedding-3-small"
+        if EMBEDDING_API_BASE_URL:
+            self.embedding_client = OpenAI(base_url=EMBEDDING_API_BASE_URL, api_key=os.getenv("EMBEDDING_API_KEY", "local"))
+        else:
+            self.embedding_client = self.client
 
     def vega_assistant(self, messages, response_format=None, model=None):
         print("vega starting")
@@ -52,14 +170,17 @@ class OpenAIClient:
             print(f"Error inferring metadata: {e}")
             return
 
-    def infer_metadata_wo_instructor(self, messages, response_format=None, model=None):
+    def infer_metadata_wo_instructor(self, messages, response_format=None, model=None, timeout=None):
         if model is None:
             model = self.text_generation_model_default
+        # Only pass a timeout when one is given: None would disable the client's default timeout
+        options = {"timeout": timeout} if timeout is not None else {}
         try:
             response = self.client.chat.completions.create(
                 model=model,
                 response_format=response_format,
-                messages=messages
+                messages=messages,
+                **options
             )
             return response.choices[0].message.content
         except Exception as e:
@@ -71,14 +192,111 @@ class OpenAIClient:
             model = self.embedding_model_default
         try:
             text = text.replace("\n", " ")
-            response = self.client.embeddings.create(
+            cache = self.get_embedding_cache()
+            cached_embedding = cache_get(cache, model, text)
+            if cached_embedding is not None:
+                return cached_embedding
+            if EMBEDDING_COALESCE_ENABLED:
+                # The batch call behind the coalescer fills the cache
+                return self.get_embedding_coalescer().submit(text, model).result()
+            response = self.embedding_client.embeddings.create(
                 model=model,
                 input=text
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            cache_put(cache, model, text, embedding)
+            return embedding
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             return        
+
+    def generate_embeddings_batch(self, texts, model=None):
+        """ Embed many texts with as few requests as possible; failed batches yield None for their texts """
+        if model is None:
+            model = self.embedding_model_default
+        embeddings = [None] * len(texts)
+
+        # Only texts missing from the cache are sent upstream
+        cache = self.get_embedding_cache()
+        missing = []
+        for idx, text in enumerate(texts):
+            cached_embedding = cache_get(cache, model, text)
+            if cached_embedding is None:
+                missing.append((idx, text))
+            else:
+                embeddings[idx] = cached_embedding
+
+        # Batches run in parallel under the rate limits and come back in order
+        batches = self.pack_embedding_batches(missing, model)
+        results = self.get_embedding_scheduler().embed(
+            [([text for _, text in batch], batch_tokens) for batch, batch_tokens in batches], model
+        )
+        for (batch, _), batch_embeddings in zip(batches, results):
+            if batch_embeddings is None:
+                continue
+            for (idx, _), embedding in zip(batch, batch_embeddings):
+                embeddings[idx] = embedding
+                cache_put(cache, model, texts[idx], embedding)
+        return embeddings
+
+    def pack_embedding_batches(self, indexed_texts, model=None):
+        """ Split (index, text) pairs into (batch, token count) pairs that respect the per-request item and token limits """
+        if model is None:
+            model = self.embedding_model_default
+        if len(indexed_texts) == 1:
+            # A token is at least one byte, so a single text this short fits without tokenizing it
+            idx, text = indexed_texts[0]
+            text = text.replace("\n", " ")
+            num_bytes = len(text.encode("utf-8"))
+            if num_bytes <= EMBEDDING_INPUT_MAX_TOKENS:
+                return [([(idx, text)], num_bytes)]
+
+        tokenizer = get_tokenizer(model)
+        batches, batch, batch_tokens = [], [], 0
+        for idx, text in indexed_texts:
+            text = text.replace("\n", " ")
+            tokens = tokenizer.encode(text)
+            if len(tokens) > EMBEDDING_INPUT_MAX_TOKENS:
+                # Truncate oversized inputs instead of failing the whole batch
+                tokens = tokens[:EMBEDDING_INPUT_MAX_TOKENS]
+                text = tokenizer.decode(tokens)
+            if batch and (len(batch) >= EMBEDDING_BATCH_MAX_ITEMS or batch_tokens + len(tokens) > EMBEDDING_BATCH_MAX_TOKENS):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append((idx, text))
+            batch_tokens += len(tokens)
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    def get_embedding_coalescer(self):
+        with OpenAIClient._embedding_coalescer_lock:
+            if OpenAIClient._embedding_coalescer is None:
+                OpenAIClient._embedding_coalescer = EmbeddingCoalescer(self.generate_embeddings_batch)
+            return OpenAIClient._embedding_coalescer
+
+    def get_embedding_scheduler(self):
+        with OpenAIClient._embedding_scheduler_lock:
+            if OpenAIClient._embedding_scheduler is None:
+                OpenAIClient._embedding_scheduler = EmbeddingScheduler(self.embedding_client)
+            return OpenAIClient._embedding_scheduler
+
+    def get_embedding_cache(self):
+        if not EMBEDDING_CACHE_ENABLED:
+            return None
+        with OpenAIClient._embedding_cache_lock:
+            if OpenAIClient._embedding_cache is None:
+                try:
+                    OpenAIClient._embedding_cache = EmbeddingCache(
+                        EMBEDDING_CACHE_PATH,
+                        max_memory_items=EMBEDDING_CACHE_MAX_MEMORY_ITEMS,
+                        max_disk_bytes=EMBEDDING_CACHE_MAX_DISK_BYTES,
+                        touch_interval=EMBEDDING_CACHE_TOUCH_INTERVAL
+                    )
+                except (sqlite3.Error, OSError) as e:
+                    # Retried on the next call; embeddings go upstream meanwhile
+                    logging.warning(f"Embedding cache unavailable at {EMBEDDING_CACHE_PATH}: {e}")
+            return OpenAIClient._embedding_cache
     
     # Azure OpenAI Assistants tutorial: https://learn.microsoft.com/en-us/azure/ai-services/openai/how-to/assistant
     def create_assistant(self, name, instructions, model=None):
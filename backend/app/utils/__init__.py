@@ -1 +1,2 @@
 from .utils import format_prompt, run_sql_file, extract_time_geo_granularity, format_cos_sim_results, clean_json_string, validate_and_load_json, extract_granularities, load_json_file
+from .cache import TTLCache
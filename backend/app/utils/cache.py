@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """ Thread-safe LRU cache whose entries also expire ttl seconds after they were stored.
+    Optionally bounded by the total weight (e.g. estimated bytes) of its entries as well as their count """
+    def __init__(self, max_items=1024, ttl=3600, max_weight=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.total_weight = 0
+        self.entries = OrderedDict()  # key -> (expires_at, value, weight)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.stats["misses"] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, weight=1):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, weight)
+            self.total_weight += weight
+            # Evict least recently used entries, but never the one just stored
+            while len(self.entries) > 1 and (len(self.entries) > self.max_items or (self.max_weight is not None and self.total_weight > self.max_weight)):
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            return self._remove(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_weight = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_weight -= entry[2]
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,54 @@
+import ast
+import json
+import logging
+import numpy as np
+
+EMBEDDING_DIM = 1536
+EMBEDDING_DTYPE = np.float32
+
+
+def encode_embedding(embedding):
+    """ float32 bytes of one embedding, for a BYTEA column """
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+def encode_embedding_matrix(matrix):
+    """ float32 bytes of a (rows, dim) matrix, rows concatenated """
+    return np.ascontiguousarray(matrix, dtype=EMBEDDING_DTYPE).tobytes()
+
+def parse_embedding_text(value):
+    """ Parse the legacy text format (JSON or a Python literal) of an embedding or a dict of embeddings """
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return ast.literal_eval(value)
+
+def decode_embedding(value):
+    """ One embedding as a float32 array: zero-copy for BYTEA values, parsed for legacy text and pgvector strings """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=EMBEDDING_DTYPE)
+    if isinstance(value, str):
+        value = parse_embedding_text(value)
+    return np.asarray(value, dtype=EMBEDDING_DTYPE)
+
+def decode_embedding_matrix(value, dim=EMBEDDING_DIM):
+    """ A (rows, dim) float32 matrix from a BYTEA value, without copying """
+    return np.frombuffer(value, dtype=EMBEDDING_DTYPE).reshape(-1, dim)
+
+def parse_column_embeddings(table_name, value, dim=EMBEDDING_DIM):
+    """ Column names and a (columns, dim) float32 matrix from a legacy column -> embedding dict, skipping malformed columns """
+    if isinstance(value, str):
+        value = parse_embedding_text(value)
+    column_names, embeddings = [], []
+    for column_name, embedding in value.items():
+        if isinstance(embedding, (list, np.ndarray)) and len(embedding) == dim:
+            column_names.append(column_name)
+            embeddings.append(embedding)
+        else:
+            logging.warning(f"❌ Skipping column '{column_name}' in dataset '{table_name}': Expected length {dim}, got {len(embedding) if isinstance(embedding, (list, np.ndarray)) else 'Invalid type'}")
+    return column_names, np.asarray(embeddings, dtype=EMBEDDING_DTYPE).reshape(-1, dim)
+
+def decode_column_embeddings(table_name, names, value, dim=EMBEDDING_DIM):
+    """ Column names and matrix of a table, from the binary columns or from the legacy text dict """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return list(names or []), decode_embedding_matrix(value, dim)
+    return parse_column_embeddings(table_name, value, dim)
@@ -0,0 +1,88 @@
+"""
+- ConnectionPool / DatabaseConnection bookkeeping, on a stand-in for psycopg2's ThreadedConnectionPool.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+from backend.app.db import connect_db
+
+
+class FakeConnection:
+    closed = False
+    status = psycopg2.extensions.STATUS_READY
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def execute(self, query, parameters=None):
+        pass
+
+    def close(self):
+        pass
+
+class FakeThreadedPool:
+    """ Hands out FakeConnections; getconn raises once fail_next is set """
+    def __init__(self, *args, **kwargs):
+        self.fail_next = False
+        self.returned = []
+
+    def getconn(self):
+        if self.fail_next:
+            raise psycopg2.OperationalError("server closed the connection")
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(connect_db, "ThreadedConnectionPool", FakeThreadedPool)
+    pool = connect_db.ConnectionPool(minconn=1, maxconn=2, timeout=0.1)
+    monkeypatch.setattr(connect_db, "get_connection_pool", lambda: pool)
+    return pool
+
+def free_slots(pool):
+    count = 0
+    while pool.slots.acquire(blocking=False):
+        count += 1
+    for _ in range(count):
+        pool.slots.release()
+    return count
+
+def test_checkout_and_checkin_are_counted(pool):
+    with connect_db.DatabaseConnection():
+        assert free_slots(pool) == 1
+    assert free_slots(pool) == 2
+    metrics = pool.get_metrics()
+    assert metrics["checkouts"] == 1 and metrics["reconnects"] == 0
+
+def test_exhausted_pool_times_out(pool):
+    with connect_db.DatabaseConnection(), connect_db.DatabaseConnection():
+        with pytest.raises(TimeoutError):
+            pool.checkout()
+    assert pool.get_metrics()["timeouts"] == 1
+
+def test_reset_connection_failure_releases_slot_once(pool):
+    with pytest.raises(psycopg2.OperationalError):
+        with connect_db.DatabaseConnection() as db:
+            pool.pool.fail_next = True
+            db.reset_connection()
+    # The original error surfaces, not BoundedSemaphore's ValueError, and every slot is free again
+    assert free_slots(pool) == 2
+    assert len(pool.pool.returned) == 1 and pool.pool.returned[0][1] is True
@@ -0,0 +1,135 @@
+"""
+- Batching and coalescing of OpenAIClient embeddings calls, against scripts/fake_embeddings_server.py on a local port.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import importlib
+import importlib.util
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("openai")
+pytest.importorskip("instructor")
+tiktoken = pytest.importorskip("tiktoken")
+from werkzeug.serving import make_server
+
+SERVER_PATH = Path(__file__).resolve().parents[2] / "scripts" / "fake_embeddings_server.py"
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    spec = importlib.util.spec_from_file_location("fake_embeddings_server", SERVER_PATH)
+    server_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server_module)
+    server_module.settings.rpm, server_module.settings.tpm, server_module.settings.latency = 100000, 100000000, 0.05
+
+    server = make_server("127.0.0.1", 0, server_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server_module, f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+@pytest.fixture(scope="module")
+def openai_client(fake_server):
+    """ The openai_client module, imported with its embeddings pointed at the fake server and the cache off """
+    _, base_url = fake_server
+    os.environ.update(EMBEDDING_API_BASE_URL=base_url, EMBEDDING_CACHE_ENABLED="false")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+    module = importlib.import_module("backend.app.table_representation.openai_client")
+    # Reload in case another test imported it with different settings
+    return importlib.reload(module)
+
+@pytest.fixture
+def client(openai_client):
+    return openai_client.OpenAIClient()
+
+@pytest.fixture
+def requires_tokenizer():
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        pytest.skip(f"tiktoken cannot load cl100k_base: {e}")
+
+def sent_requests(server_module):
+    return server_module.counters["ok"]
+
+
+def test_batch_is_one_request(fake_server, client, requires_tokenizer):
+    server_module, _ = fake_server
+    texts = [f"dataset {i} about topic {i % 7}" for i in range(100)]
+    before = sent_requests(server_module)
+    embeddings = client.generate_embeddings_batch(texts)
+    assert embeddings == [server_module.fake_embedding(text) for text in texts]
+    assert sent_requests(server_module) - before == 1
+
+def test_batch_respects_item_limit(fake_server, openai_client, client, requires_tokenizer, monkeypatch):
+    server_module, _ = fake_server
+    monkeypatch.setattr(openai_client, "EMBEDDING_BATCH_MAX_ITEMS", 10)
+    texts = [f"table {i}" for i in range(35)]
+    before = sent_requests(server_module)
+    embeddings = client.generate_embeddings_batch(texts)
+    assert embeddings == [server_module.fake_embedding(text) for text in texts]
+    assert sent_requests(server_module) - before == 4
+
+def test_oversized_input_is_truncated(openai_client, client, requires_tokenizer):
+    batches = client.pack_embedding_batches([(0, "word " * 10000), (1, "short")])
+    assert len(batches) == 1
+    batch, batch_tokens = batches[0]
+    assert [idx for idx, _ in batch] == [0, 1]
+    short_tokens = len(openai_client.get_tokenizer(client.embedding_model_default).encode("short"))
+    assert batch_tokens == openai_client.EMBEDDING_INPUT_MAX_TOKENS + short_tokens
+
+def test_pack_uses_model_tokenizer(openai_client, client, requires_tokenizer, monkeypatch):
+    models = []
+    def get_tokenizer(model):
+        models.append(model)
+        return tiktoken.get_encoding("cl100k_base")
+    monkeypatch.setattr(openai_client, "get_tokenizer", get_tokenizer)
+    client.pack_embedding_batches([(0, "a"), (1, "b")], "my-embedding-deployment")
+    assert models == ["my-embedding-deployment"]
+
+def test_single_short_text_skips_tokenizer(openai_client, client, monkeypatch):
+    def get_tokenizer(model):
+        raise AssertionError("a single short text should not be tokenized")
+    monkeypatch.setattr(openai_client, "get_tokenizer", get_tokenizer)
+    assert client.pack_embedding_batches([(3, "population\nby county")]) == [([(3, "population by county")], 20)]
+
+def test_concurrent_calls_are_coalesced(fake_server, client, requires_tokenizer):
+    server_module, _ = fake_server
+    texts = [f"query {i}" for i in range(32)]
+    barrier = threading.Barrier(len(texts))
+    def embed(text):
+        barrier.wait()
+        return client.generate_embeddings(text)
+
+    before = sent_requests(server_module)
+    with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+        embeddings = list(executor.map(embed, texts))
+    assert embeddings == [server_module.fake_embedding(text) for text in texts]
+    assert sent_requests(server_module) - before <= len(texts) // 4
+
+def test_isolated_call_is_sent_alone(fake_server, client):
+    server_module, _ = fake_server
+    before = sent_requests(server_module)
+    assert client.generate_embeddings("a single query") == server_module.fake_embedding("a single query")
+    assert sent_requests(server_module) - before == 1
+
+class BrokenCache:
+    def get(self, model, text):
+        raise sqlite3.OperationalError("database is locked")
+
+    def put(self, model, text, embedding):
+        raise sqlite3.OperationalError("database is locked")
+
+def test_cache_errors_fall_through_to_upstream(fake_server, openai_client, client, monkeypatch):
+    server_module, _ = fake_server
+    monkeypatch.setattr(openai_client, "EMBEDDING_CACHE_ENABLED", True)
+    monkeypatch.setattr(openai_client.OpenAIClient, "_embedding_cache", BrokenCache())
+    assert client.generate_embeddings("cache is down") == server_module.fake_embedding("cache is down")
+    assert client.generate_embeddings_batch(["still down"]) == [server_module.fake_embedding("still down")]
@@ -0,0 +1,50 @@
+"""
+- EmbeddingCache on a temporary SQLite file.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import sqlite3
+import pytest
+
+pytest.importorskip("numpy")
+from backend.app.table_representation.embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+def last_access(cache, model, text):
+    return cache.conn.execute("SELECT last_access FROM embeddings WHERE key = ?", (embedding_cache_key(model, text),)).fetchone()[0]
+
+def test_round_trip_through_disk(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    EmbeddingCache(str(path)).put("model", "text", [0.5, 0.25])
+    cache = EmbeddingCache(str(path))
+    assert cache.get("model", "text") == [0.5, 0.25]
+    assert cache.get("model", "other") is None
+    assert cache.get_stats()["disk_hits"] == 1
+
+def test_disk_hits_refresh_last_access_once_per_interval(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    EmbeddingCache(str(path)).put("model", "text", [1.0])
+
+    cache = EmbeddingCache(str(path), touch_interval=600)
+    written = last_access(cache, "model", "text")
+    assert cache.get("model", "text") == [1.0]
+    assert last_access(cache, "model", "text") == written
+
+    stale = written - 601
+    cache.conn.execute("UPDATE embeddings SET last_access = ?", (stale,))
+    cache.memory.clear()
+    assert cache.get("model", "text") == [1.0]
+    assert last_access(cache, "model", "text") > stale
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_disk_bytes=40)
+    for i in range(5):
+        cache.put("model", f"text {i}", [float(i)] * 4)
+    assert cache.get_stats()["disk_bytes"] <= 40
+    assert cache.conn.execute("SELECT COUNT(*) FROM embeddings WHERE key = ?", (embedding_cache_key("model", "text 0"),)).fetchone()[0] == 0
+
+def test_errors_are_sqlite_errors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    cache.conn.close()
+    with pytest.raises(sqlite3.Error):
+        cache.get("model", "text")
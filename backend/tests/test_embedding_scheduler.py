@@ -0,0 +1,109 @@
+"""
+- Retries, throttling and ordering of EmbeddingScheduler, against scripts/fake_embeddings_server.py on a local port.
+- The server's rate limit window is shortened to 1 second so the Retry-After waits stay short.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import importlib.util
+import random
+import threading
+import time
+from pathlib import Path
+import pytest
+
+pytest.importorskip("flask")
+openai = pytest.importorskip("openai")
+httpx = pytest.importorskip("httpx")
+from werkzeug.serving import make_server
+from backend.app.table_representation import embedding_scheduler
+from backend.app.table_representation.embedding_scheduler import EmbeddingScheduler, TokenBucket, retry_delay
+
+SERVER_PATH = Path(__file__).resolve().parents[2] / "scripts" / "fake_embeddings_server.py"
+
+
+@pytest.fixture
+def fake_server():
+    """ A fresh server module per test, so each test sets its own limits and starts from zero counters """
+    spec = importlib.util.spec_from_file_location("fake_embeddings_server", SERVER_PATH)
+    server_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server_module)
+    server_module.WINDOW_SECONDS = 1
+    server_module.settings.rpm, server_module.settings.tpm, server_module.settings.latency = 100000, 100000000, 0.02
+
+    server = make_server("127.0.0.1", 0, server_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server_module, openai.OpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="test")
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(embedding_scheduler, "EMBEDDING_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(embedding_scheduler, "EMBEDDING_RETRY_MAX_DELAY", 0.1)
+
+def make_batches(num_batches):
+    """ Batches of varying size, so they finish out of order """
+    batches = []
+    for i in range(num_batches):
+        texts = [f"batch {i} text {j}" for j in range(1 + i % 5)]
+        batches.append((texts, 5 * len(texts)))
+    return batches
+
+def expected(server_module, batches):
+    return [[server_module.fake_embedding(text) for text in texts] for texts, _ in batches]
+
+
+def test_results_keep_batch_order(fake_server):
+    server_module, client = fake_server
+    server_module.settings.latency = 0.1
+    batches = make_batches(40)
+    scheduler = EmbeddingScheduler(client, max_workers=8)
+    assert scheduler.embed(batches, "text-embedding-3-small") == expected(server_module, batches)
+    assert scheduler.get_stats()["requests"] == len(batches)
+
+def test_throttled_requests_wait_for_retry_after(fake_server):
+    server_module, client = fake_server
+    server_module.settings.rpm = 60  # 10 requests per 1 second window
+    batches = make_batches(30)
+    scheduler = EmbeddingScheduler(client, max_workers=8, max_retries=10)
+
+    start = time.monotonic()
+    assert scheduler.embed(batches, "text-embedding-3-small") == expected(server_module, batches)
+    # 30 requests at 10 per window span at least two window boundaries
+    assert time.monotonic() - start >= 2 * server_module.WINDOW_SECONDS * 0.9
+    assert server_module.counters["throttled"] > 0
+    assert scheduler.get_stats()["retries"] == server_module.counters["throttled"]
+    assert scheduler.get_stats()["failed_batches"] == 0
+
+def test_retry_delay_honours_retry_after():
+    response = httpx.Response(429, headers={"retry-after": "2.5"}, request=httpx.Request("POST", "http://test/v1/embeddings"))
+    error = openai.RateLimitError("Rate limit exceeded", response=response, body=None)
+    assert all(retry_delay(error, attempt) >= 2.5 for attempt in range(5))
+
+def test_server_errors_are_retried(fake_server):
+    server_module, client = fake_server
+    server_module.settings.error_rate = 0.3
+    random.seed(0)
+    batches = make_batches(40)
+    scheduler = EmbeddingScheduler(client, max_workers=8, max_retries=10)
+    assert scheduler.embed(batches, "text-embedding-3-small") == expected(server_module, batches)
+    assert server_module.counters["errors"] > 0
+    assert scheduler.get_stats()["retries"] == server_module.counters["errors"]
+
+def test_batch_is_none_after_max_retries(fake_server):
+    server_module, client = fake_server
+    server_module.settings.error_rate = 1.0
+    batches = make_batches(4)
+    scheduler = EmbeddingScheduler(client, max_workers=4, max_retries=2)
+    assert scheduler.embed(batches, "text-embedding-3-small") == [None] * len(batches)
+    assert server_module.counters["errors"] == len(batches) * 3
+    assert scheduler.get_stats()["failed_batches"] == len(batches)
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(600, capacity=1)  # 10 per second
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.45
+    # More than the capacity waits for a full bucket instead of forever
+    bucket.acquire(5)
@@ -0,0 +1,83 @@
+"""
+- Fusion of per-probe HySE results in aggregate_hyse_search_results.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import os
+import random
+import pytest
+
+for module in ("numpy", "pandas", "hnswlib", "psycopg2", "openai", "instructor", "tiktoken"):
+    pytest.importorskip(module)
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+from backend.app.hyse.hypo_schema_search import aggregate_hyse_search_results
+
+
+def hit(table_name, cosine_similarity, database_name="db"):
+    return {"table_name": table_name, "database_name": database_name, "cosine_similarity": cosine_similarity}
+
+def flat_mean(results):
+    """ The per-result average the score matrix replaced: every hit of a table counts once """
+    hits = {}
+    for probe_results in results:
+        for result in probe_results:
+            hits.setdefault(result["table_name"], []).append(result["cosine_similarity"])
+    return {table_name: sum(scores) / len(scores) for table_name, scores in hits.items()}
+
+def test_duplicate_hits_in_one_probe_are_averaged():
+    results = [[hit("a", 0.9), hit("a", 0.5), hit("b", 0.8)], [hit("b", 0.6)]]
+    fused = {row["table_name"]: row for row in aggregate_hyse_search_results(results, fusion="mean")}
+    assert fused["a"]["cosine_similarity"] == pytest.approx(0.7)
+    assert fused["b"]["cosine_similarity"] == pytest.approx(0.7)
+    fused = {row["table_name"]: row for row in aggregate_hyse_search_results(results, fusion="max")}
+    assert fused["a"]["fused_score"] == pytest.approx(0.7)
+    assert fused["b"]["fused_score"] == pytest.approx(0.8)
+
+def test_mean_matches_flat_average():
+    rng = random.Random(0)
+    tables = [f"table_{i}" for i in range(30)]
+    results = [[hit(rng.choice(tables), rng.random()) for _ in range(40)] for _ in range(4)]
+    expected = flat_mean(results)
+    fused = aggregate_hyse_search_results(results, fusion="mean")
+    assert {row["table_name"]: row["cosine_similarity"] for row in fused} == pytest.approx(expected)
+    assert [row["table_name"] for row in fused] == sorted(expected, key=lambda table_name: -expected[table_name])
+
+def test_blocked_databases_and_k():
+    results = [[hit("a", 0.9, "Coffee sales"), hit("b", 0.8), hit("c", 0.7)]]
+    assert [row["table_name"] for row in aggregate_hyse_search_results(results, k=1)] == ["b"]
+    assert aggregate_hyse_search_results([[], []]) == []
+
+
+class FakeDatabaseConnection:
+    """ Answers the metadata query with one row per requested table but "missing", and records the requests """
+    queried = []
+
+    def __enter__(self):
+        self.cursor = self
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, query, parameters):
+        self.table_names = parameters[0]
+        FakeDatabaseConnection.queried.append(list(self.table_names))
+
+    def fetchall(self):
+        return [{"table_name": name, "db_description": f"about {name}"} for name in self.table_names if name != "missing"]
+
+def test_hydrate_results_only_queries_new_tables(monkeypatch):
+    from backend.app.hyse import hypo_schema_search
+    monkeypatch.setattr(hypo_schema_search, "DatabaseConnection", FakeDatabaseConnection)
+    FakeDatabaseConnection.queried = []
+    metadata_cache = {}
+
+    first = hypo_schema_search.hydrate_results([hit("a", 0.9), hit("missing", 0.8)], metadata_cache=metadata_cache)
+    second = hypo_schema_search.hydrate_results([hit("b", 0.95), hit("a", 0.7), hit("missing", 0.6)], metadata_cache=metadata_cache)
+    assert FakeDatabaseConnection.queried == [["a", "missing"], ["b"]]
+    assert [row["db_description"] for row in first[:1] + second[:2]] == ["about a", "about b", "about a"]
+    assert second[1]["cosine_similarity"] == 0.7 and "db_description" not in second[2]
+
+    hypo_schema_search.hydrate_results([hit("a", 0.5), hit("b", 0.4)], metadata_cache=metadata_cache)
+    assert len(FakeDatabaseConnection.queried) == 2
@@ -0,0 +1,83 @@
+"""
+- Metadata filter queries of db/metadata_query.py: SELECT DISTINCT until table_name is the primary key.
+- The EXPLAIN tests need the migrated metadata table (python -m backend.app.db.migrate_metadata_table) and the
+  EVAL_DB_NAME / DB_* variables of connect_db.py; they skip without them.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import os
+import pytest
+
+pytest.importorskip("psycopg2")
+from backend.app.db import metadata_query
+from backend.app.db.metadata_query import METADATA_TABLE, build_metadata_query, is_table_name_unique
+
+COLUMN_TYPES = {"table_name": "text", "popularity": "integer", "tags": "ARRAY", "comb_embed": "USER-DEFINED"}
+
+
+class FakeCursor:
+    """ Answers the primary key query with the given key columns and counts the queries """
+    def __init__(self, key_columns):
+        self.key_columns = key_columns
+        self.queries = 0
+
+    def execute(self, query, parameters=None):
+        self.queries += 1
+
+    def fetchone(self):
+        return {"key_columns": self.key_columns}
+
+class FakeDatabase:
+    def __init__(self, key_columns):
+        self.cursor = FakeCursor(key_columns)
+
+
+@pytest.fixture(autouse=True)
+def clear_primary_key_cache():
+    metadata_query.primary_key_cache.clear()
+    yield
+    metadata_query.primary_key_cache.clear()
+
+@pytest.mark.parametrize("key_columns, unique", [
+    (["table_name"], True),
+    (None, False),  # no primary key
+    (["id"], False),
+    (["table_name", "source_row"], False),
+])
+def test_is_table_name_unique(key_columns, unique):
+    db = FakeDatabase(key_columns)
+    assert is_table_name_unique(db, "metadata") is unique
+    assert is_table_name_unique(db, "metadata") is unique
+    assert db.cursor.queries == 1
+
+def test_distinct_until_primary_key():
+    distinct_query, _, _ = build_metadata_query(COLUMN_TYPES, [], ["a"])
+    plain_query, _, _ = build_metadata_query(COLUMN_TYPES, [], ["a"], distinct=False)
+    assert "SELECT DISTINCT" in repr(distinct_query)
+    assert "SELECT DISTINCT" not in repr(plain_query)
+
+def test_distinct_orders_by_selected_columns_only():
+    query, _, _ = build_metadata_query(COLUMN_TYPES, [], None, columns=["table_name"], ordering=[("popularity", "DESC")])
+    assert "ORDER BY" not in repr(query)
+    query, _, _ = build_metadata_query(COLUMN_TYPES, [], None, columns=["table_name"], ordering=[("popularity", "DESC")], distinct=False)
+    assert "ORDER BY" in repr(query)
+
+
+@pytest.fixture(scope="module")
+def db():
+    if not (os.getenv("EVAL_DB_NAME") and os.getenv("DB_HOST")):
+        pytest.skip("EVAL_DB_NAME / DB_HOST not set")
+    from backend.app.db.connect_db import DatabaseConnection
+    with DatabaseConnection() as db:
+        yield db
+
+def test_metadata_table_has_primary_key(db):
+    assert is_table_name_unique(db, METADATA_TABLE)
+
+@pytest.mark.parametrize("column", ["tags", "keywords", "time_granu", "geo_granu", "col_num", "row_num", "popularity",
+                                    "usability_rating", "file_size_in_byte"])
+def test_filter_uses_index(db, column):
+    from backend.app.db.migrate_metadata_table import CHECK_CLAUSES, explain_index_usage
+    if column not in metadata_query.get_column_types(db, METADATA_TABLE):
+        pytest.skip(f"{METADATA_TABLE} has no {column} column")
+    assert explain_index_usage(db, METADATA_TABLE, column, CHECK_CLAUSES[column])
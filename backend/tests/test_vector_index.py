@@ -0,0 +1,81 @@
+"""
+- Loading and sharing of in-process vector indexes in hyse/vector_index.py, with VectorIndex.load stubbed out.
+- Run from the repository root: python -m pytest backend/tests
+"""
+
+import threading
+import time
+import pytest
+
+for module in ("numpy", "hnswlib", "psycopg2"):
+    pytest.importorskip(module)
+from backend.app.hyse import vector_index
+from backend.app.hyse.vector_index import VectorIndex, get_vector_index
+
+
+@pytest.fixture(autouse=True)
+def index_registry(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_ENABLED", True)
+    registries = (vector_index._vector_indexes, vector_index._vector_index_failures, vector_index._vector_index_locks)
+    for registry in registries:
+        registry.clear()
+    yield
+    for registry in registries:
+        registry.clear()
+
+def stub_load(monkeypatch, load):
+    loads = []
+    def counted_load(self):
+        loads.append((self.table_name, self.column_name, tuple(self.label_columns)))
+        load(self)
+    monkeypatch.setattr(VectorIndex, "load", counted_load)
+    return loads
+
+def succeed(index):
+    index.matrix = object()
+
+def fail(index):
+    raise ValueError("relation does not exist")
+
+
+def test_index_is_shared(monkeypatch):
+    loads = stub_load(monkeypatch, succeed)
+    index = get_vector_index("embeddings", "embedding")
+    assert get_vector_index("embeddings", "embedding") is index
+    assert len(loads) == 1
+
+def test_label_columns_are_part_of_the_key(monkeypatch):
+    loads = stub_load(monkeypatch, succeed)
+    by_table = get_vector_index("embeddings", "embedding")
+    by_column = get_vector_index("embeddings", "embedding", ("table_name", "column_name"))
+    assert by_table is not by_column
+    assert by_column.label_columns == ["table_name", "column_name"]
+    assert len(loads) == 2
+
+def test_failed_load_is_remembered(monkeypatch):
+    loads = stub_load(monkeypatch, fail)
+    assert get_vector_index("missing", "embedding") is None
+    assert get_vector_index("missing", "embedding") is None
+    assert len(loads) == 1
+
+    # Retried once the failure is older than VECTOR_INDEX_RETRY_SECONDS
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_RETRY_SECONDS", 0)
+    assert get_vector_index("missing", "embedding") is None
+    assert len(loads) == 2
+
+def test_slow_load_does_not_block_other_indexes(monkeypatch):
+    release = threading.Event()
+    def load(index):
+        if index.table_name == "slow":
+            release.wait(timeout=5)
+        succeed(index)
+    stub_load(monkeypatch, load)
+
+    slow = threading.Thread(target=get_vector_index, args=("slow", "embedding"))
+    slow.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert get_vector_index("fast", "embedding") is not None
+    assert time.monotonic() - start < 1
+    release.set()
+    slow.join()
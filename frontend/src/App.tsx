@@ -17,6 +17,7 @@ export interface MetadataFilter {
 function App() {
   const [chatOpen, setChatOpen] = useState(true);
   const [results, setResults] = useState<ResultProp[]>([]);
+  const [searchId, setSearchId] = useState<string | null>(null); // backend id of the current results, if registered
   const [showLanding, setShowLanding] = useState(true);
   const [currentPage, setCurrentPage] = useState(1);
   const [task, setTask] = useState<string>("");
@@ -26,6 +27,14 @@ function App() {
   const [settingsGenerate, setSettingsGenerate] = useState(false);
   const [taskRec, setTaskRec] = useState<[string, string, string[]][]>([]);
   const [filters, setFilters] = useState<MetadataFilter[]>([]);
+  // results and their search_id always change together
+  const updateResults = (
+    newResults: ResultProp[],
+    newSearchId: string | null = null
+  ) => {
+    setResults(newResults);
+    setSearchId(newSearchId);
+  };
   // prevent back refresh
 
   return showLanding ? (
@@ -33,7 +42,7 @@ function App() {
       task={task}
       setTask={setTask}
       results={results}
-      setResults={setResults}
+      setResults={updateResults}
       settingsSpecificity={settingsSpecificity}
       setSettingsSpecificity={setSettingsSpecificity}
       settingsGoal={settingsGoal}
@@ -52,7 +61,8 @@ function App() {
         chatOpen={chatOpen}
         setChatOpen={setChatOpen}
         results={results}
-        setResults={setResults}
+        setResults={updateResults}
+        searchId={searchId}
         currentPage={currentPage}
         setCurrentPage={setCurrentPage}
         task={task}
@@ -72,6 +82,7 @@ function App() {
       />
       <ResultsTable
         results={results}
+        searchId={searchId}
         open={chatOpen}
         onResetSearch={async () => {}}
         currentPage={currentPage}
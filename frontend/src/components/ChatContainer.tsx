@@ -7,8 +7,9 @@ import { MetadataFilter } from "../App";
 interface ChatContainerProps {
   chatOpen: boolean;
   setChatOpen: React.Dispatch<React.SetStateAction<boolean>>;
-  setResults: (a: ResultProp[]) => unknown;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   results: ResultProp[];
+  searchId: string | null;
   currentPage: number;
   setCurrentPage: React.Dispatch<React.SetStateAction<number>>;
   task: string;
@@ -31,6 +32,7 @@ const ChatContainer: React.FC<ChatContainerProps> = ({
   chatOpen,
   setResults,
   results,
+  searchId,
   currentPage,
   setCurrentPage,
   task,
@@ -65,6 +67,7 @@ const ChatContainer: React.FC<ChatContainerProps> = ({
             setPendingFilter={setPendingFilter}
             results={results}
             setResults={setResults}
+            searchId={searchId}
             currentPage={currentPage}
             setCurrentPage={setCurrentPage}
             settingsGenerate={settingsGenerate}
@@ -1,6 +1,7 @@
 import { useState, useEffect } from "react";
 import "../styles/FilterPrompt.css";
 import axios from "axios";
+import { postWithResults } from "../resultSession";
 //@ts-expect-error react-csv table unsupported by react18
 import { CsvToHtmlTable } from "react-csv-to-table";
 import { ResultProp } from "./ResultsTable";
@@ -11,7 +12,8 @@ interface FilterPromptProps {
   onSubmit: (filter: string) => void;
   activeFilters: string[];
   results: ResultProp[];
-  setResults: (a: ResultProp[]) => unknown;
+  searchId: string | null;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   setFilters: React.Dispatch<React.SetStateAction<MetadataFilter[]>>;
   setIconVisibility: React.Dispatch<React.SetStateAction<boolean[]>>;
 }
@@ -22,6 +24,7 @@ const FilterPrompt: React.FC<FilterPromptProps> = ({
   onSubmit,
   activeFilters,
   results,
+  searchId,
   setResults,
   setFilters,
   setIconVisibility,
@@ -66,18 +69,19 @@ const FilterPrompt: React.FC<FilterPromptProps> = ({
     console.log(results);
     if (selectedFilter) {
       try {
-        const fetchResponse = await axios.post(
+        const fetchResponse = await postWithResults(
           "http://127.0.0.1:5000/api/manual_metadata",
           {
             selectedFilter: selectedFilter.name,
             selectedOperation: selectedOperation,
             value: inputValue,
-            results: results,
-          }
+          },
+          results,
+          searchId
         );
         console.log(fetchResponse.data);
 
-        setResults(fetchResponse.data.results);
+        setResults(fetchResponse.data.results, fetchResponse.data.search_id);
       } catch (error) {
         console.error("Error fetching data:", error);
       }
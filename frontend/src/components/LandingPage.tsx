@@ -19,7 +19,7 @@ interface LandingPageProps {
   settingsGenerate: boolean;
   setSettingsGenerate: React.Dispatch<React.SetStateAction<boolean>>;
   results: ResultProp[];
-  setResults: (a: ResultProp[]) => unknown;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   setTaskRec: React.Dispatch<React.SetStateAction<[string, string, string[]][]>>;
   taskRec: [string, string, string[]][];
 }
@@ -56,7 +56,10 @@ const LandingPage: React.FC<LandingPageProps> = ({
         }
       );
       console.log("FETCHED DATA FROM HYSE:", searchResponse);
-      setResults(searchResponse.data.complete_results);
+      setResults(
+        searchResponse.data.complete_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching data:", error);
     }
@@ -3,6 +3,7 @@ import "../styles/MessageItem.css";
 import React from "react";
 import { useState } from "react";
 import { ResultProp } from "./ResultsTable";
+import { postWithResults } from "../resultSession";
 
 interface SettingsProps {
   settingsSpecificity: string;
@@ -17,7 +18,7 @@ interface SettingsProps {
   setTaskRec: React.Dispatch<
     React.SetStateAction<[string, string, string[]][]>
   >;
-  setResults: (a: ResultProp[]) => unknown;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   setTask: React.Dispatch<React.SetStateAction<string>>;
   taskRec: [string, string, string[]][];
 }
@@ -84,18 +85,25 @@ const Settings = ({
     setSettingsDomain(e.target.value);
   };
 
-  const fetchTaskSuggestions = async (results: ResultProp[]) => {
+  const fetchTaskSuggestions = async (
+    results: ResultProp[],
+    searchId: string | null
+  ) => {
     console.log("FETCH TASK SUGGESTIONS");
     const taskSuggestionsURL =
       "http://127.0.0.1:5000/api/task_semantic_suggestion";
     console.log(settingsSpecificity);
     console.log(settingsGoal);
     console.log(settingsDomain);
-    const searchResponse = await axios.post(taskSuggestionsURL, {
-      results: results,
-      goal: settingsGoal,
-      task: settingsDomain,
-    });
+    const searchResponse = await postWithResults(
+      taskSuggestionsURL,
+      {
+        goal: settingsGoal,
+        task: settingsDomain,
+      },
+      results,
+      searchId
+    );
     console.log("TASK REC", searchResponse.data);
     console.log(searchResponse.data.consolidated_results);
     const querySuggestions = searchResponse.data.consolidated_results;
@@ -140,8 +148,14 @@ const Settings = ({
       );
       console.log("FETCHED DATA FROM HYSE:", searchResponse);
       console.log("SETTING RESULTS");
-      setResults(searchResponse.data.complete_results);
-      fetchTaskSuggestions(searchResponse.data.complete_results);
+      setResults(
+        searchResponse.data.complete_results,
+        searchResponse.data.search_id
+      );
+      fetchTaskSuggestions(
+        searchResponse.data.complete_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching data:", error);
     }
@@ -10,6 +10,7 @@ import TuneIcon from "@mui/icons-material/Tune";
 import { X } from "lucide-react";
 import FilterPrompt from "./FilterPrompt";
 import axios from "axios";
+import { postWithResults } from "../resultSession";
 import { ResultProp } from "./ResultsTable";
 import "../styles/MessageItem.css";
 import { MetadataFilter } from "../App";
@@ -28,7 +29,8 @@ interface QueryBlocksProps {
   currentPage: number;
   setCurrentPage: React.Dispatch<React.SetStateAction<number>>;
   results: ResultProp[];
-  setResults: (a: ResultProp[]) => unknown;
+  searchId: string | null;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   settingsGenerate: boolean;
   setSettingsGenerate: React.Dispatch<React.SetStateAction<boolean>>;
   setTaskRec: React.Dispatch<
@@ -45,6 +47,7 @@ const QueryBlocks = ({
   iconVisibility,
   setIconVisibility,
   results,
+  searchId,
   setResults,
   settingsGenerate,
   setSettingsGenerate,
@@ -62,6 +65,7 @@ const QueryBlocks = ({
   const [datasetCount, setDatasetCount] = useState<number>(results.length);
   const [savedDatasets, setSavedDatasets] = useState<string[][]>([]); //current copy of dataset
   const [initialResults, setInitialResults] = useState<ResultProp[]>([]); //original  copy of all dataset results
+  const [initialSearchId, setInitialSearchId] = useState<string | null>(null); // search_id of initialResults
   const [activeColumns, setActiveColumns] = useState<string[]>([]); // to keep track of active knn columns
   const [colsToRemove, setColsToRemove] = useState<MetadataFilter[]>([]); // to keep track of which cols needed to delete
   const [shouldProcess, setShouldProcess] = useState(false); // for the dataset check list toggling
@@ -107,16 +111,23 @@ const QueryBlocks = ({
     console.log(filteredSavedDatasets);
     const colFilteredURL = "http://127.0.0.1:5000/api/remove_metadata_update";
     try {
-      const searchResponse = await axios.post(colFilteredURL, {
-        filters: normalFilters,
-        results: initialResults,
-        uniqueDatasets: filteredSavedDatasets,
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          filters: normalFilters,
+          uniqueDatasets: filteredSavedDatasets,
+        },
+        initialResults,
+        initialSearchId
+      );
       console.log("ADD SEARCH DATSETS", searchResponse.data);
 
       // Update datasetCount based on the filtered results
       setDatasetCount(searchResponse.data.filtered_results.length);
-      setResults(searchResponse.data.filtered_results);
+      setResults(
+        searchResponse.data.filtered_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching filtered datasets:", error);
     }
@@ -186,16 +197,23 @@ const QueryBlocks = ({
     // Step 5: Send request to backend to update results
     const colFilteredURL = "http://127.0.0.1:5000/api/remove_metadata_update";
     try {
-      const searchResponse = await axios.post(colFilteredURL, {
-        filters: normalFilters,
-        results: initialResults,
-        uniqueDatasets: uniqueDatasets,
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          filters: normalFilters,
+          uniqueDatasets: uniqueDatasets,
+        },
+        initialResults,
+        initialSearchId
+      );
       console.log("ADD SEARCH DATASETS", searchResponse.data);
 
       // Update datasetCount based on the filtered results
       setDatasetCount(searchResponse.data.filtered_results.length);
-      setResults(searchResponse.data.filtered_results);
+      setResults(
+        searchResponse.data.filtered_results,
+        searchResponse.data.search_id
+      );
 
       // Return the unique datasets for further processing if needed
       return uniqueDatasets;
@@ -258,16 +276,23 @@ const QueryBlocks = ({
 
     const colFilteredURL = "http://127.0.0.1:5000/api/remove_metadata_update";
     try {
-      const searchResponse = await axios.post(colFilteredURL, {
-        filters: normalFilters,
-        results: initialResults,
-        uniqueDatasets: filteredSavedDatasets,
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          filters: normalFilters,
+          uniqueDatasets: filteredSavedDatasets,
+        },
+        initialResults,
+        initialSearchId
+      );
       console.log("REMOVE SEARCH DATSETS", searchResponse.data);
 
       // Update datasetCount based on the filtered results
       setDatasetCount(searchResponse.data.filtered_results.length);
-      setResults(searchResponse.data.filtered_results);
+      setResults(
+        searchResponse.data.filtered_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching filtered datasets:", error);
     }
@@ -368,11 +393,15 @@ const QueryBlocks = ({
       console.log("GENERATE TASK REC");
       console.log("TASK", task);
       console.log("RESULTS", results);
-      const searchResponse = await axios.post(taskSuggestionsURL, {
-        task: task,
-        results: results,
-        goal: ""
-      });
+      const searchResponse = await postWithResults(
+        taskSuggestionsURL,
+        {
+          task: task,
+          goal: "",
+        },
+        results,
+        searchId
+      );
       console.log("TASK REC", searchResponse.data);
       console.log(searchResponse.data.consolidated_results);
       const querySuggestions = searchResponse.data.consolidated_results;
@@ -408,10 +437,12 @@ const QueryBlocks = ({
       const colSuggestionsURL =
         "http://127.0.0.1:5000/api/suggest_relevant_cols";
       console.log("SENDING COL SUGGESTION API for", task);
-      const searchResponse = await axios.post(colSuggestionsURL, {
-        task: task,
-        results: results,
-      });
+      const searchResponse = await postWithResults(
+        colSuggestionsURL,
+        { task: task },
+        results,
+        searchId
+      );
       console.log("GENERATE COL REC", searchResponse.data);
 
       console.log("setcolrec for generatecolrec");
@@ -489,11 +520,15 @@ const QueryBlocks = ({
     const colFilteredURL = "http://127.0.0.1:5000/api/and_dataset_filter";
     try {
       // include only results that appear in uniqueDatasets
-      const searchResponse = await axios.post(colFilteredURL, {
-        task: task,
-        results: results,
-        uniqueDatasets: uniqueDatasets,
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          task: task,
+          uniqueDatasets: uniqueDatasets,
+        },
+        results,
+        searchId
+      );
       console.log(searchResponse.data);
 
       // Update datasetCount based on the filtered results
@@ -556,13 +591,20 @@ const QueryBlocks = ({
       const colFilteredURL = "http://127.0.0.1:5000/api/and_dataset_filter";
       console.log("SENDING AND COLUMNS API");
 
-      const searchResponse = await axios.post(colFilteredURL, {
-        task: task,
-        results: results,
-        uniqueDatasets: uniqueDatasets,
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          task: task,
+          uniqueDatasets: uniqueDatasets,
+        },
+        results,
+        searchId
+      );
       console.log(searchResponse.data);
-      setResults(searchResponse.data.filtered_results);
+      setResults(
+        searchResponse.data.filtered_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       if (error instanceof Error) {
         console.error("Error updating filtered datasets:", error.message);
@@ -584,7 +626,10 @@ const QueryBlocks = ({
       );
       console.log("FETCHED DATA FROM HYSE:", searchResponse);
 
-      setResults(searchResponse.data.complete_results);
+      setResults(
+        searchResponse.data.complete_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching data:", error);
     }
@@ -676,6 +721,7 @@ const QueryBlocks = ({
       if (!hasInitialized.current && results.length > 0) {
         hasInitialized.current = true; // Mark as executed
         setInitialResults(results); // keep copy of original results
+        setInitialSearchId(searchId);
         console.log("NEW COL REC");
         await generateTaskRec(task);
         await generateColRec(task); // Wait for generateColRec to complete
@@ -685,6 +731,7 @@ const QueryBlocks = ({
         console.log("NEW TASK invalidate nonexisting knn");
         console.log("RESET INITAL RESULTS");
         setInitialResults(results);
+        setInitialSearchId(searchId);
         await generateTaskRec(task); // Wait for generateTaskRec to complete
         await generateColRec(task); // Wait for generateColRec to complete
 
@@ -722,17 +769,18 @@ const QueryBlocks = ({
     if (!hnswColumn) return;
 
     try {
-      const fetchResponse = await axios.post(
+      const fetchResponse = await postWithResults(
         "http://127.0.0.1:5000/api/manual_metadata",
         {
           selectedFilter: "column_specification",
           selectedOperation: "is",
           value: hnswColumn,
-          results: results,
-        }
+        },
+        results,
+        searchId
       );
       console.log(fetchResponse.data);
-      setResults(fetchResponse.data.results);
+      setResults(fetchResponse.data.results, fetchResponse.data.search_id);
     } catch (error) {
       console.error("Error fetching data:", error);
     }
@@ -1047,6 +1095,7 @@ const QueryBlocks = ({
 
           <GranularityFilter
             results={results}
+            searchId={searchId}
             setFilters={setFilters}
             setIconVisibility={setIconVisibility}
             filters={filters}
@@ -1059,6 +1108,7 @@ const QueryBlocks = ({
           onSubmit={() => {}} // Handle new filter submission
           activeFilters={activeFilters}
           results={results}
+          searchId={searchId}
           setResults={setResults}
           setFilters={setFilters}
           setIconVisibility={setIconVisibility}
@@ -1075,7 +1125,7 @@ interface TaskSuggestionBlockProps {
   reason: string;
   setTask: (task: string) => void;
   setNewTask: React.Dispatch<React.SetStateAction<boolean>>;
-  setResults: (a: ResultProp[]) => unknown;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
   cluster: string[];
   results: ResultProp[];
 }
@@ -1186,14 +1236,16 @@ type SelectedGranularities = {
 
 interface GranularityFilterProps {
   results: ResultProp[];
+  searchId: string | null;
   setFilters: React.Dispatch<React.SetStateAction<MetadataFilter[]>>;
   setIconVisibility: React.Dispatch<React.SetStateAction<boolean[]>>;
   filters: MetadataFilter[];
-  setResults: (a: ResultProp[]) => unknown;
+  setResults: (a: ResultProp[], searchId?: string | null) => unknown;
 }
 
 const GranularityFilter = ({
   results,
+  searchId,
   setFilters,
   setIconVisibility,
   filters,
@@ -1264,14 +1316,21 @@ const GranularityFilter = ({
 
     const colFilteredURL = "http://127.0.0.1:5000/api/remove_metadata_update";
     try {
-      const searchResponse = await axios.post(colFilteredURL, {
-        filters: normalFilters,
-        results: results,
-        uniqueDatasets: [],
-      });
+      const searchResponse = await postWithResults(
+        colFilteredURL,
+        {
+          filters: normalFilters,
+          uniqueDatasets: [],
+        },
+        results,
+        searchId
+      );
       console.log("ADD SEARCH DATSETS", searchResponse.data);
 
-      setResults(searchResponse.data.filtered_results);
+      setResults(
+        searchResponse.data.filtered_results,
+        searchResponse.data.search_id
+      );
     } catch (error) {
       console.error("Error fetching filtered datasets:", error);
     }
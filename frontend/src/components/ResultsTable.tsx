@@ -7,8 +7,8 @@ import AutoAwesomeIcon from "@mui/icons-material/AutoAwesome";
 import ReactMarkdown from "react-markdown";
 import Tippy from "@tippyjs/react";
 import "tippy.js/dist/tippy.css";
-import axios from "axios";
 import { MetadataFilter } from "../App";
+import { postWithResults } from "../resultSession";
 
 // CUSTOMIZE RESULTPROP DEPENDING ON DATABASE
 export type ResultProp = {
@@ -39,6 +39,7 @@ export type ResultProp = {
 };
 export interface ResultsTableProps {
   results: ResultProp[];
+  searchId: string | null;
   open: boolean;
   onResetSearch: () => Promise<void>;
   currentPage: number;
@@ -59,6 +60,7 @@ interface ResultPreviewProps {
 
 const ResultsTable: React.FC<ResultsTableProps> = ({
   results,
+  searchId,
   currentPage,
   task,
   filters,
@@ -463,12 +465,16 @@ const ResultsTable: React.FC<ResultsTableProps> = ({
   const generateRelevance = async (index: number) => {
     const relevanceURL = "http://127.0.0.1:5000/api/relevance_map";
     try {
-      const searchResponse = await axios.post(relevanceURL, {
-        index: index,
-        results: results,
-        task: task,
-        filters: filters,
-      });
+      const searchResponse = await postWithResults(
+        relevanceURL,
+        {
+          index: index,
+          task: task,
+          filters: filters,
+        },
+        results,
+        searchId
+      );
 
       // Update relevanceMap for the specific index
       setRelevanceMap((prev) =>
@@ -0,0 +1,22 @@
+import axios from "axios";
+import { ResultProp } from "./components/ResultsTable";
+
+// Follow-up endpoints take the search_id of the result set the backend registered instead of the results.
+// Results filtered in the browser have no search_id and expired ones answer 404: both post the results instead.
+export const postWithResults = async (
+  url: string,
+  body: object,
+  results: ResultProp[],
+  searchId: string | null
+) => {
+  if (searchId) {
+    try {
+      return await axios.post(url, { ...body, search_id: searchId });
+    } catch (error) {
+      if (!axios.isAxiosError(error) || error.response?.status !== 404) {
+        throw error;
+      }
+    }
+  }
+  return axios.post(url, { ...body, results: results });
+};
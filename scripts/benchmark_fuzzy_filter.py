@@ -0,0 +1,74 @@
+"""
+- Benchmarks the fuzzy text filter used by `/api/manual_metadata` and `/api/remove_metadata_update`.
+- The baseline is the previous per-row loop: `fuzz.partial_ratio` for every search term x every word of every row.
+- The indexed version scores every search term once against the distinct words of the field (`FuzzyTextIndex`).
+- "cold" builds the index on every request, "warm" reuses the index cached on the result session (term matches are not reused).
+- Both are run over the same synthetic descriptions and the matched rows must be identical.
+- Run from the repository root: `python -m scripts.benchmark_fuzzy_filter`
+"""
+
+import random
+import string
+import time
+import numpy as np
+from thefuzz import fuzz
+from backend.app.actions.text_index import FuzzyTextIndex, FUZZY_THRESHOLD
+
+# Number of result rows to filter, the size of the frontend result list
+NUM_ROWS = 100
+# Number of words in each description
+WORDS_PER_ROW = 80
+# Number of distinct words the descriptions are drawn from
+VOCABULARY_SIZE = 3000
+SEARCH_TERMS = ["crime", "health", "traffic", "weather"]
+REPEATS = 5
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+def make_rows(rng):
+    vocabulary = [random_word(rng) for _ in range(VOCABULARY_SIZE)] + SEARCH_TERMS
+    return [" ".join(rng.choice(vocabulary) for _ in range(WORDS_PER_ROW)) for _ in range(NUM_ROWS)]
+
+def loop_filter(descriptions, terms):
+    """ The original nested-loop filter """
+    return np.array([
+        all(any(fuzz.partial_ratio(term, word) >= FUZZY_THRESHOLD for word in description.split()) for term in terms)
+        for description in descriptions
+    ])
+
+def build_index(descriptions):
+    return FuzzyTextIndex([description.lower().split() for description in descriptions])
+
+def cold_filter(descriptions, terms):
+    return build_index(descriptions).match(terms)
+
+def make_warm_filter(index):
+    def warm_filter(descriptions, terms):
+        index._term_rows.clear()
+        return index.match(terms)
+    return warm_filter
+
+def benchmark(name, fn, descriptions, terms):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        mask = fn(descriptions, terms)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    print(f"{name:<8} {elapsed * 1000:10.2f} ms/request, {int(mask.sum())} rows matched")
+    return mask, elapsed
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    descriptions = make_rows(rng)
+    warm_filter = make_warm_filter(build_index(descriptions))
+    for num_terms in (1, 2, len(SEARCH_TERMS)):
+        terms = SEARCH_TERMS[:num_terms]
+        print(f"# {NUM_ROWS} rows x {WORDS_PER_ROW} words, terms: {terms}")
+        loop_mask, loop_time = benchmark("loop", loop_filter, descriptions, terms)
+        for name, fn in (("cold", cold_filter), ("warm", warm_filter)):
+            index_mask, index_time = benchmark(name, fn, descriptions, terms)
+            assert np.array_equal(loop_mask, index_mask), f"{name} indexed filter disagrees with the loop filter"
+            print(f"{'':<8} {loop_time / index_time:10.1f}x speedup")
+        print()
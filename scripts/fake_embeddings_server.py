@@ -0,0 +1,90 @@
+"""
+- A local OpenAI-compatible embeddings endpoint for testing the embedding scheduler without spending quota.
+- It enforces requests/min and tokens/min limits over 10 second windows and answers 429 with Retry-After when they are exceeded.
+- It can also inject random 5xx errors and latency, to check the scheduler's retries.
+- Embeddings are deterministic random unit vectors seeded by the text, so repeated runs return the same vectors.
+- Usage:
+    * python scripts/fake_embeddings_server.py --rpm 600 --tpm 200000 --error-rate 0.05
+    * EMBEDDING_API_BASE_URL=http://localhost:8099/v1 python -m backend.app.table_representation.embed_metadata
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+import numpy as np
+from flask import Flask, request, jsonify
+
+WINDOW_SECONDS = 10
+EMBEDDING_DIM = 1536
+
+app = Flask(__name__)
+settings = argparse.Namespace(rpm=600, tpm=200000, error_rate=0.0, latency=0.2)
+window = {"start": time.monotonic(), "requests": 0, "tokens": 0}
+window_lock = threading.Lock()
+counters = {"ok": 0, "throttled": 0, "errors": 0}
+
+
+def count_tokens(text):
+    # Roughly 4 characters per token is close enough to exercise the limits
+    return max(1, len(text) // 4)
+
+def fake_embedding(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def admit(tokens):
+    """ None if the request fits the current window, else the seconds until the next window """
+    with window_lock:
+        now = time.monotonic()
+        if now - window["start"] >= WINDOW_SECONDS:
+            window.update(start=now, requests=0, tokens=0)
+        if window["requests"] + 1 > settings.rpm / 6 or window["tokens"] + tokens > settings.tpm / 6:
+            return WINDOW_SECONDS - (now - window["start"])
+        window["requests"] += 1
+        window["tokens"] += tokens
+        return None
+
+
+@app.route('/v1/embeddings', methods=['POST'])
+def embeddings():
+    inputs = request.json.get('input')
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    tokens = sum(count_tokens(text) for text in inputs)
+
+    retry_after = admit(tokens)
+    if retry_after is not None:
+        counters["throttled"] += 1
+        response = jsonify({"error": {"message": "Rate limit exceeded", "type": "rate_limit_exceeded", "code": "429"}})
+        response.headers["Retry-After"] = f"{retry_after:.2f}"
+        return response, 429
+
+    time.sleep(random.uniform(0.5, 1.5) * settings.latency)
+    if random.random() < settings.error_rate:
+        counters["errors"] += 1
+        return jsonify({"error": {"message": "Injected server error", "type": "server_error"}}), 500
+
+    counters["ok"] += 1
+    return jsonify({
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(inputs)],
+        "model": request.json.get('model'),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(counters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rpm", type=int, default=600, help="requests per minute before answering 429")
+    parser.add_argument("--tpm", type=int, default=200000, help="tokens per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean latency of a request in seconds")
+    settings = parser.parse_args(namespace=settings)
+    app.run(port=settings.port, threaded=True)